@@ -0,0 +1,208 @@
+# app/analytics.py
+# Daily rollups of the Donation ledger: raised per campaign, per category and
+# per university each day (UTC), so the analytics/ endpoints read at most a
+# year of pre-summed rows however long the donation history grows.
+#
+# Donations do not update the rollups themselves: a category's row for today
+# would be locked by every donation to any of its campaigns, serializing
+# payments that only ever contend per campaign (app/payments.py). Instead a
+# donation's transaction appends its id to app_pendingrollup and queues the
+# ``analytics.rollup`` job (keyed, and delayed ANALYTICS_ROLLUP_DELAY_SECONDS
+# so one run takes a whole burst). The job moves pending ids to the rollups in
+# one statement: DELETE ... RETURNING the ids, then an INSERT ... ON CONFLICT
+# DO UPDATE per rollup adding the sums of the donations grouped by key and
+# day.
+#
+# ``rebuild_rollups()`` (manage.py rollup_donations --rebuild) recomputes
+# the rollups from the ledger with the same statement, set-based, e.g. to
+# backfill after they are introduced. A donation counts toward the category
+# of its campaign and the university of its student at the time it is rolled
+# up; a rebuild uses the current ones. Both runs hold the same advisory lock,
+# and a rebuild reads a single snapshot, so no donation is counted twice.
+import datetime
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from app import jobs
+from app.models import (
+    Campaign,
+    CampaignDailyStats,
+    CategoryDailyStats,
+    Donation,
+    PendingRollup,
+    StudentProfile,
+    UniversityDailyStats,
+)
+
+# pg_advisory_lock key held by whatever writes the rollups
+ROLLUP_LOCK = 0x726F6C6C  # "roll"
+
+
+class InvalidRange(ValueError):
+    pass
+
+
+def queue_rollup(donations):
+    """Have newly recorded ``donations`` added to the rollups; call in the
+    transaction that records them."""
+    if not donations:
+        return
+    PendingRollup.objects.bulk_create([PendingRollup(donation_id=d.id) for d in donations])
+    # after commit: a rollup already claimed before then would not see these
+    # rows, and with the key still free the next one is queued
+    transaction.on_commit(
+        lambda: jobs.enqueue("analytics.rollup", key="analytics.rollup", delay=settings.ANALYTICS_ROLLUP_DELAY_SECONDS)
+    )
+
+
+_ROLLUP_SQL = """
+WITH {source}donations AS MATERIALIZED (
+    SELECT d.campaign_id, c.category, coalesce(trim(s.university), '') AS university,
+           (d.created_at AT TIME ZONE 'UTC')::date AS day, d.amount
+    FROM {donation_table} d
+    JOIN {campaign_table} c ON c.id = d.campaign_id
+    JOIN {student_table} s ON s.id = c.student_id
+    WHERE {where}
+), by_campaign AS (
+    INSERT INTO {campaign_daily_table} AS r (campaign_id, day, amount, donations)
+    SELECT campaign_id, day, sum(amount), count(*) FROM donations GROUP BY campaign_id, day
+    ON CONFLICT (campaign_id, day) DO UPDATE
+    SET amount = r.amount + excluded.amount, donations = r.donations + excluded.donations
+), by_category AS (
+    INSERT INTO {category_daily_table} AS r (category, day, amount, donations)
+    SELECT category, day, sum(amount), count(*) FROM donations GROUP BY category, day
+    ON CONFLICT (category, day) DO UPDATE
+    SET amount = r.amount + excluded.amount, donations = r.donations + excluded.donations
+), by_university AS (
+    INSERT INTO {university_daily_table} AS r (university, day, amount, donations)
+    SELECT university, day, sum(amount), count(*) FROM donations GROUP BY university, day
+    ON CONFLICT (university, day) DO UPDATE
+    SET amount = r.amount + excluded.amount, donations = r.donations + excluded.donations
+)
+SELECT count(*) FROM {counted}
+"""
+
+_PENDING_SOURCE = """claimed AS (
+    DELETE FROM {pending_table}
+    WHERE donation_id IN (SELECT donation_id FROM {pending_table} ORDER BY donation_id LIMIT %s)
+    RETURNING donation_id
+), """
+
+
+def _rollup_sql(source, where, counted):
+    tables = {
+        "donation_table": Donation._meta.db_table,
+        "campaign_table": Campaign._meta.db_table,
+        "student_table": StudentProfile._meta.db_table,
+        "campaign_daily_table": CampaignDailyStats._meta.db_table,
+        "category_daily_table": CategoryDailyStats._meta.db_table,
+        "university_daily_table": UniversityDailyStats._meta.db_table,
+        "pending_table": PendingRollup._meta.db_table,
+    }
+    return _ROLLUP_SQL.format(source=source.format(**tables), where=where, counted=counted, **tables)
+
+
+def rollup_pending(batch_size=None):
+    """Add up to ``batch_size`` (default ANALYTICS_ROLLUP_BATCH_SIZE) pending
+    donations to the rollups; returns how many were taken."""
+    sql = _rollup_sql(_PENDING_SOURCE, "d.id IN (SELECT donation_id FROM claimed)", "claimed")
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [ROLLUP_LOCK])
+        cursor.execute(sql, [batch_size or settings.ANALYTICS_ROLLUP_BATCH_SIZE])
+        return cursor.fetchone()[0]
+
+
+def rebuild_rollups(since=None):
+    """Recompute the rollups from the ledger, for every day or from the date
+    ``since`` on; returns ``(donations, seconds)``. Call it outside any
+    transaction: it starts its own, at REPEATABLE READ."""
+    started = time.perf_counter()
+    start = datetime.datetime.combine(since or datetime.date.min, datetime.time(), datetime.timezone.utc)
+    with connection.cursor() as cursor:
+        # session-level, so it is held before the snapshot below is taken
+        cursor.execute("SELECT pg_advisory_lock(%s)", [ROLLUP_LOCK])
+        try:
+            with transaction.atomic():
+                # every statement below sees the same committed donations
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                for model in (CampaignDailyStats, CategoryDailyStats, UniversityDailyStats):
+                    cursor.execute(f"DELETE FROM {model._meta.db_table} WHERE day >= %s", [start.date()])
+                # counted by the rebuild; those recorded after its snapshot stay pending
+                cursor.execute(
+                    f"DELETE FROM {PendingRollup._meta.db_table} p USING {Donation._meta.db_table} d "
+                    "WHERE d.id = p.donation_id AND d.created_at >= %s",
+                    [start],
+                )
+                cursor.execute(_rollup_sql("", "d.created_at >= %s", "donations"), [start])
+                donations = cursor.fetchone()[0]
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [ROLLUP_LOCK])
+    return donations, time.perf_counter() - started
+
+
+def day_range(since=None, until=None):
+    """The days from ``since`` through ``until`` (ISO dates; by default the
+    last ANALYTICS_DEFAULT_DAYS up to today), at most ANALYTICS_MAX_DAYS."""
+    try:
+        until = parse_date(until) if until else timezone.now().date()
+        if until is not None:
+            since = parse_date(since) if since else until - datetime.timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1)
+    except ValueError:
+        since = until = None
+    if since is None or until is None:
+        raise InvalidRange("'since' and 'until' must be dates (YYYY-MM-DD)")
+    if since > until:
+        raise InvalidRange("'since' must not be after 'until'")
+    if (until - since).days >= settings.ANALYTICS_MAX_DAYS:
+        raise InvalidRange(f"At most {settings.ANALYTICS_MAX_DAYS} days at a time")
+    return since, until
+
+
+def _series(rows, since, until):
+    # one entry per day, zero where nothing was given
+    by_day = {day: (amount, donations) for day, amount, donations in rows}
+    series = []
+    day = since
+    while day <= until:
+        amount, donations = by_day.get(day, (Decimal("0.00"), 0))
+        series.append({"day": day.isoformat(), "amount": str(amount), "donations": donations})
+        day += datetime.timedelta(days=1)
+    return series
+
+
+def campaign_daily(campaign_id, since, until):
+    rows = CampaignDailyStats.objects.filter(campaign_id=campaign_id, day__range=(since, until)).values_list(
+        "day", "amount", "donations"
+    )
+    return _series(rows, since, until)
+
+
+def category_daily(since, until, category=None):
+    """``{category: daily series}`` for every category, or only ``category``."""
+    categories = [category] if category else [value for value, _ in Campaign.CATEGORY_CHOICES]
+    rows = {c: [] for c in categories}
+    stats = CategoryDailyStats.objects.filter(category__in=categories, day__range=(since, until))
+    for c, day, amount, donations in stats.values_list("category", "day", "amount", "donations"):
+        rows[c].append((day, amount, donations))
+    return {c: _series(rows[c], since, until) for c in categories}
+
+
+def top_universities(since, until, limit):
+    """The ``limit`` universities whose students raised most over the days."""
+    rows = (
+        UniversityDailyStats.objects.filter(day__range=(since, until))
+        .exclude(university="")
+        .values("university")
+        .annotate(total=Sum("amount"), count=Sum("donations"))
+        .order_by("-total", "university")[:limit]
+    )
+    return [
+        {"university": row["university"], "amount": str(row["total"]), "donations": row["count"]}
+        for row in rows
+    ]
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class AppConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'app'
+
+    def ready(self):
+        # background job handlers, cache invalidation hooks, system checks
+        from app import tasks  # noqa: F401
+        from app import signals  # noqa: F401
+        from app import checks  # noqa: F401
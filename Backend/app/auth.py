@@ -0,0 +1,197 @@
+# app/auth.py
+# Resolves a Supabase access token to the Supabase user it belongs to.
+# Tokens are verified locally (signature, expiry, audience, issuer) when a JWT
+# secret or JWKS endpoint is configured, so authenticated requests do not pay a
+# round trip to /auth/v1/user. The remote call is only used when no local key
+# material is configured, or as a fallback when SUPABASE_AUTH_REMOTE_FALLBACK
+# is enabled.
+import logging
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from app.supabase import SupabaseError, get_client
+
+logger = logging.getLogger(__name__)
+
+# Algorithms we accept from Supabase. "none" and anything unexpected is rejected.
+HMAC_ALGORITHMS = ("HS256",)
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class SupabaseAuthError(Exception):
+    """A bearer token could not be resolved to a Supabase user."""
+
+    def __init__(self, message, status=401, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+    def as_dict(self):
+        return {"error": self.message, **self.extra}
+
+
+_jwks_client = None
+
+
+def _get_jwks_client():
+    global _jwks_client
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(
+            settings.SUPABASE_JWKS_URL,
+            cache_keys=True,
+            lifespan=settings.SUPABASE_JWKS_CACHE_SECONDS,
+            timeout=5,
+        )
+    return _jwks_client
+
+
+def local_verification_enabled():
+    return bool(settings.SUPABASE_JWT_SECRETS or settings.SUPABASE_JWKS_URL)
+
+
+def _candidate_keys(token):
+    """Return the (key, algorithm) pairs the token may be signed with."""
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.InvalidTokenError:
+        raise SupabaseAuthError("Invalid Supabase token")
+
+    alg = header.get("alg")
+    if alg in HMAC_ALGORITHMS:
+        if not settings.SUPABASE_JWT_SECRETS:
+            raise SupabaseAuthError("No JWT secret configured for HS256 tokens")
+        return [(secret, alg) for secret in settings.SUPABASE_JWT_SECRETS]
+
+    if alg in ASYMMETRIC_ALGORITHMS:
+        if not settings.SUPABASE_JWKS_URL:
+            raise SupabaseAuthError(f"No JWKS configured for {alg} tokens")
+        try:
+            # PyJWKClient refetches the key set once when the kid is unknown,
+            # which is how rotated signing keys are picked up.
+            signing_key = _get_jwks_client().get_signing_key_from_jwt(token)
+        except jwt.PyJWKClientConnectionError as e:
+            raise SupabaseAuthError("Failed to fetch Supabase signing keys", status=502, detail=str(e))
+        except jwt.PyJWKClientError:
+            raise SupabaseAuthError("Unknown Supabase signing key")
+        return [(signing_key.key, alg)]
+
+    raise SupabaseAuthError("Unsupported token algorithm")
+
+
+def verify_token_locally(token):
+    """Verify a Supabase access token without calling Supabase.
+
+    Returns a dict shaped like the /auth/v1/user response (``id``, ``email``,
+    ``user_metadata``) plus the token's ``exp``.
+    """
+    claims = None
+    for key, alg in _candidate_keys(token):
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=settings.SUPABASE_JWT_AUDIENCE,
+                issuer=settings.SUPABASE_JWT_ISSUER,
+                leeway=settings.SUPABASE_JWT_LEEWAY_SECONDS,
+                options={"require": ["exp", "sub"]},
+            )
+            break
+        except jwt.InvalidSignatureError:
+            # try the next (older) secret during a rotation
+            continue
+        except jwt.ExpiredSignatureError:
+            raise SupabaseAuthError("Supabase token has expired")
+        except jwt.InvalidTokenError as e:
+            raise SupabaseAuthError("Invalid Supabase token", detail=str(e))
+
+    if claims is None:
+        raise SupabaseAuthError("Invalid Supabase token", detail="Signature verification failed")
+
+    return {
+        "id": claims["sub"],
+        "email": claims.get("email"),
+        "user_metadata": claims.get("user_metadata") or {},
+        "exp": claims["exp"],
+    }
+
+
+def fetch_user_remote(token):
+    """Ask Supabase who a token belongs to (one network round trip)."""
+    try:
+        res = get_client().get("/auth/v1/user", headers={"Authorization": f"Bearer {token}"})
+    except SupabaseError as e:
+        raise SupabaseAuthError(e.message, status=e.status, detail=e.detail)
+
+    if res.status_code >= 500:
+        raise SupabaseAuthError("Supabase returned an error", status=502, supabase_status=res.status_code)
+
+    if res.status_code != 200:
+        raise SupabaseAuthError(
+            "Invalid Supabase token",
+            supabase_status=res.status_code,
+            supabase_body=res.text,
+        )
+
+    try:
+        return res.json()
+    except ValueError:
+        raise SupabaseAuthError("Invalid JSON from Supabase", status=502, body=res.text)
+
+
+async def afetch_user_remote(token):
+    """Async version of fetch_user_remote."""
+    try:
+        res = await get_client().aget("/auth/v1/user", headers={"Authorization": f"Bearer {token}"})
+    except SupabaseError as e:
+        raise SupabaseAuthError(e.message, status=e.status, detail=e.detail)
+
+    if res.status_code >= 500:
+        raise SupabaseAuthError("Supabase returned an error", status=502, supabase_status=res.status_code)
+
+    if res.status_code != 200:
+        raise SupabaseAuthError(
+            "Invalid Supabase token",
+            supabase_status=res.status_code,
+            supabase_body=res.text,
+        )
+
+    try:
+        return res.json()
+    except ValueError:
+        raise SupabaseAuthError("Invalid JSON from Supabase", status=502, body=res.text)
+
+
+def resolve_supabase_user(token):
+    """Return the Supabase user payload for ``token`` or raise SupabaseAuthError."""
+    if not local_verification_enabled():
+        return fetch_user_remote(token)
+
+    try:
+        return verify_token_locally(token)
+    except SupabaseAuthError as e:
+        if not settings.SUPABASE_AUTH_REMOTE_FALLBACK:
+            raise
+        logger.info("Local JWT verification failed (%s); falling back to Supabase", e.message)
+        return fetch_user_remote(token)
+
+
+
+async def aresolve_supabase_user(token):
+    """Async version of resolve_supabase_user."""
+    if not local_verification_enabled():
+        return await afetch_user_remote(token)
+
+    try:
+        if settings.SUPABASE_JWKS_URL:
+            # a JWKS refresh is a blocking HTTP call; keep it off the event loop
+            return await sync_to_async(verify_token_locally, thread_sensitive=False)(token)
+        return verify_token_locally(token)
+    except SupabaseAuthError as e:
+        if not settings.SUPABASE_AUTH_REMOTE_FALLBACK:
+            raise
+        logger.info("Local JWT verification failed (%s); falling back to Supabase", e.message)
+        return await afetch_user_remote(token)
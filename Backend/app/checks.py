@@ -0,0 +1,40 @@
+# app/checks.py
+# System checks, run by manage.py check and at server start.
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from app.response_cache import is_enabled, is_shared
+
+_SHARED_HINT = (
+    "Set CATALOG_CACHE_BACKEND to a shared backend, e.g. "
+    "django.core.cache.backends.redis.RedisCache with CATALOG_CACHE_LOCATION."
+)
+
+
+@register()
+def catalog_cache_check(app_configs, **kwargs):
+    # a process-local cache misses invalidations made by other workers,
+    # run_workers and rank_campaigns until its entries expire; fine for a
+    # single process, so only a warning
+    if settings.DEBUG or is_shared("catalog"):
+        return []
+    if is_enabled("catalog"):
+        return [
+            Warning(
+                'CACHES["catalog"] is local to each process: with more than one '
+                "process, changes made in another one reach cached listings and "
+                "campaign/student detail pages only after CATALOG_CACHE_TTL_SECONDS "
+                "and DETAIL_CACHE_TTL_SECONDS.",
+                hint=_SHARED_HINT + " Or set CATALOG_CACHE_PROCESS_LOCAL=false to stop "
+                "caching; ignore this for a single-process deployment.",
+                id="app.W001",
+            )
+        ]
+    return [
+        Warning(
+            'CACHES["catalog"] is local to each process and CATALOG_CACHE_PROCESS_LOCAL '
+            "is off, so catalog listings and campaign/student detail pages are not cached.",
+            hint=_SHARED_HINT,
+            id="app.W001",
+        )
+    ]
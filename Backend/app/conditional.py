@@ -0,0 +1,167 @@
+# app/conditional.py
+# Conditional GET (ETag / Last-Modified) for the public read endpoints.
+# Validators come from a cheap fingerprint of the rows behind a response
+# (max(updated_at) and row count), never from rendering the body, and a
+# matching If-None-Match / If-Modified-Since is answered with a 304 before
+# the view runs, i.e. before any query or serialization for the body.
+#
+# Fingerprints are memoized in the same caches as the bodies
+# (app/response_cache.py) and invalidated with them, so a revalidation
+# usually costs no database query at all.
+#
+# Lists get an ETag only. Their max(updated_at) moves back when the newest
+# row is deleted, so a Last-Modified could answer If-Modified-Since with a
+# false 304; the row count in the ETag catches deletions.
+#
+# The ETag covers the Accept header as well (responses carry Vary: Accept):
+# DRF picks the renderer from it, so one URL has several bodies.
+#
+# Writes through QuerySet.update() do not touch auto_now columns: code using
+# it must set updated_at explicitly, or the ETags will not change.
+import hashlib
+import json
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from app.filters import InvalidFilter, filter_campaigns
+from app.models import Campaign, CampaignRank, DonorTier, StudentProfile
+from app.response_cache import catalog_cache, detail_cache
+
+
+def conditional(fingerprint):
+    """View decorator. ``fingerprint(request, *args, **kwargs)`` returns
+    ``(parts, last_modified)`` or None to skip validation (missing object,
+    invalid parameters). ``parts`` must change whenever the body would;
+    ``last_modified`` may be None for no Last-Modified header.
+
+    Apply it outside @api_view so a 304 never enters DRF. Async views are
+    supported; the fingerprint then runs in a worker thread.
+    """
+    def decorator(view):
+        def pre(request, validators):
+            if validators is None:
+                return None, None, None
+            parts, last_modified = validators
+            raw = json.dumps(
+                [request.path, sorted(request.GET.lists()), request.headers.get("Accept", ""), parts], default=str
+            )
+            etag = f'"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            return get_conditional_response(request, etag=etag, last_modified=timestamp), etag, timestamp
+
+        def post(response, etag, timestamp):
+            if response.status_code == 200:
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+                if timestamp:
+                    response.headers.setdefault("Last-Modified", http_date(timestamp))
+            if etag:
+                patch_vary_headers(response, ["Accept"])
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+                validators = await sync_to_async(fingerprint)(request, *args, **kwargs)
+                response, etag, timestamp = pre(request, validators)
+                if response is not None:
+                    return post(response, etag, timestamp)
+                return post(await view(request, *args, **kwargs), etag, timestamp)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return view(request, *args, **kwargs)
+                response, etag, timestamp = pre(request, fingerprint(request, *args, **kwargs))
+                if response is not None:
+                    return post(response, etag, timestamp)
+                return post(view(request, *args, **kwargs), etag, timestamp)
+        return inner
+    return decorator
+
+
+def _latest(*values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _filter_params(request):
+    # every page of a listing shares one fingerprint
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    params.pop("limit", None)
+    return params
+
+
+# --- fingerprints ---
+
+def campaign_detail_fingerprint(request, campaign_id):
+    def build():
+        return Campaign.objects.filter(id=campaign_id).values_list(
+            "updated_at", "student__updated_at", "deadline"
+        ).first()
+
+    row = detail_cache.get_or_build("campaign", campaign_id, build, variant="fingerprint")
+    if row is None:
+        return None
+    updated_at, student_updated_at, deadline = row
+    # is_deadline_passed flips without a write
+    return [updated_at, student_updated_at, timezone.now() > deadline], _latest(updated_at, student_updated_at)
+
+
+def student_detail_fingerprint(request, id):
+    def build():
+        return StudentProfile.objects.filter(id=id).values_list("updated_at", "campaign__updated_at").first()
+
+    row = detail_cache.get_or_build("student", id, build, variant="fingerprint")
+    if row is None:
+        return None
+    return list(row), _latest(*row)
+
+
+def campaigns_fingerprint(request):
+    params = _filter_params(request)
+
+    def build():
+        campaigns, _ = filter_campaigns(params)
+        return campaigns.aggregate(
+            count=Count("id"), updated=Max("updated_at"), student_updated=Max("student__updated_at")
+        )
+
+    try:
+        fp = catalog_cache.get_or_build("get_campaigns:fingerprint", params, build)
+    except InvalidFilter:
+        return None
+    return [fp["count"], fp["updated"], fp["student_updated"]], None
+
+
+def discover_students_fingerprint(request):
+    params = _filter_params(request)
+
+    def build():
+        fp = StudentProfile.objects.filter(campaign__isnull=False).aggregate(
+            count=Count("id"), updated=Max("updated_at"), campaign_updated=Max("campaign__updated_at")
+        )
+        # a re-ranking reorders the feed without touching any row
+        fp["ranked"] = (
+            CampaignRank.objects.aggregate(ranked=Max("computed_at"))["ranked"]
+            if params.get("sort") == "recommended" else None
+        )
+        return fp
+
+    fp = catalog_cache.get_or_build("discover_students:fingerprint", params, build)
+    return [fp["count"], fp["updated"], fp["campaign_updated"], fp["ranked"]], None
+
+
+def donor_tiers_fingerprint(request):
+    # a handful of rows: cheaper to aggregate than to cache
+    fp = DonorTier.objects.aggregate(count=Count("id"), updated=Max("updated_at"))
+    return [fp["count"], fp["updated"]], None
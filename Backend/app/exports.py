@@ -0,0 +1,167 @@
+# app/exports.py
+# Bulk exports for operators (finance, reporting): every row of a dataset as
+# NDJSON or CSV, with full descriptions and raw values rather than the
+# trimmed public payloads. Used by the staff-only /exports/ endpoint and
+# ``manage.py export_campaigns``.
+#
+# Rows are read in keyset batches on (updated_at, id) (index per table, see
+# the models) as plain tuples, and written out as they arrive: memory is
+# bounded by one batch whatever the table size, with or without server-side
+# cursors (a transaction pooler cannot hold one open across batches anyway).
+#
+# ``since`` exports only rows with updated_at >= since, oldest first, for
+# nightly delta jobs: pass the newest updated_at of the previous run. The
+# bound is inclusive, so rows sharing that timestamp come again; consumers
+# upsert on ``id``. Donations are never updated: they are read on
+# (created_at, id) and ``since`` bounds created_at.
+import csv
+import io
+
+from django.conf import settings
+
+from app.models import Campaign, Donation, DonorProfile, StudentProfile
+from app.pagination import KeysetPaginator
+from app.renderers import dumps
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# dataset -> (model, [(column name, ORM lookup)])
+DATASETS = {
+    "campaigns": (Campaign, [
+        ("id", "id"),
+        ("student_id", "student_id"),
+        ("student_name", "student__full_name"),
+        ("title", "title"),
+        ("description", "description"),
+        ("goal_amount", "goal_amount"),
+        ("current_amount", "current_amount"),
+        ("category", "category"),
+        ("status", "status"),
+        ("image_url", "image_url"),
+        ("deadline", "deadline"),
+        ("created_at", "created_at"),
+        ("updated_at", "updated_at"),
+    ]),
+    "students": (StudentProfile, [
+        ("id", "id"),
+        ("user_id", "user_id"),
+        ("full_name", "full_name"),
+        ("email", "email"),
+        ("university", "university"),
+        ("major", "major"),
+        ("academic_year", "academic_year"),
+        ("gpa", "gpa"),
+        ("avatar_url", "avatar_url"),
+        ("updated_at", "updated_at"),
+    ]),
+    "donors": (DonorProfile, [
+        ("id", "id"),
+        ("user_id", "user_id"),
+        ("full_name", "full_name"),
+        ("email", "email"),
+        ("total_donations", "total_donations"),
+        ("tier", "tier__name"),
+        ("updated_at", "updated_at"),
+    ]),
+    "donations": (Donation, [
+        ("id", "id"),
+        ("campaign_id", "campaign_id"),
+        ("campaign_title", "campaign__title"),
+        ("donor_id", "donor_id"),
+        ("donor_name", "donor__full_name"),
+        ("amount", "amount"),
+        ("currency", "currency"),
+        ("provider", "provider"),
+        ("provider_ref", "provider_ref"),
+        ("created_at", "created_at"),
+    ]),
+}
+
+EXPORT_PAGINATOR = KeysetPaginator(("updated_at", "id"))
+# datasets read in another order than EXPORT_PAGINATOR's
+PAGINATORS = {
+    "donations": KeysetPaginator(("created_at", "id")),
+}
+
+
+class UnknownExport(ValueError):
+    pass
+
+
+def rows(dataset, since=None, batch_size=None):
+    """Yield ``dataset``'s rows as tuples in (updated_at, id) order, or
+    (created_at, id) for donations."""
+    try:
+        model, columns = DATASETS[dataset]
+    except KeyError:
+        raise UnknownExport(f"Unknown dataset '{dataset}'")
+    paginator = PAGINATORS.get(dataset, EXPORT_PAGINATOR)
+    timestamp = paginator.fields[0]
+    batch_size = batch_size or settings.STREAM_CHUNK_SIZE
+    lookups = [lookup for _, lookup in columns]
+    # the keyset columns are read back from each row to start the next batch
+    key, pk = lookups.index(timestamp), lookups.index("id")
+
+    queryset = model.objects.order_by(*paginator.ordering)
+    if since is not None:
+        queryset = queryset.filter(**{f"{timestamp}__gte": since})
+    after = None
+    while True:
+        page = queryset if after is None else queryset.filter(paginator.after(after))
+        batch = list(page.values_list(*lookups)[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        after = (batch[-1][key], batch[-1][pk])
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def export(dataset, fmt, since=None, batch_size=None):
+    """Return an iterator of byte chunks (about STREAM_FLUSH_BYTES each).
+
+    Raises UnknownExport up front, before anything is streamed.
+    """
+    if fmt not in FORMATS:
+        raise UnknownExport(f"Unknown format '{fmt}'")
+    if dataset not in DATASETS:
+        raise UnknownExport(f"Unknown dataset '{dataset}'")
+    return _export(dataset, fmt, since, batch_size)
+
+
+def _export(dataset, fmt, since, batch_size):
+    names = [name for name, _ in DATASETS[dataset][1]]
+    flush_bytes = settings.STREAM_FLUSH_BYTES
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for row in rows(dataset, since, batch_size):
+            writer.writerow([_csv_value(v) for v in row])
+            if buffer.tell() >= flush_bytes:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+        return
+
+    chunk = []
+    size = 0
+    for row in rows(dataset, since, batch_size):
+        line = dumps(dict(zip(names, row))) + b"\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= flush_bytes:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    yield b"".join(chunk)
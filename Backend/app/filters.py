@@ -0,0 +1,77 @@
+# app/filters.py
+# Server-side filtering and sorting for the campaign list (django-filter).
+# Every sort is a keyset ordering with a matching composite index on
+# app_campaign led by ``status`` (see Campaign.Meta.indexes), so any filter
+# combination below is answered by an index range scan plus the page limit,
+# never by sorting the whole table.
+from datetime import timedelta
+
+import django_filters
+from django.conf import settings
+from django.utils import timezone
+
+from app.models import Campaign
+from app.pagination import CAMPAIGN_PAGINATOR, KeysetPaginator
+
+# ?sort= value -> keyset ordering
+CAMPAIGN_SORTS = {
+    "newest": CAMPAIGN_PAGINATOR,
+    "deadline": KeysetPaginator(("deadline", "id")),
+    "goal_asc": KeysetPaginator(("goal_amount", "id")),
+    "goal_desc": KeysetPaginator(("-goal_amount", "-id")),
+    "most_funded": KeysetPaginator(("-current_amount", "-id")),
+}
+
+
+class InvalidFilter(ValueError):
+    def __init__(self, errors):
+        super().__init__("Invalid filter parameters")
+        self.errors = errors
+
+
+class CampaignFilter(django_filters.FilterSet):
+    status = django_filters.ChoiceFilter(choices=Campaign.STATUS_CHOICES)
+    category = django_filters.ChoiceFilter(choices=Campaign.CATEGORY_CHOICES)
+    student_id = django_filters.NumberFilter(field_name="student_id")
+    goal_min = django_filters.NumberFilter(field_name="goal_amount", lookup_expr="gte")
+    goal_max = django_filters.NumberFilter(field_name="goal_amount", lookup_expr="lte")
+    deadline_after = django_filters.IsoDateTimeFilter(field_name="deadline", lookup_expr="gte")
+    deadline_before = django_filters.IsoDateTimeFilter(field_name="deadline", lookup_expr="lte")
+    ending_soon = django_filters.BooleanFilter(method="filter_ending_soon")
+    # applied by the paginator, declared here so it is validated with the rest
+    sort = django_filters.ChoiceFilter(
+        choices=[(name, name) for name in CAMPAIGN_SORTS], method="filter_sort"
+    )
+
+    class Meta:
+        model = Campaign
+        fields = []
+
+    def filter_ending_soon(self, queryset, name, value):
+        if not value:
+            return queryset
+        now = timezone.now()
+        return queryset.filter(
+            deadline__gte=now,
+            deadline__lte=now + timedelta(days=settings.CAMPAIGN_ENDING_SOON_DAYS),
+        )
+
+    def filter_sort(self, queryset, name, value):
+        return queryset
+
+
+def filter_campaigns(params, queryset=None):
+    """Apply the query ``params`` to ``queryset`` (default: all campaigns).
+
+    Returns ``(queryset, paginator)`` for the requested sort; only active
+    campaigns are listed unless ``status`` is given. Raises InvalidFilter.
+    """
+    params = params.copy()
+    params.setdefault("status", "active")
+    filterset = CampaignFilter(
+        params, queryset=queryset if queryset is not None else Campaign.objects.all()
+    )
+    if not filterset.is_valid():
+        raise InvalidFilter(filterset.errors)
+    sort = filterset.form.cleaned_data.get("sort") or "newest"
+    return filterset.qs, CAMPAIGN_SORTS[sort]
@@ -0,0 +1,301 @@
+# app/identity.py
+# Bearer token -> EduUser resolution with an in-process identity cache.
+# A verified token maps to the EduUser id and role flags until the token
+# expires, so repeat requests skip both the Supabase check and the user
+# upsert. Rejected tokens are remembered briefly (negative caching) so
+# a misbehaving client cannot hammer Supabase with the same bad token.
+# Cache misses for the same token are coalesced into one lookup per worker.
+import hashlib
+import time
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from app.auth import SupabaseAuthError, aresolve_supabase_user, resolve_supabase_user
+from app.models import DonorProfile, EduUser, StudentProfile
+from app.utils import AsyncSingleFlight, LRUCache, SingleFlight
+
+# Columns kept per cached identity; enough for every view that reads edu_user.
+IDENTITY_FIELDS = ("id", "username", "email", "first_name", "last_name", "is_active", "is_student", "is_donor")
+
+identity_cache = LRUCache(max_entries=settings.IDENTITY_CACHE_MAX_ENTRIES)
+identity_flights = SingleFlight()
+async_identity_flights = AsyncSingleFlight()
+
+
+def token_key(token):
+    # never keep raw bearer tokens in memory longer than the request
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _ttl_for(token, user_data):
+    exp = user_data.get("exp")
+    if exp is None:
+        # Remote verification does not return exp; the token was just accepted
+        # by Supabase, so reading the claim without verifying is safe here.
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.InvalidTokenError:
+            exp = None
+    if exp is None:
+        return settings.IDENTITY_CACHE_DEFAULT_TTL_SECONDS
+    return max(0, min(exp - time.time(), settings.IDENTITY_CACHE_MAX_TTL_SECONDS))
+
+
+def _edu_user_from_identity(identity):
+    # Deferred instance: any other column is loaded lazily and save() only
+    # writes the loaded fields, so a cached user can never clobber a row.
+    # from_db expects values in model field order
+    names = [f.attname for f in EduUser._meta.concrete_fields if f.attname in identity]
+    return EduUser.from_db("default", names, [identity[n] for n in names])
+
+
+def _email_and_role(user_data):
+    email = user_data.get("email")
+    if not email:
+        # Reject early instead of attempting DB writes with a None email
+        raise SupabaseAuthError("Supabase returned no email for user", status=400, body=user_data)
+
+    metadata = user_data.get("user_metadata", {}) or user_data.get("raw_user_meta_data", {}) or {}
+    return email, metadata.get("role")
+
+
+_UPSERT_SQL = """
+WITH upsert AS (
+    INSERT INTO {user_table} AS u (password, is_superuser, username, first_name, last_name,
+                                   email, is_staff, is_active, date_joined, is_student, is_donor)
+    VALUES (%s, false, %s, %s, %s, %s, false, true, %s, %s, %s)
+    ON CONFLICT (email) WHERE email <> '' {on_conflict}
+    RETURNING u.id, u.username, u.email, u.first_name, u.last_name, u.is_active,
+              u.is_student, u.is_donor, (u.xmax = 0) AS created
+){profile_ctes}
+SELECT id, username, email, first_name, last_name, is_active, is_student, is_donor, created, true
+FROM upsert
+UNION ALL
+SELECT id, username, email, first_name, last_name, is_active, is_student, is_donor, false, false
+FROM {user_table}
+WHERE email = %s AND NOT EXISTS (SELECT 1 FROM upsert)
+"""
+
+_PROFILE_CTES = """,
+student_profile AS (
+    INSERT INTO {student_table} (user_id, full_name, email, updated_at)
+    SELECT id, %s, email, now() FROM upsert WHERE created AND is_student
+    ON CONFLICT DO NOTHING
+),
+donor_profile AS (
+    INSERT INTO {donor_table} (user_id, full_name, email, total_donations, updated_at)
+    SELECT id, %s, email, 0, now() FROM upsert WHERE created AND is_donor AND NOT is_student
+    ON CONFLICT DO NOTHING
+)"""
+
+
+def _execute_upsert(sql, params):
+    # in a savepoint when the caller has a transaction open, so a failed
+    # attempt does not abort it
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def _upsert_postgres(email, role, first_name, last_name, update_columns, full_name, create_profile):
+    if update_columns:
+        # the WHERE clause makes an unchanged login a no-op: no row version,
+        # no WAL, no trigger, and the RETURNING row comes from the fallback SELECT
+        on_conflict = "DO UPDATE SET {} WHERE ({}) IS DISTINCT FROM ({})".format(
+            ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns),
+            ", ".join(f"u.{c}" for c in update_columns),
+            ", ".join(f"EXCLUDED.{c}" for c in update_columns),
+        )
+    else:
+        on_conflict = "DO NOTHING"
+
+    params = [
+        make_password(None), email, first_name or "", last_name or "", email,
+        timezone.now(), role == "student", role == "donor",
+    ]
+    profile_ctes = ""
+    if create_profile:
+        profile_ctes = _PROFILE_CTES.format(
+            student_table=StudentProfile._meta.db_table,
+            donor_table=DonorProfile._meta.db_table,
+        )
+        params += [full_name, full_name]
+    params.append(email)
+
+    sql = _UPSERT_SQL.format(
+        user_table=EduUser._meta.db_table,
+        on_conflict=on_conflict,
+        profile_ctes=profile_ctes,
+    )
+    try:
+        row = _execute_upsert(sql, params)
+    except IntegrityError:
+        # ON CONFLICT only arbitrates the email index: a first login racing
+        # another can trip the username one (username = email) instead. That
+        # row is committed now, so the retry takes the conflict path.
+        row = _execute_upsert(sql, params)
+
+    if row is None:
+        # A concurrent transaction inserted the row after this statement's
+        # snapshot was taken, so the fallback SELECT could not see it yet.
+        identity = EduUser.objects.filter(email=email).values(*IDENTITY_FIELDS).get()
+        return identity, False, False
+
+    *values, created, written = row
+    return dict(zip(IDENTITY_FIELDS, values)), created, written and not created
+
+
+def _upsert_orm(email, role, first_name, last_name, update_columns, full_name, create_profile):
+    # Same semantics for databases without INSERT ... ON CONFLICT in CTEs (sqlite in dev)
+    edu_user, created = EduUser.objects.get_or_create(
+        email=email,
+        defaults={
+            "username": email,
+            "first_name": first_name or "",
+            "last_name": last_name or "",
+            "password": make_password(None),
+            "is_active": True,
+            "is_student": role == "student",
+            "is_donor": role == "donor",
+        },
+    )
+    changed = False
+    if not created and update_columns:
+        desired = {
+            "first_name": first_name,
+            "last_name": last_name,
+            "is_student": role == "student",
+            "is_donor": role == "donor",
+        }
+        changed_columns = [c for c in update_columns if getattr(edu_user, c) != desired[c]]
+        if changed_columns:
+            for c in changed_columns:
+                setattr(edu_user, c, desired[c])
+            edu_user.save(update_fields=changed_columns)
+            changed = True
+
+    if created and create_profile:
+        if edu_user.is_student:
+            StudentProfile.objects.create(user=edu_user, full_name=full_name, email=email)
+        elif edu_user.is_donor:
+            DonorProfile.objects.create(user=edu_user, full_name=full_name, email=email)
+
+    return {f: getattr(edu_user, f) for f in IDENTITY_FIELDS}, created, changed
+
+
+def upsert_edu_user(email, role=None, first_name=None, last_name=None, sync_role=False, create_profile=False):
+    """Create or sync the EduUser for a Supabase account in one statement.
+
+    New users get ``role`` and the given names. Existing users are only
+    rewritten when something differs: the role flags when ``sync_role`` is set
+    and each name that is not None. With ``create_profile`` a new user also
+    gets their StudentProfile/DonorProfile in the same statement.
+
+    Returns ``(edu_user, created, changed)``. Cached identities of a user whose
+    row changed are invalidated.
+    """
+    update_columns = []
+    if first_name is not None:
+        update_columns.append("first_name")
+    if last_name is not None:
+        update_columns.append("last_name")
+    if sync_role:
+        update_columns += ["is_student", "is_donor"]
+    full_name = f"{first_name or ''} {last_name or ''}".strip() or email
+
+    upsert = _upsert_postgres if connection.vendor == "postgresql" else _upsert_orm
+    identity, created, changed = upsert(
+        email, role, first_name, last_name, update_columns, full_name, create_profile
+    )
+    if changed:
+        invalidate_user(identity["id"])
+    return _edu_user_from_identity(identity), created, changed
+
+
+def _cache_identity(token, key, user_data, edu_user):
+    identity = {f: getattr(edu_user, f) for f in IDENTITY_FIELDS}
+    ttl = _ttl_for(token, user_data)
+    if ttl > 0:
+        identity_cache.set(key, identity, ttl=ttl)
+    return identity
+
+
+def _remember_rejection(key, e):
+    # only definite rejections are cached; upstream outages (5xx) are not
+    if e.status == 401:
+        identity_cache.set(key, e, ttl=settings.IDENTITY_CACHE_NEGATIVE_TTL_SECONDS)
+
+
+def _resolve_uncached(token, key):
+    try:
+        user_data = resolve_supabase_user(token)
+    except SupabaseAuthError as e:
+        _remember_rejection(key, e)
+        raise
+
+    email, role = _email_and_role(user_data)
+    edu_user, _, _ = upsert_edu_user(email, role=role)
+    return _cache_identity(token, key, user_data, edu_user)
+
+
+async def _aresolve_uncached(token, key):
+    try:
+        user_data = await aresolve_supabase_user(token)
+    except SupabaseAuthError as e:
+        _remember_rejection(key, e)
+        raise
+
+    email, role = _email_and_role(user_data)
+    # raw SQL has no async cursor in Django; run the single statement in a thread
+    edu_user, _, _ = await sync_to_async(upsert_edu_user)(email, role=role)
+    return _cache_identity(token, key, user_data, edu_user)
+
+
+def _from_cache(key):
+    cached = identity_cache.get(key)
+    if isinstance(cached, SupabaseAuthError):
+        raise cached
+    return cached
+
+
+def resolve_edu_user(token):
+    """Return the EduUser for a bearer token.
+
+    Concurrent requests carrying the same token (a dashboard firing several
+    calls at once) share a single in-flight lookup. Raises SupabaseAuthError
+    when the token is rejected; database errors propagate to the caller.
+    """
+    key = token_key(token)
+    identity = _from_cache(key)
+    if identity is None:
+        identity = identity_flights.do(key, lambda: _resolve_uncached(token, key))
+    # every caller gets its own instance, never a shared one
+    return _edu_user_from_identity(identity)
+
+
+async def aresolve_edu_user(token):
+    """Async variant of resolve_edu_user for async views."""
+    key = token_key(token)
+    identity = _from_cache(key)
+    if identity is None:
+        identity = await async_identity_flights.do(key, lambda: _aresolve_uncached(token, key))
+    return _edu_user_from_identity(identity)
+
+
+def identity_stats():
+    """Cache and coalescing counters; ``coalesced`` is upstream lookups saved."""
+    return {
+        "cache": identity_cache.stats(),
+        "single_flight": identity_flights.stats(),
+        "async_single_flight": async_identity_flights.stats(),
+    }
+
+
+def invalidate_user(user_id):
+    """Forget every cached token of a user, e.g. after their role changed."""
+    return identity_cache.delete_where(lambda v: isinstance(v, dict) and v["id"] == user_id)
@@ -0,0 +1,262 @@
+# app/jobs.py
+# Durable background jobs in PostgreSQL, so slow side effects leave the
+# request thread without adding a broker. A view calls ``enqueue()``; inside
+# a transaction the job row commits (or rolls back) with the view's own
+# writes, so a worker never sees a job before the data it is about. Handlers
+# are registered by name with ``@task`` (app/tasks.py).
+#
+# ``manage.py run_workers`` forks a pool of worker processes. Each claims
+# ready jobs, highest priority first, with SELECT ... FOR UPDATE SKIP LOCKED:
+# workers never block on each other's rows and no job is claimed twice. A
+# job runs outside the claiming transaction (it may commit in chunks of its
+# own) and is then marked done. A failed job is retried with exponential
+# backoff until max_attempts, then moved to app_deadjob. A job left running
+# longer than JOB_TIMEOUT_SECONDS (its worker died) counts as a failed
+# attempt.
+#
+# Jobs enqueued with a ``key`` coalesce: while one with that key is queued,
+# enqueueing another is a no-op. A job already running does not count, so
+# work that arrives during a run is picked up by the next one.
+#
+# Finished jobs stay for JOB_RETENTION_SECONDS; ``stats()`` derives queue
+# depth and latency from them for /metrics/jobs.
+import json
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from app.models import DeadJob, Job
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+class UnknownTask(LookupError):
+    pass
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs named ``name``;
+    it is called with the job's args as keyword arguments."""
+    def register(func):
+        _tasks[name] = func
+        return func
+    return register
+
+
+# the conflict target is app_job_queued_key_unique
+_ENQUEUE_KEYED_SQL = """
+INSERT INTO {job_table} (name, args, priority, key, status, attempts, max_attempts, run_at, created_at, last_error)
+VALUES (%s, %s::jsonb, %s, %s, 'queued', 0, %s, %s, %s, '')
+ON CONFLICT (key) WHERE status = 'queued' AND key <> '' DO NOTHING
+RETURNING id
+"""
+
+
+def enqueue(name, priority=0, key="", delay=None, max_attempts=None, **args):
+    """Queue a job; ``args`` must be JSON-serializable. Returns False when
+    a job with the same ``key`` was already queued."""
+    if name not in _tasks:
+        raise UnknownTask(f"Unknown task '{name}'")
+    now = timezone.now()
+    run_at = now + timedelta(seconds=delay) if delay else now
+    return _insert(name, args, priority, key, max_attempts or settings.JOB_MAX_ATTEMPTS, run_at)
+
+
+def _insert(name, args, priority, key, max_attempts, run_at):
+    if not key:
+        Job.objects.create(name=name, args=args, priority=priority, max_attempts=max_attempts, run_at=run_at)
+        return True
+    # a duplicate key is not an error: no savepoint or exception on the way,
+    # and the caller's transaction stays usable
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _ENQUEUE_KEYED_SQL.format(job_table=Job._meta.db_table),
+            [name, json.dumps(args), priority, key, max_attempts, run_at, timezone.now()],
+        )
+        return cursor.fetchone() is not None
+
+
+_CLAIM_SQL = """
+UPDATE {job_table} SET status = 'running', started_at = %s, attempts = attempts + 1
+WHERE id IN (
+    SELECT id FROM {job_table}
+    WHERE status = 'queued' AND run_at <= %s
+    ORDER BY priority DESC, run_at, id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING *
+"""
+
+
+def claim(limit=1):
+    """Mark up to ``limit`` ready jobs running and return them, highest
+    priority first."""
+    now = timezone.now()
+    # one statement: no transaction is held open across round trips
+    jobs = Job.objects.raw(_CLAIM_SQL.format(job_table=Job._meta.db_table), [now, now, limit])
+    return sorted(jobs, key=lambda job: (-job.priority, job.run_at, job.id))
+
+
+def run(job):
+    """Run a claimed job and record the outcome; returns True on success."""
+    try:
+        handler = _tasks.get(job.name)
+        if handler is None:
+            raise UnknownTask(f"Unknown task '{job.name}'")
+        handler(**job.args)
+    except Exception:
+        logger.exception("Job %s #%s failed (attempt %s of %s)", job.name, job.id, job.attempts, job.max_attempts)
+        fail(job, traceback.format_exc())
+        return False
+    # unless recover_stalled() gave up on it meanwhile; it is queued again then
+    Job.objects.filter(id=job.id, status=Job.RUNNING).update(
+        status=Job.DONE, finished_at=timezone.now(), last_error=""
+    )
+    return True
+
+
+def _backoff(attempts):
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_SECONDS)
+    # jitter, so jobs that failed together do not all retry together
+    return delay * random.uniform(0.75, 1.25)
+
+
+def fail(job, error):
+    """Schedule a retry of a failed attempt, or move the job to the dead
+    letters after its last one."""
+    if job.attempts < job.max_attempts:
+        retry = Job.objects.filter(id=job.id, status=Job.RUNNING)
+        try:
+            with transaction.atomic():
+                retry.update(
+                    status=Job.QUEUED, started_at=None, last_error=error,
+                    run_at=timezone.now() + timedelta(seconds=_backoff(job.attempts)),
+                )
+        except IntegrityError:
+            # a job with the same key was queued while this one ran; it
+            # does the same work, so this one is not retried
+            retry.update(status=Job.DONE, finished_at=timezone.now(), last_error=error)
+        return
+    with transaction.atomic():
+        DeadJob.objects.create(
+            name=job.name, args=job.args, priority=job.priority, key=job.key,
+            attempts=job.attempts, error=error, created_at=job.created_at,
+        )
+        Job.objects.filter(id=job.id).delete()
+
+
+def recover_stalled():
+    """Fail the attempts of jobs whose worker died; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+    stalled = 0
+    for job in Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff):
+        # the worker may finish it meanwhile; only fail it if it is still running
+        with transaction.atomic():
+            job = Job.objects.select_for_update().filter(id=job.id, status=Job.RUNNING).first()
+            if job is not None:
+                fail(job, f"Timed out after {settings.JOB_TIMEOUT_SECONDS}s (worker lost?)")
+                stalled += 1
+    return stalled
+
+
+def purge_finished():
+    """Delete done jobs older than JOB_RETENTION_SECONDS; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_RETENTION_SECONDS)
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def requeue_dead(ids=None):
+    """Move dead jobs (all, or those in ``ids``) back to the queue, keys
+    included; returns how many were queued. A dead job whose key is queued
+    already is dropped, like a duplicate enqueue: the queued job does its
+    work."""
+    dead = DeadJob.objects.all() if ids is None else DeadJob.objects.filter(id__in=ids)
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(dead.order_by("id").select_for_update())
+        queued = sum(
+            _insert(d.name, d.args, d.priority, d.key, settings.JOB_MAX_ATTEMPTS, now) for d in jobs
+        )
+        DeadJob.objects.filter(id__in=[d.id for d in jobs]).delete()
+    return queued
+
+
+def work(stop, batch_size=1, burst=False):
+    """Claim and run jobs until ``stop`` (an Event) is set, or with ``burst``
+    until no job is ready."""
+    next_maintenance = 0
+    while not stop.is_set():
+        try:
+            if time.monotonic() >= next_maintenance:
+                recover_stalled()
+                purge_finished()
+                next_maintenance = time.monotonic() + 60
+            jobs = claim(batch_size)
+            for job in jobs:
+                run(job)
+        except DatabaseError:
+            # database restarted or unreachable: reconnect on the next round
+            logger.exception("Job worker lost its database connection")
+            connection.close()
+            jobs = []
+        if not jobs:
+            if burst:
+                return
+            stop.wait(settings.JOB_POLL_SECONDS)
+
+
+_LATENCY_SQL = """
+SELECT count(*),
+       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM started_at - run_at)),
+       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM finished_at - started_at))
+FROM {job_table}
+WHERE status = 'done' AND finished_at >= %s
+"""
+
+
+def stats():
+    """Queue depth and, over the last JOB_METRICS_WINDOW_SECONDS, job
+    latency: ``wait`` from due to started, ``run`` from started to done
+    (seconds, p50/p95/p99)."""
+    now = timezone.now()
+    depth = Job.objects.exclude(status=Job.DONE).aggregate(
+        ready=Count("id", filter=Q(status=Job.QUEUED, run_at__lte=now)),
+        scheduled=Count("id", filter=Q(status=Job.QUEUED, run_at__gt=now)),
+        running=Count("id", filter=Q(status=Job.RUNNING)),
+        oldest_ready=Min("run_at", filter=Q(status=Job.QUEUED, run_at__lte=now)),
+    )
+    oldest_ready = depth.pop("oldest_ready")
+    by_name = dict(
+        Job.objects.filter(status=Job.QUEUED).values_list("name").annotate(n=Count("id")).order_by()
+    )
+
+    window = settings.JOB_METRICS_WINDOW_SECONDS
+    with connection.cursor() as cursor:
+        cursor.execute(_LATENCY_SQL.format(job_table=Job._meta.db_table), [now - timedelta(seconds=window)])
+        completed, wait, run_time = cursor.fetchone()
+
+    def percentiles(values):
+        return dict(zip(("p50", "p95", "p99"), values)) if values else None
+
+    return {
+        **depth,
+        "oldest_ready_seconds": (now - oldest_ready).total_seconds() if oldest_ready else 0.0,
+        "queued_by_name": by_name,
+        "dead": DeadJob.objects.count(),
+        "window_seconds": window,
+        "completed": completed,
+        "completed_per_second": completed / window,
+        "wait_seconds": percentiles(wait),
+        "run_seconds": percentiles(run_time),
+    }
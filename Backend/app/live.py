@@ -0,0 +1,325 @@
+# app/live.py
+# Live campaign progress over Server-Sent Events (GET campaigns/<id>/stream),
+# instead of pages polling campaigns/<id>.
+#
+# Payments NOTIFY the ``campaign_progress`` channel from the transaction that
+# raises a campaign's total (app/payments.py); PostgreSQL delivers it on
+# commit, never for a rolled-back donation, to every process listening. Each
+# ASGI worker keeps one LISTEN connection and fans the messages out in memory
+# to the streams open on it, so an idle subscriber costs a small object and
+# no database work, and one worker can hold tens of thousands of them.
+#
+# Bursts are coalesced twice: messages for a campaign arriving within
+# PROGRESS_STREAM_COALESCE_SECONDS become one broadcast of the latest state,
+# and a subscriber that has not written out its previous update yet has it
+# replaced, so a slow client never builds a backlog. Heartbeats come from one
+# timer per worker, not one per connection.
+#
+# The stream is a plain ASGI endpoint that backend/asgi.py puts in front of
+# Django, not a view: Django's ASGI handler gives every request its own
+# executor thread for the sync parts of the middleware, kept until the
+# response ends, which for a stream open for hours meant one idle thread per
+# subscriber. It is not available under WSGI.
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+import orjson
+import psycopg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from app.models import Campaign
+from app.renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "campaign_progress"
+
+FIELDS = ("id", "current_amount", "goal_amount", "donors_count")
+
+
+def progress(campaign_id, current_amount, goal_amount, donors_count):
+    """The state pushed to subscribers; the figures of the campaign payloads."""
+    return {
+        "id": campaign_id,
+        "current_amount": str(current_amount),
+        "goal_amount": str(goal_amount),
+        "progress_percentage": float(current_amount / goal_amount * 100) if goal_amount else 0,
+        "donors_count": donors_count,
+    }
+
+
+def notify(cursor, campaign_id, current_amount, goal_amount, donors_count):
+    """Announce a campaign's new progress to every worker once the current
+    transaction commits (PostgreSQL only; a no-op elsewhere)."""
+    if cursor.db.vendor != "postgresql":
+        return
+    state = progress(campaign_id, current_amount, goal_amount, donors_count)
+    cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, dumps(state).decode()])
+
+
+@sync_to_async(thread_sensitive=True)
+def _progress_rows(campaign_ids):
+    """``(status, *FIELDS)`` rows for ``campaign_ids``.
+
+    Runs in Django's shared sync thread, which owns the connection, and does
+    the connection housekeeping a request would: this ASGI app is outside
+    Django's request cycle, so nothing else would close a connection that
+    broke or outlived CONN_MAX_AGE.
+    """
+    close_old_connections()
+    try:
+        return list(Campaign.objects.filter(id__in=campaign_ids).values_list("status", *FIELDS))
+    finally:
+        close_old_connections()
+
+
+def event(state):
+    """One SSE ``progress`` event."""
+    return b"event: progress\ndata: " + dumps(state) + b"\n\n"
+
+
+class Subscriber:
+    __slots__ = ("latest", "ready")
+
+    def __init__(self):
+        self.latest = None
+        self.ready = asyncio.Event()
+
+    def push(self, state):
+        self.latest = state
+        self.ready.set()
+
+    async def next(self):
+        """The newest state, or None for a heartbeat."""
+        await self.ready.wait()
+        self.ready.clear()
+        state, self.latest = self.latest, None
+        return state
+
+
+class ProgressHub:
+    """Per-process fan-out of campaign progress to SSE subscribers."""
+
+    def __init__(self, coalesce, heartbeat, max_subscribers):
+        self.coalesce = coalesce
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self._by_campaign = defaultdict(set)
+        self._pending = {}  # campaign id -> latest state awaiting broadcast
+        self._loop = None
+        self._tasks = ()
+        self.listening = False
+        self.messages = 0
+        self.broadcasts = 0
+        self.reconnects = 0
+
+    def full(self):
+        return self.subscribers >= self.max_subscribers
+
+    def subscribe(self, campaign_id):
+        self._start()
+        subscriber = Subscriber()
+        self._by_campaign[campaign_id].add(subscriber)
+        self.subscribers += 1
+        return subscriber
+
+    def unsubscribe(self, campaign_id, subscriber):
+        subscribers = self._by_campaign.get(campaign_id)
+        if subscribers is not None and subscriber in subscribers:
+            subscribers.discard(subscriber)
+            self.subscribers -= 1
+            if not subscribers:
+                del self._by_campaign[campaign_id]
+
+    def publish(self, state):
+        """Broadcast ``state`` after the coalescing window, merged with any
+        later state for the same campaign."""
+        campaign_id = state["id"]
+        if campaign_id not in self._by_campaign:
+            return
+        if campaign_id not in self._pending:
+            self._loop.call_later(self.coalesce, self._flush, campaign_id)
+        self._pending[campaign_id] = state
+
+    def _flush(self, campaign_id):
+        state = self._pending.pop(campaign_id, None)
+        if state is None:
+            return
+        self.broadcasts += 1
+        for subscriber in self._by_campaign.get(campaign_id, ()):
+            subscriber.push(state)
+
+    def _start(self):
+        # bound to the event loop that first subscribes; a new loop (tests,
+        # a restarted server) starts over
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._by_campaign.clear()
+        self._pending.clear()
+        self.subscribers = 0
+        self.listening = False
+        self._tasks = (loop.create_task(self._listen()), loop.create_task(self._heartbeats()))
+
+    async def _heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for subscribers in list(self._by_campaign.values()):
+                for subscriber in subscribers:
+                    # a subscriber with an update pending needs no heartbeat
+                    if not subscriber.ready.is_set():
+                        subscriber.ready.set()
+
+    async def _listen(self):
+        connected_before = False
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(settings.PROGRESS_STREAM_DATABASE_URL, autocommit=True)
+                async with conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    self.listening = True
+                    if connected_before:
+                        # whatever changed while disconnected was not heard
+                        await self._resync()
+                    connected_before = True
+                    async for message in conn.notifies():
+                        self.messages += 1
+                        self.publish(orjson.loads(message.payload))
+            except asyncio.CancelledError:
+                self.listening = False
+                raise
+            except Exception:
+                self.listening = False
+                logger.exception("Campaign progress listener failed; reconnecting")
+                self.reconnects += 1
+                connected_before = True
+                await asyncio.sleep(1)
+
+    async def _resync(self):
+        for row in await _progress_rows(list(self._by_campaign)):
+            self.publish(progress(*row[1:]))
+
+    def stats(self):
+        return {
+            "listening": self.listening,
+            "subscribers": self.subscribers,
+            "campaigns": len(self._by_campaign),
+            "messages": self.messages,
+            "broadcasts": self.broadcasts,
+            "reconnects": self.reconnects,
+        }
+
+
+progress_hub = ProgressHub(
+    coalesce=settings.PROGRESS_STREAM_COALESCE_SECONDS,
+    heartbeat=settings.PROGRESS_STREAM_HEARTBEAT_SECONDS,
+    max_subscribers=settings.PROGRESS_STREAM_MAX_SUBSCRIBERS,
+)
+
+
+_STREAM_PATH = re.compile(r"^/campaigns/(\d+)/stream$")
+
+
+def with_progress_streams(django_application):
+    """Serve campaigns/<id>/stream with ``stream_progress`` and everything
+    else with ``django_application``."""
+    async def application(scope, receive, send):
+        if scope["type"] == "http":
+            match = _STREAM_PATH.match(scope["path"])
+            if match:
+                return await stream_progress(scope, receive, send, int(match[1]))
+        return await django_application(scope, receive, send)
+    return application
+
+
+def _cors_headers(scope):
+    origin = next((value for name, value in scope["headers"] if name == b"origin"), None)
+    if origin is None:
+        return []
+    if getattr(settings, "CORS_ALLOW_ALL_ORIGINS", False) or origin.decode("latin-1") in settings.CORS_ALLOWED_ORIGINS:
+        return [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+    return []
+
+
+async def _send_json(send, data, status, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), *headers],
+    })
+    await send({"type": "http.response.body", "body": dumps(data)})
+
+
+async def stream_progress(scope, receive, send, campaign_id):
+    """The campaign's progress now, then each time a donation changes it,
+    with keepalive comments in between."""
+    cors = _cors_headers(scope)
+    if scope["method"] != "GET":
+        return await _send_json(send, {"error": "Method not allowed"}, 405, [(b"allow", b"GET"), *cors])
+    if progress_hub.full():
+        return await _send_json(send, {"error": "Too many open streams"}, 503, [(b"retry-after", b"30"), *cors])
+
+    # subscribed before the snapshot is read, so no update falls in between
+    subscriber = progress_hub.subscribe(campaign_id)
+    try:
+        try:
+            rows = await _progress_rows([campaign_id])
+        except DatabaseError:
+            logger.exception("Campaign progress snapshot failed")
+            return await _send_json(send, {"error": "Database error"}, 503, [(b"retry-after", b"5"), *cors])
+        if not rows:
+            return await _send_json(send, {"error": "Campaign not found"}, 404, cors)
+        status, *row = rows[0]
+        if status != "active":
+            # its total no longer changes; 410 also stops EventSource reconnecting
+            return await _send_json(send, {"error": "Campaign is not active"}, 410, cors)
+
+        stream = asyncio.current_task()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            stream.cancel()
+
+        watcher = asyncio.get_running_loop().create_task(watch_disconnect())
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # nginx would otherwise buffer the stream
+                    (b"x-accel-buffering", b"no"),
+                    *cors,
+                ],
+            })
+            state = progress(*row)
+            # EventSource reconnects after this many milliseconds
+            await send({"type": "http.response.body", "body": b"retry: 5000\n" + event(state), "more_body": True})
+            while True:
+                update = await subscriber.next()
+                if update is None:
+                    body = b": keepalive\n\n"
+                elif update["current_amount"] == state["current_amount"] and update["donors_count"] == state["donors_count"]:
+                    continue
+                else:
+                    delta = Decimal(update["current_amount"]) - Decimal(state["current_amount"])
+                    state = update
+                    body = event({**update, "delta": str(delta)})
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        except asyncio.CancelledError:
+            if not watcher.done():
+                raise
+            # the client went away
+        finally:
+            watcher.cancel()
+    finally:
+        progress_hub.unsubscribe(campaign_id, subscriber)
@@ -0,0 +1,102 @@
+# app/management/commands/benchmark_tiers.py
+# Benchmark donor tier assignment (app/tiers.py) on --donors generated
+# donors: the bulk recompute (first assignment, a no-op rerun, a moved
+# threshold) and the in-memory lookup payments use per donation.
+#   python manage.py benchmark_tiers --donors 1000000
+# Everything runs in one transaction that is rolled back, so the database is
+# left as it was, but the generated rows are written (and the donor table
+# locked) until then: point it at a scratch database.
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.models import DonorProfile, DonorTier, EduUser
+from app.tiers import recompute_tiers, tier_table
+
+_USERS_SQL = """
+INSERT INTO {users} (password, is_superuser, username, first_name, last_name, email,
+                     is_staff, is_active, date_joined, is_student, is_donor)
+SELECT '!', false, 'bench-tier-' || n, '', '', 'bench-tier-' || n || '@example.com',
+       false, true, now(), false, true
+FROM generate_series(1, %s) AS n
+"""
+
+# totals spread over 0-2000 with a long tail, so every tier gets donors
+_DONORS_SQL = """
+INSERT INTO {donors} (user_id, full_name, email, total_donations, updated_at)
+SELECT id, username, email, round((random() ^ 3 * 2000)::numeric, 2), now()
+FROM {users} WHERE username LIKE 'bench-tier-%%'
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time tier recompute and lookups on generated donors (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--donors", type=int, default=1_000_000)
+        parser.add_argument("--chunk-size", type=int, default=None, help="donor ids per UPDATE (default TIER_RECOMPUTE_CHUNK_SIZE)")
+        parser.add_argument("--lookups", type=int, default=1_000_000, help="in-memory tier lookups to time")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+        tier_table.invalidate()
+        self.stdout.write("rolled back")
+
+    def timed(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f"{label:<28} {time.perf_counter() - started:8.2f}s  {result}")
+        return result
+
+    def run(self, options):
+        def seed():
+            with connection.cursor() as cursor:
+                names = {"users": EduUser._meta.db_table, "donors": DonorProfile._meta.db_table}
+                cursor.execute(_USERS_SQL.format(**names), [options["donors"]])
+                cursor.execute(_DONORS_SQL.format(**names))
+                cursor.execute(f"ANALYZE {names['donors']}")
+                return f"{options['donors']} donors"
+
+        def tiers():
+            # the bundled thresholds, unless the database has its own
+            for name, minimum in [("bronze", 10), ("silver", 100), ("gold", 1000)]:
+                DonorTier.objects.get_or_create(name=name, defaults={"min_donation": minimum})
+            return list(DonorTier.objects.order_by("min_donation").values_list("name", "min_donation"))
+
+        def recompute():
+            changed, _ = recompute_tiers(options["chunk_size"])
+            return f"{changed} changed"
+
+        def move_threshold():
+            # what an admin edit does: the middle tier's threshold moves
+            tier = DonorTier.objects.order_by("min_donation")[1]
+            DonorTier.objects.filter(id=tier.id).update(min_donation=tier.min_donation * Decimal("1.5"))
+            return recompute()
+
+        def lookups():
+            totals = [Decimal(random.randint(0, 200_000)) / 100 for _ in range(options["lookups"])]
+            tier_table.load()
+            started = time.perf_counter()
+            for total in totals:
+                tier_table.tier_for(total)
+            per_call = (time.perf_counter() - started) / len(totals)
+            return f"{per_call * 1e6:.2f} us per lookup"
+
+        self.timed("seed", seed)
+        self.timed("tiers", tiers)
+        self.timed("initial assignment", recompute)
+        self.timed("no-op rerun", recompute)
+        self.timed("threshold moved", move_threshold)
+        self.timed(f"{options['lookups']} lookups", lookups)
@@ -0,0 +1,51 @@
+# app/management/commands/export_campaigns.py
+# Bulk export for reporting jobs, e.g.
+#   python manage.py export_campaigns --format csv --since 2026-10-01T00:00:00Z -o campaigns.csv
+#   python manage.py export_campaigns --dataset donors --format ndjson > donors.ndjson
+#   python manage.py export_campaigns --dataset donations --format csv --since 2026-10-01T00:00:00Z -o donations.csv
+# Memory stays bounded by one batch (--batch-size rows) however many rows
+# are exported; see app/exports.py.
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app import exports
+
+
+class Command(BaseCommand):
+    help = "Stream campaigns (or students/donors/donations) as NDJSON or CSV, optionally only rows updated since a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", choices=sorted(exports.DATASETS), default="campaigns")
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="ndjson")
+        parser.add_argument("--since", help="only rows with updated_at (donations: created_at) >= this ISO datetime")
+        parser.add_argument("--batch-size", type=int, default=None, help="rows per query (default STREAM_CHUNK_SIZE)")
+        parser.add_argument("-o", "--output", help="file to write (default stdout)")
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError("--since must be an ISO datetime")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        chunks = exports.export(options["dataset"], options["format"], since=since, batch_size=options["batch_size"])
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                out.close()
+            else:
+                out.flush()
+        self.stderr.write(f"exported {options['dataset']} ({written} bytes)")
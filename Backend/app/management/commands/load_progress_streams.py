@@ -0,0 +1,157 @@
+# app/management/commands/load_progress_streams.py
+# Load test for the campaign progress streams (app/live.py). Opens --streams
+# idle SSE connections spread over --campaigns active campaigns against a
+# running ASGI server, holds them for --hold seconds, then records one
+# donation per campaign (a real one, through app.payments, in the database
+# this command is configured for) and measures how long each update takes to
+# reach every stream.
+#   uvicorn backend.asgi:application --port 8000 --workers 1 &
+#   python manage.py load_progress_streams --url http://127.0.0.1:8000 --streams 20000
+# Every stream is a file descriptor on both sides: raise ``ulimit -n`` first.
+# Past a few thousand streams, split the load over several of these processes
+# (each one is a single event loop) and use --no-donate on all but one.
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.models import Campaign
+from app.payments import record_donation
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Load:
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.open = 0
+        self.failed = 0
+        self.closed = 0
+        self.heartbeats = 0
+        self.connect_times = []
+        self.latencies = []
+        self.donated_at = {}  # campaign id -> time.monotonic() of its donation
+        self.writers = []
+
+    async def stream(self, campaign_id):
+        started = time.monotonic()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+            writer.write(
+                f"GET /campaigns/{campaign_id}/stream HTTP/1.1\r\n"
+                f"Host: {self.host}\r\nAccept: text/event-stream\r\n\r\n".encode()
+            )
+            status = await asyncio.wait_for(reader.readline(), self.timeout)
+            if b" 200 " not in status:
+                raise ConnectionError(status.decode(errors="replace").strip())
+            # the first event is the snapshot
+            while not (await asyncio.wait_for(reader.readline(), self.timeout)).startswith(b"data: "):
+                pass
+        except (OSError, asyncio.TimeoutError, ConnectionError):
+            self.failed += 1
+            return
+        self.open += 1
+        self.connect_times.append(time.monotonic() - started)
+        self.writers.append(writer)
+        try:
+            # chunked transfer encoding: each event is its own chunk, so lines
+            # arrive whole and the chunk-size lines never match below
+            while line := await reader.readline():
+                if line.startswith(b": keepalive"):
+                    self.heartbeats += 1
+                elif line.startswith(b"data: ") and campaign_id in self.donated_at:
+                    self.latencies.append(time.monotonic() - self.donated_at[campaign_id])
+        except OSError:
+            pass
+        self.closed += 1
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+class Command(BaseCommand):
+    help = "Hold many campaign progress streams open and time donation fan-out."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="base URL of the ASGI server")
+        parser.add_argument("--streams", type=int, default=1000, help="connections to open")
+        parser.add_argument("--campaigns", type=int, default=100, help="active campaigns to spread them over")
+        parser.add_argument("--connect-rate", type=int, default=500, help="new connections per second")
+        parser.add_argument("--hold", type=float, default=30, help="seconds to hold the streams idle before donating")
+        parser.add_argument("--wait", type=float, default=10, help="seconds to wait for updates after donating")
+        parser.add_argument("--timeout", type=float, default=30, help="seconds allowed to open one stream")
+        parser.add_argument("--no-donate", action="store_true", help="only hold the streams")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("--url must be a plain http:// URL")
+        campaign_ids = list(
+            Campaign.objects.filter(status="active").order_by("id").values_list("id", flat=True)[:options["campaigns"]]
+        )
+        if not campaign_ids:
+            raise CommandError("no active campaigns")
+        connections.close_all()
+        load = Load(url.hostname, url.port or 80, options["timeout"])
+        asyncio.run(self.run(load, campaign_ids, options))
+
+    async def run(self, load, campaign_ids, options):
+        started = time.monotonic()
+        tasks = []
+        for i in range(options["streams"]):
+            tasks.append(asyncio.create_task(load.stream(campaign_ids[i % len(campaign_ids)])))
+            if (i + 1) % options["connect_rate"] == 0:
+                await asyncio.sleep(1)
+        while load.open + load.failed < options["streams"]:
+            await asyncio.sleep(0.1)
+        self.stdout.write(
+            f"{load.open} streams open, {load.failed} failed in {time.monotonic() - started:.1f}s; "
+            f"connect p50 {_percentile(load.connect_times, 0.5) or 0:.3f}s "
+            f"p99 {_percentile(load.connect_times, 0.99) or 0:.3f}s"
+        )
+
+        await asyncio.sleep(options["hold"])
+        self.stdout.write(
+            f"after {options['hold']:.0f}s idle: {load.open - load.closed} still open, "
+            f"{load.heartbeats} heartbeats received"
+        )
+
+        if not options["no_donate"]:
+            expected = load.open - load.closed
+            await asyncio.to_thread(self.donate, load, campaign_ids)
+            deadline = time.monotonic() + options["wait"]
+            while len(load.latencies) < expected and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            latencies = load.latencies
+            self.stdout.write(
+                f"{len(latencies)}/{expected} streams got the update; "
+                f"p50 {_percentile(latencies, 0.5) or 0:.3f}s p99 {_percentile(latencies, 0.99) or 0:.3f}s "
+                f"max {max(latencies, default=0):.3f}s (mean {statistics.fmean(latencies) if latencies else 0:.3f}s), "
+                "coalescing window included"
+            )
+
+        load.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def donate(self, load, campaign_ids):
+        try:
+            for campaign_id in campaign_ids:
+                load.donated_at[campaign_id] = time.monotonic()
+                record_donation(campaign_id, "1.00", provider="manual", provider_ref=f"load-{campaign_id}-{time.time_ns()}")
+        finally:
+            connections.close_all()
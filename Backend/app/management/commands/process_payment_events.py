@@ -0,0 +1,39 @@
+# app/management/commands/process_payment_events.py
+# Apply staged payment webhooks to the donation ledger (app/payments.py).
+# The webhook queues a background job that does this (app/tasks.py); run
+# the command by hand, e.g. after replay_payment_events, or from cron
+# instead of run_workers. Several can run side by side, each claiming its
+# own batches:
+#   python manage.py process_payment_events --every 2
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.payments import apply_pending_events
+
+
+class Command(BaseCommand):
+    help = "Apply staged payment webhook events to the donation ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, help="repeat every N seconds instead of running once")
+        parser.add_argument("--batch-size", type=int, default=None, help="events per transaction (default PAYMENT_EVENTS_BATCH_SIZE)")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or settings.PAYMENT_EVENTS_BATCH_SIZE
+        while True:
+            applied = failed = 0
+            started = time.perf_counter()
+            # drain the queue, one batch per transaction
+            while True:
+                batch_applied, batch_failed = apply_pending_events(batch_size)
+                applied += batch_applied
+                failed += batch_failed
+                if batch_applied + batch_failed < batch_size:
+                    break
+            if applied or failed or not options["every"]:
+                self.stdout.write(f"applied {applied} events, {failed} failed in {time.perf_counter() - started:.2f}s")
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,34 @@
+# app/management/commands/rank_campaigns.py
+# Recompute the discovery ranking (app/ranking.py). Run it from cron, e.g.
+# every 10 minutes, or keep it running with --every:
+#   python manage.py rank_campaigns --every 600
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+
+from app.ranking import rank_campaigns
+
+
+class Command(BaseCommand):
+    help = "Score active campaigns for the recommended feeds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, help="repeat every N seconds instead of running once")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                updated, dropped, seconds = rank_campaigns()
+                self.stdout.write(f"updated {updated} scores, dropped {dropped} in {seconds:.2f}s")
+            except ImproperlyConfigured as e:
+                raise CommandError(e)
+            except OperationalError as e:
+                # over the time budget: the previous ranking is still served
+                self.stderr.write(f"ranking failed: {e}")
+                if not options["every"]:
+                    raise
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,18 @@
+# app/management/commands/recompute_tiers.py
+# Reassign every donor's tier after DonorTier thresholds change
+# (app/tiers.py); donations keep tiers current in between:
+#   python manage.py recompute_tiers --chunk-size 100000
+from django.core.management.base import BaseCommand
+
+from app.tiers import recompute_tiers
+
+
+class Command(BaseCommand):
+    help = "Reassign donor tiers from the current DonorTier thresholds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=None, help="donor ids per UPDATE (default TIER_RECOMPUTE_CHUNK_SIZE)")
+
+    def handle(self, *args, **options):
+        changed, seconds = recompute_tiers(options["chunk_size"])
+        self.stdout.write(f"changed {changed} tiers in {seconds:.2f}s")
@@ -0,0 +1,42 @@
+# app/management/commands/replay_payment_events.py
+# Queue the payment webhooks received in a time window again, e.g. after a
+# bug made them fail; they are applied by a background job:
+#   python manage.py replay_payment_events --since 2026-10-01T00:00:00Z --until 2026-10-02T00:00:00Z --provider stripe
+# Payments already in the ledger are not counted twice (app/payments.py).
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app import jobs
+from app.payments import PAYMENT_EVENT_TYPES, replay_events
+
+
+def _datetime(value, option):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f"{option} must be an ISO datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Re-queue the payment webhook events received in a time window."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", required=True, help="events received at or after this ISO datetime")
+        parser.add_argument("--until", help="events received before this ISO datetime (default now)")
+        parser.add_argument("--provider", choices=sorted(PAYMENT_EVENT_TYPES))
+
+    def handle(self, *args, **options):
+        since = _datetime(options["since"], "--since")
+        until = _datetime(options["until"], "--until") if options["until"] else timezone.now()
+        if until <= since:
+            raise CommandError("--until must be after --since")
+        count = replay_events(since, until, provider=options["provider"])
+        if count:
+            jobs.enqueue("payments.apply_events", key="payments.apply_events", priority=10)
+        self.stdout.write(f"queued {count} events again")
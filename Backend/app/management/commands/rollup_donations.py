@@ -0,0 +1,43 @@
+# app/management/commands/rollup_donations.py
+# Daily donation rollups behind the analytics/ endpoints (app/analytics.py).
+# Without arguments, adds the donations still pending (the background job
+# normally does); --rebuild recomputes them from the ledger, e.g. once after
+# deploying them:
+#   python manage.py rollup_donations
+#   python manage.py rollup_donations --rebuild --since 2026-01-01
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from app.analytics import rebuild_rollups, rollup_pending
+
+
+class Command(BaseCommand):
+    help = "Add pending donations to the daily rollups, or rebuild them from the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from the ledger")
+        parser.add_argument("--since", help="with --rebuild, only the days from this date (YYYY-MM-DD) on")
+
+    def handle(self, *args, **options):
+        if not options["rebuild"]:
+            if options["since"]:
+                raise CommandError("--since needs --rebuild")
+            total = 0
+            while True:
+                added = rollup_pending()
+                total += added
+                if not added:
+                    break
+            self.stdout.write(f"added {total} donations to the rollups")
+            return
+
+        since = None
+        if options["since"]:
+            try:
+                since = parse_date(options["since"])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError("--since must be a date (YYYY-MM-DD)")
+        donations, seconds = rebuild_rollups(since)
+        self.stdout.write(f"rolled up {donations} donations in {seconds:.2f}s")
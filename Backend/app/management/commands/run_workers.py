@@ -0,0 +1,73 @@
+# app/management/commands/run_workers.py
+# Background job workers (app/jobs.py): a supervisor process forking
+# --processes workers, restarting any that die. SIGTERM/SIGINT stop them
+# after their current job.
+#   python manage.py run_workers --processes 4
+#   python manage.py run_workers --burst      # run what is ready, then exit
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app import jobs
+
+logger = logging.getLogger(__name__)
+
+
+def _worker(stop, batch_size):
+    # the supervisor gets the signal and sets ``stop``; a handler here could
+    # deadlock on the Event's lock while the loop waits on it
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        jobs.work(stop, batch_size)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background job workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="worker processes (default: one per CPU)")
+        parser.add_argument("--batch-size", type=int, default=1, help="jobs claimed at a time per worker")
+        parser.add_argument("--burst", action="store_true", help="run the jobs that are ready in this process, then exit")
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        if options["burst"]:
+            jobs.work(stop, options["batch_size"], burst=True)
+            return
+
+        # forked children must not share the parent's database connections
+        connections.close_all()
+
+        def spawn():
+            process = context.Process(target=_worker, args=(stop, options["batch_size"]), daemon=False)
+            process.start()
+            return process
+
+        stopping = []
+
+        def shutdown(signum, frame):
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        processes = [spawn() for _ in range(options["processes"])]
+        self.stdout.write(f"started {len(processes)} workers")
+        while not stopping:
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.error("Job worker %s exited with %s; restarting", process.pid, process.exitcode)
+                    processes[i] = spawn()
+            time.sleep(1)
+        stop.set()
+        for process in processes:
+            process.join()
+        self.stdout.write("workers stopped")
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:29
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def _keeper(users, Campaign):
+    # the account whose profile runs a campaign, else one with a profile,
+    # else the oldest
+    def rank(user):
+        has_campaign = Campaign.objects.filter(student__user=user).exists()
+        has_profile = any(
+            rel.related_model.objects.filter(**{rel.field.name: user}).exists()
+            for rel in user._meta.related_objects
+            if rel.one_to_one
+        )
+        return (not has_campaign, not has_profile, user.id)
+    return min(users, key=rank)
+
+
+def _merge(duplicate, keeper):
+    """Move what hangs off ``duplicate`` to ``keeper``; returns False when a
+    profile could not move because ``keeper`` already has one."""
+    merged = True
+    for rel in duplicate._meta.related_objects:
+        model, field = rel.related_model, rel.field.name
+        rows = model.objects.filter(**{field: duplicate})
+        if rel.one_to_many:
+            rows.update(**{field: keeper})
+        elif rel.one_to_one and rows.exists():
+            if model.objects.filter(**{field: keeper}).exists():
+                merged = False
+            else:
+                rows.update(**{field: keeper})
+    keeper.groups.add(*duplicate.groups.all())
+    keeper.user_permissions.add(*duplicate.user_permissions.all())
+    keeper.is_student = keeper.is_student or duplicate.is_student
+    keeper.is_donor = keeper.is_donor or duplicate.is_donor
+    if duplicate.last_login and (keeper.last_login is None or duplicate.last_login > keeper.last_login):
+        keeper.last_login = duplicate.last_login
+    keeper.save(update_fields=["is_student", "is_donor", "last_login"])
+    return merged
+
+
+def merge_duplicate_emails(apps, schema_editor):
+    """Fold users sharing an email into one so the constraint can be added.
+
+    Profiles and other rows move to the kept user. A duplicate whose profile
+    cannot move (both have a student profile) keeps it under a blank email,
+    which the constraint allows, instead of losing the profile's data.
+    """
+    EduUser = apps.get_model('app', 'EduUser')
+    Campaign = apps.get_model('app', 'Campaign')
+    duplicated = (
+        EduUser.objects.exclude(email='')
+        .values('email')
+        .annotate(users=Count('id'))
+        .filter(users__gt=1)
+        .values_list('email', flat=True)
+    )
+    for email in list(duplicated):
+        users = list(EduUser.objects.filter(email=email).order_by('id'))
+        keeper = _keeper(users, Campaign)
+        for duplicate in users:
+            if duplicate.pk == keeper.pk:
+                continue
+            if _merge(duplicate, keeper):
+                duplicate.delete()
+            else:
+                duplicate.email = ''
+                duplicate.save(update_fields=['email'])
+    if schema_editor.connection.vendor == 'postgresql':
+        # run the deferred FK checks now; PostgreSQL will not build the index
+        # below on a table with checks still pending
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_donorprofile_avatar_url_studentprofile_avatar_url'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eduuser',
+            constraint=models.UniqueConstraint(condition=models.Q(('email', ''), _negated=True), fields=('email',), name='app_eduuser_email_unique'),
+        ),
+    ]
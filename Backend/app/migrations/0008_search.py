@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:33
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Stored generated tsvector columns, kept out of the model state on purpose
+# (see app/search.py). Weight A = names/titles, B = everything else.
+CAMPAIGN_VECTOR = """
+ALTER TABLE app_campaign ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+) STORED;
+CREATE INDEX app_campaign_search_idx ON app_campaign USING GIN (search_vector);
+"""
+
+STUDENT_VECTOR = """
+ALTER TABLE app_studentprofile ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(full_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(university, '') || ' ' || coalesce(major, '')), 'B')
+) STORED;
+CREATE INDEX app_student_search_idx ON app_studentprofile USING GIN (search_vector);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            CAMPAIGN_VECTOR,
+            reverse_sql="ALTER TABLE app_campaign DROP COLUMN search_vector;",
+        ),
+        migrations.RunSQL(
+            STUDENT_VECTOR,
+            reverse_sql="ALTER TABLE app_studentprofile DROP COLUMN search_vector;",
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='app_campaign_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='studentprofile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['full_name'], name='app_student_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
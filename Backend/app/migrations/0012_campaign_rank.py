@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_export_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignRank',
+            fields=[
+                ('campaign', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='app.campaign')),
+                ('category', models.CharField(max_length=50)),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.studentprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score', '-campaign'], name='app_rank_score_idx'), models.Index(fields=['category', '-score', '-campaign'], name='app_rank_cat_score_idx')],
+            },
+        ),
+    ]
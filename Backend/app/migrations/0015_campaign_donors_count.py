@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# supporters and counts for the donations already in the ledger
+BACKFILL = """
+INSERT INTO app_campaigndonor (campaign_id, donor_id, first_donated_at)
+SELECT campaign_id, donor_id, min(created_at) FROM app_donation
+WHERE campaign_id IS NOT NULL AND donor_id IS NOT NULL
+GROUP BY campaign_id, donor_id;
+UPDATE app_campaign c SET donors_count = s.n
+FROM (SELECT campaign_id, count(*) AS n FROM app_campaigndonor GROUP BY campaign_id) s
+WHERE c.id = s.campaign_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_payment_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='donors_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CampaignDonor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_donated_at', models.DateTimeField()),
+                ('campaign', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.campaign')),
+                ('donor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.donorprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'donor'), name='app_campaigndonor_unique')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL, reverse_sql=migrations.RunSQL.noop),
+    ]
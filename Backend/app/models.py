@@ -1,4 +1,5 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
 class EduUser(AbstractUser):
@@ -20,6 +21,17 @@ class EduUser(AbstractUser):
     is_student = models.BooleanField(default=False)
     is_donor = models.BooleanField(default=False)
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Supabase users are keyed by email; login sync upserts on it
+            # (INSERT ... ON CONFLICT (email)). Blank emails stay allowed.
+            models.UniqueConstraint(
+                fields=['email'],
+                condition=~models.Q(email=''),
+                name='app_eduuser_email_unique',
+            ),
+        ]
+
 
 class StudentProfile(models.Model):
     user = models.OneToOneField(EduUser, on_delete=models.CASCADE)
@@ -30,6 +42,17 @@ class StudentProfile(models.Model):
     major = models.CharField(max_length=255, null=True, blank=True)
     academic_year = models.CharField(max_length=50, null=True, blank=True)
     gpa = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination order for discover/list endpoints
+            models.Index(fields=['full_name', 'id'], name='app_student_name_id_idx'),
+            # typo-tolerant name search (app/search.py)
+            GinIndex(fields=['full_name'], name='app_student_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            # incremental exports (app/exports.py)
+            models.Index(fields=['updated_at', 'id'], name='app_student_updated_idx'),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -39,7 +62,7 @@ class StudentProfile(models.Model):
         """Count unique donors for this student's campaign"""
         campaign = getattr(self, 'campaign', None)  # OneToOne gives direct attribute
         if campaign:
-            return campaign.donation_set.values('donor').distinct().count()
+            return campaign.donors_count
         return 0
 
 
@@ -53,6 +76,7 @@ class DonorTier(models.Model):
     description = models.TextField(blank=True)
     min_donation = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     benefits = models.JSONField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name.capitalize()} Tier"
@@ -65,6 +89,13 @@ class DonorProfile(models.Model):
     avatar_url = models.URLField(null=True, blank=True)
     total_donations = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     tier = models.ForeignKey(DonorTier, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # incremental exports (app/exports.py)
+            models.Index(fields=['updated_at', 'id'], name='app_donor_updated_idx'),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -93,6 +124,8 @@ class Campaign(models.Model):
     description = models.TextField()
     goal_amount = models.DecimalField(max_digits=10, decimal_places=2)
     current_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # unique donors so far, kept up to date by app/payments.py
+    donors_count = models.PositiveIntegerField(default=0)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='education')
     image_url = models.URLField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
@@ -103,6 +136,18 @@ class Campaign(models.Model):
     class Meta:
         db_table = 'app_campaign'
         ordering = ['-created_at']
+        indexes = [
+            # keyset pagination of active campaigns, newest first
+            models.Index(fields=['status', '-created_at', '-id'], name='app_campaign_status_new_idx'),
+            # one per ?sort= / filter combination of get_campaigns (app/filters.py)
+            models.Index(fields=['status', 'category', '-created_at', '-id'], name='app_campaign_cat_new_idx'),
+            models.Index(fields=['status', 'deadline', 'id'], name='app_campaign_deadline_idx'),
+            models.Index(fields=['status', 'goal_amount', 'id'], name='app_campaign_goal_idx'),
+            models.Index(fields=['status', '-current_amount', '-id'], name='app_campaign_raised_idx'),
+            GinIndex(fields=['title'], name='app_campaign_title_trgm_idx', opclasses=['gin_trgm_ops']),
+            # incremental exports (app/exports.py)
+            models.Index(fields=['updated_at', 'id'], name='app_campaign_updated_idx'),
+        ]
         
     def __str__(self):
         return self.title
@@ -117,3 +162,227 @@ class Campaign(models.Model):
     def is_deadline_passed(self):
         from django.utils import timezone
         return timezone.now() > self.deadline
+
+
+class CampaignRank(models.Model):
+    """Discovery score of an active campaign, recomputed on a schedule by
+    app/ranking.py. Recommended feeds read this table in score order."""
+    campaign = models.OneToOneField(Campaign, on_delete=models.CASCADE, primary_key=True, related_name='rank')
+    # copied from the campaign so feeds need no join to filter or to find
+    # the student
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='+', db_index=False)
+    category = models.CharField(max_length=50)
+    score = models.FloatField()
+    # when the score was last written (unchanged scores are not rewritten)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-campaign'], name='app_rank_score_idx'),
+            models.Index(fields=['category', '-score', '-campaign'], name='app_rank_cat_score_idx'),
+        ]
+
+
+class Donation(models.Model):
+    """One confirmed payment: the append-only ledger behind
+    Campaign.current_amount and DonorProfile.total_donations (app/payments.py)."""
+    PROVIDER_CHOICES = [
+        ('stripe', 'Stripe'),
+        ('paypal', 'PayPal'),
+        ('manual', 'Manual'),
+    ]
+
+    # money already received stays on record if the campaign or donor goes
+    campaign = models.ForeignKey(Campaign, on_delete=models.SET_NULL, null=True)
+    donor = models.ForeignKey(DonorProfile, on_delete=models.SET_NULL, null=True, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default='usd')
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES, default='manual')
+    # the provider's payment id (PaymentIntent, capture id); blank for manual
+    provider_ref = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # a payment is counted once, however often it is reported
+            models.UniqueConstraint(
+                fields=['provider', 'provider_ref'],
+                condition=~models.Q(provider_ref=''),
+                name='app_donation_provider_ref_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', 'created_at'], name='app_donation_campaign_idx'),
+            models.Index(fields=['donor', 'created_at'], name='app_donation_donor_idx'),
+            # incremental exports (app/exports.py)
+            models.Index(fields=['created_at', 'id'], name='app_donation_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} {self.currency} to campaign {self.campaign_id}"
+
+
+class CampaignDonor(models.Model):
+    """A donor who has given to a campaign. The row is written with the
+    donor's first donation to it, which is when Campaign.donors_count goes
+    up (app/payments.py)."""
+    # the unique constraint indexes campaign first
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='+', db_index=False)
+    donor = models.ForeignKey(DonorProfile, on_delete=models.CASCADE, related_name='+')
+    first_donated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'donor'], name='app_campaigndonor_unique'),
+        ]
+
+    def __str__(self):
+        return f"donor {self.donor_id} of campaign {self.campaign_id}"
+
+
+class CampaignDailyStats(models.Model):
+    """Donations to a campaign on one day (UTC). This and the two rollups
+    below are summed from the ledger by app/analytics.py and serve the
+    analytics/ endpoints."""
+    # the unique constraint indexes campaign first
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='+', db_index=False)
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donations = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'day'], name='app_campaigndaily_unique'),
+        ]
+
+
+class CategoryDailyStats(models.Model):
+    """Donations to the campaigns of a category on one day (UTC)."""
+    category = models.CharField(max_length=50)
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donations = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'day'], name='app_categorydaily_unique'),
+        ]
+
+
+class UniversityDailyStats(models.Model):
+    """Donations to the students of a university on one day (UTC); blank
+    university for students who have not set one."""
+    university = models.CharField(max_length=255, blank=True)
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donations = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['university', 'day'], name='app_universitydaily_unique'),
+        ]
+        indexes = [
+            # top universities over a range of days
+            models.Index(fields=['day'], name='app_universitydaily_day_idx'),
+        ]
+
+
+class PendingRollup(models.Model):
+    """A donation not yet added to the daily rollups (app/analytics.py)."""
+    donation = models.OneToOneField(Donation, on_delete=models.CASCADE, primary_key=True, related_name='+')
+
+
+class PaymentEvent(models.Model):
+    """A verified payment webhook, staged as received and applied to the
+    Donation ledger in batches (app/payments.py)."""
+    provider = models.CharField(max_length=20, choices=Donation.PROVIDER_CHOICES)
+    # the provider's event id (evt_..., WH-...); redeliveries repeat it
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # why the event could not be applied; blank when it was
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='app_paymentevent_unique'),
+        ]
+        indexes = [
+            # the queue: only unprocessed events are indexed
+            models.Index(
+                fields=['id'], condition=models.Q(processed_at__isnull=True),
+                name='app_paymentevent_pending_idx',
+            ),
+            models.Index(fields=['received_at'], name='app_paymentevent_received_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id}"
+
+
+class Job(models.Model):
+    """A unit of background work, run by manage.py run_workers (app/jobs.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+    ]
+
+    # a name registered with @jobs.task
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict, blank=True)
+    # higher runs first
+    priority = models.SmallIntegerField(default=0)
+    # at most one queued job per non-blank key: enqueueing it again is a no-op
+    key = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    # not claimed before this time (retry backoff, delayed jobs)
+    run_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status='queued') & ~models.Q(key=''),
+                name='app_job_queued_key_unique',
+            ),
+        ]
+        indexes = [
+            # the claim query; only queued jobs are indexed
+            models.Index(
+                fields=['-priority', 'run_at', 'id'], condition=models.Q(status='queued'),
+                name='app_job_queued_idx',
+            ),
+            # stalled-job recovery
+            models.Index(fields=['started_at'], condition=models.Q(status='running'), name='app_job_running_idx'),
+            # latency metrics and purging
+            models.Index(fields=['finished_at'], condition=models.Q(status='done'), name='app_job_done_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+class DeadJob(models.Model):
+    """A job that failed on every attempt; kept for inspection and requeueing."""
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0)
+    key = models.CharField(max_length=200, blank=True)
+    attempts = models.PositiveSmallIntegerField()
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} (dead, {self.attempts} attempts)"
@@ -0,0 +1,136 @@
+# app/pagination.py
+# Keyset (cursor) pagination for the list endpoints.
+# A page is "rows after the last row of the previous page" in a fixed
+# (sort key, id) order, so page 1000 costs the same index range scan as page 1
+# (no OFFSET). Cursors are opaque to clients: urlsafe base64 of the last row's
+# key values.
+#
+# The response body stays a JSON array (the frontend reads it as one); the
+# next page is advertised through the X-Next-Cursor and Link headers.
+import base64
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Field, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Row(Func):
+    """A row value, ``(a, b)``, for row-value comparisons."""
+    template = "(%(expressions)s)"
+    output_field = Field()
+
+
+def page_size(request):
+    """Read ``?limit=`` clamped to PAGINATION_MAX_PAGE_SIZE."""
+    try:
+        size = int(request.GET.get("limit", settings.PAGINATION_DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        size = settings.PAGINATION_DEFAULT_PAGE_SIZE
+    return max(1, min(size, settings.PAGINATION_MAX_PAGE_SIZE))
+
+
+class KeysetPaginator:
+    """Paginate on a sort column plus a unique tiebreaker, e.g.
+    ``KeysetPaginator(("full_name", "id"))`` or ``(("-created_at", "-id"))``.
+    Both columns must sort in the same direction and be covered by an index.
+    """
+
+    def __init__(self, ordering):
+        lead, tiebreak = ordering
+        self.ordering = ordering
+        self.descending = lead.startswith("-")
+        if tiebreak.startswith("-") != self.descending:
+            raise ValueError("keyset columns must share one sort direction")
+        self.fields = (lead.lstrip("-"), tiebreak.lstrip("-"))
+
+    def encode(self, row):
+        values = []
+        for name in self.fields:
+            value = getattr(row, name) if not isinstance(row, dict) else row[name]
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode(self, cursor, model):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != 2:
+                raise ValueError
+            return [self._to_python(model, name, v) for name, v in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor("Invalid cursor")
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # annotation such as a search rank; JSON already round-trips it
+            if not isinstance(value, (int, float, str)):
+                raise InvalidCursor("Invalid cursor")
+            return value
+
+    def after(self, values):
+        """Rows strictly after ``values`` in this ordering, for filter().
+
+        A row-value comparison, ``(lead, id) > (x, y)``: PostgreSQL uses the
+        whole tuple as the index range condition, so rows sharing the lead
+        value (ties on goal_amount, bulk-updated timestamps) are skipped in
+        the index, not rescanned and filtered on every page.
+        """
+        keyset = Row(*(F(name) for name in self.fields))
+        lookup = LessThan if self.descending else GreaterThan
+        return lookup(keyset, Row(*(Value(v) for v in values)))
+
+    def page_queryset(self, queryset, request):
+        """Return ``(queryset slice of size+1, size)``; raises InvalidCursor."""
+        size = page_size(request)
+        cursor = request.GET.get("cursor")
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode(cursor, queryset.model)))
+        # one extra row tells us whether there is a next page
+        return queryset.order_by(*self.ordering)[:size + 1], size
+
+    def finish(self, rows, size):
+        """Trim the look-ahead row; returns ``(rows, next_cursor or None)``."""
+        if len(rows) > size:
+            rows = rows[:size]
+            return rows, self.encode(rows[-1])
+        return rows, None
+
+    def paginate(self, queryset, request):
+        page, size = self.page_queryset(queryset, request)
+        return self.finish(list(page), size)
+
+    async def apaginate(self, queryset, request):
+        page, size = self.page_queryset(queryset, request)
+        return self.finish([row async for row in page], size)
+
+
+def add_pagination_headers(response, request, next_cursor):
+    if next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+        response["X-Next-Cursor"] = next_cursor
+        response["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+STUDENT_PAGINATOR = KeysetPaginator(("full_name", "id"))
+CAMPAIGN_PAGINATOR = KeysetPaginator(("-created_at", "-id"))
+# search results, best match first (``relevance`` is annotated by app/search.py;
+# not ``rank``, which is Campaign's CampaignRank relation)
+SEARCH_PAGINATOR = KeysetPaginator(("-relevance", "-id"))
@@ -0,0 +1,527 @@
+# app/payments.py
+# Recording confirmed payments. Every donation is appended to the Donation
+# ledger and added to Campaign.current_amount and DonorProfile.total_donations
+# in the same transaction, as database-side increments
+# (``SET x = x + amount``): concurrent donations to one campaign queue on its
+# row lock only for the duration of that UPDATE and the commit, and none of
+# them can overwrite another's total the way a Python read-modify-write would.
+#
+# The campaign row, the contended one, is updated last so its lock is held
+# for as short a time as possible; rows are always locked donor first, then
+# campaign, so two donations cannot deadlock.
+#
+# These are UPDATE statements, not Model.save(): no signal fires and auto_now
+# is not applied, so updated_at is set explicitly and the caches are
+# invalidated here, after commit. The donor UPDATE returns the new total,
+# and the donor's tier is re-evaluated against it (app/tiers.py) while the
+# row is still locked.
+#
+# Campaign.donors_count counts unique donors without a DISTINCT over the
+# ledger: a donor's first donation to a campaign inserts their
+# (campaign, donor) row into app_campaigndonor, and the campaign UPDATE adds
+# the number of rows actually inserted (0 for a repeat donor; the unique
+# index settles concurrent first donations). ``reconcile_donors_count()``
+# and ``reconcile_current_amount()`` recompute the counts and totals from the
+# ledger and report any drift.
+#
+# The campaign UPDATE returns the new totals, and they are sent to
+# pg_notify() in the same transaction, so the SSE streams of app/live.py hear
+# of a donation when, and only if, it commits. New donations are also queued
+# for the daily rollups (app/analytics.py), which are summed outside this
+# transaction.
+#
+# Webhooks. Providers deliver at least once, and in bursts (retries after an
+# outage, a popular campaign closing). The endpoint only checks the signature
+# and stages the event in app_paymentevent with INSERT ... ON CONFLICT DO
+# NOTHING on (provider, event id): a redelivery is a no-op, and the provider
+# gets its 200 without queueing on the contended campaign rows.
+# ``apply_pending_events()``, run by a background job the endpoint queues
+# (app/tasks.py) or by manage.py process_payment_events, then claims
+# up to PAYMENT_EVENTS_BATCH_SIZE staged events with FOR UPDATE SKIP LOCKED,
+# so several workers never wait on each other, and applies them in one
+# transaction: one bulk INSERT into the ledger and one increment per donor
+# and per campaign touched, however many of the events hit it. The ledger's
+# (provider, provider_ref) constraint still counts each payment once, also
+# when a window of events is replayed (manage.py replay_payment_events).
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+import zlib
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlsplit
+
+import httpx
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from app import analytics, live
+from app.models import Campaign, CampaignDonor, Donation, DonorProfile, PaymentEvent
+from app.response_cache import catalog_cache, detail_cache
+from app.tiers import tier_table
+from app.utils import LRUCache
+
+CENT = Decimal("0.01")
+
+
+class PaymentError(ValueError):
+    pass
+
+
+class WebhookSignatureError(PaymentError):
+    pass
+
+
+def _amount(value):
+    try:
+        amount = Decimal(str(value)).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        raise PaymentError(f"Invalid amount '{value}'")
+    if amount <= 0:
+        raise PaymentError("Amount must be positive")
+    return amount
+
+
+def _add_to_donor(cursor, donor_id, amount, now):
+    # returns False when there is no such donor
+    table = DonorProfile._meta.db_table
+    cursor.execute(
+        f"UPDATE {table} SET total_donations = total_donations + %s, updated_at = %s "
+        "WHERE id = %s RETURNING total_donations, tier_id",
+        [amount, now, donor_id],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    total, tier_id = row
+    new_tier_id = tier_table.tier_for(total)
+    if new_tier_id != tier_id:
+        cursor.execute(f"UPDATE {table} SET tier_id = %s WHERE id = %s", [new_tier_id, donor_id])
+    return True
+
+
+def _add_supporters(cursor, pairs, now):
+    # records (campaign_id, donor_id) pairs; returns {campaign_id: pairs that were new}
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return Counter()
+    cursor.execute(
+        f"INSERT INTO {CampaignDonor._meta.db_table} (campaign_id, donor_id, first_donated_at) VALUES "
+        + ", ".join(["(%s, %s, %s)"] * len(pairs))
+        + " ON CONFLICT (campaign_id, donor_id) DO NOTHING RETURNING campaign_id",
+        [value for campaign_id, donor_id in pairs for value in (campaign_id, donor_id, now)],
+    )
+    return Counter(row[0] for row in cursor.fetchall())
+
+
+def _add_to_campaign(cursor, campaign_id, amount, now, new_donors=0):
+    cursor.execute(
+        f"UPDATE {Campaign._meta.db_table} SET current_amount = current_amount + %s, "
+        "donors_count = donors_count + %s, updated_at = %s WHERE id = %s "
+        "RETURNING student_id, current_amount, goal_amount, donors_count",
+        [amount, new_donors, now, campaign_id],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise PaymentError(f"Campaign {campaign_id} not found")
+    live.notify(cursor, campaign_id, *row[1:])
+    return row[0]
+
+
+def _invalidate(campaign_students):
+    catalog_cache.bump_version()
+    for campaign_id, student_id in campaign_students.items():
+        detail_cache.invalidate_campaign(campaign_id, student_id)
+
+
+def record_donation(campaign_id, amount, donor_id=None, provider="manual", provider_ref="", currency="usd"):
+    """Record one confirmed payment; returns ``(donation, created)``.
+
+    A payment already recorded under ``(provider, provider_ref)`` is not
+    counted again: the existing donation is returned with ``created=False``.
+    Raises PaymentError for a bad amount or an unknown campaign or donor.
+    """
+    amount = _amount(amount)
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            donation = Donation.objects.create(
+                campaign_id=campaign_id, donor_id=donor_id, amount=amount,
+                currency=currency.lower(), provider=provider, provider_ref=provider_ref,
+            )
+            with connection.cursor() as cursor:
+                # the UPDATE also locks the donor row, so it cannot be deleted
+                # before commit and fail the deferred foreign key check there,
+                # which the handler below would take for a duplicate
+                if donor_id is not None and not _add_to_donor(cursor, donor_id, amount, now):
+                    raise PaymentError(f"Donor {donor_id} not found")
+                new_donors = _add_supporters(cursor, [(campaign_id, donor_id)] if donor_id is not None else [], now)
+                student_id = _add_to_campaign(cursor, campaign_id, amount, now, new_donors[campaign_id])
+            analytics.queue_rollup([donation])
+            transaction.on_commit(lambda: _invalidate({campaign_id: student_id}))
+    except IntegrityError:
+        if not provider_ref:
+            raise
+        existing = Donation.objects.filter(provider=provider, provider_ref=provider_ref).first()
+        if existing is None:
+            raise
+        return existing, False
+    return donation, True
+
+
+# event types that confirm a payment; other deliveries are acknowledged and
+# dropped
+PAYMENT_EVENT_TYPES = {
+    "stripe": {"payment_intent.succeeded"},
+    "paypal": {"PAYMENT.CAPTURE.COMPLETED"},
+}
+
+# PayPal signing certificates by URL
+_paypal_certs = LRUCache(max_entries=16, default_ttl=24 * 3600)
+
+
+def verify_webhook(provider, body, headers):
+    """Check a delivery's signature; returns the decoded event.
+
+    Raises WebhookSignatureError, or PaymentError for a body that is not an
+    event.
+    """
+    if provider == "stripe":
+        _verify_stripe(body, headers)
+    elif provider == "paypal":
+        _verify_paypal(body, headers)
+    else:
+        raise PaymentError(f"Unknown provider '{provider}'")
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise PaymentError("Body is not JSON")
+    if not isinstance(event, dict) or not event.get("id"):
+        raise PaymentError("Event has no id")
+    return event
+
+
+def _verify_stripe(body, headers):
+    # Stripe-Signature: t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>">[,v1=...]
+    if not settings.STRIPE_WEBHOOK_SECRETS:
+        raise WebhookSignatureError("Stripe webhooks are not configured")
+    timestamp, signatures = None, []
+    for item in headers.get("Stripe-Signature", "").split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not signatures:
+        raise WebhookSignatureError("Malformed Stripe-Signature header")
+    try:
+        age = time.time() - int(timestamp)
+    except ValueError:
+        raise WebhookSignatureError("Malformed Stripe-Signature header")
+    if abs(age) > settings.STRIPE_WEBHOOK_TOLERANCE_SECONDS:
+        raise WebhookSignatureError("Stripe-Signature timestamp outside tolerance")
+
+    signed = timestamp.encode() + b"." + body
+    for secret in settings.STRIPE_WEBHOOK_SECRETS:
+        expected = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+        if any(hmac.compare_digest(expected, signature) for signature in signatures):
+            return
+    raise WebhookSignatureError("Invalid Stripe signature")
+
+
+def _verify_paypal(body, headers):
+    # RSA-SHA256 over "<transmission id>|<transmission time>|<webhook id>|<crc32 of body>",
+    # checked offline against PayPal's certificate instead of calling
+    # /v1/notifications/verify-webhook-signature for every delivery
+    if not settings.PAYPAL_WEBHOOK_ID:
+        raise WebhookSignatureError("PayPal webhooks are not configured")
+    transmission_id = headers.get("Paypal-Transmission-Id")
+    transmission_time = headers.get("Paypal-Transmission-Time")
+    signature = headers.get("Paypal-Transmission-Sig")
+    cert_url = headers.get("Paypal-Cert-Url")
+    if not (transmission_id and transmission_time and signature and cert_url):
+        raise WebhookSignatureError("Missing PayPal transmission headers")
+    if headers.get("Paypal-Auth-Algo", "SHA256withRSA") != "SHA256withRSA":
+        raise WebhookSignatureError("Unsupported PayPal signature algorithm")
+    try:
+        signature = base64.b64decode(signature, validate=True)
+    except binascii.Error:
+        raise WebhookSignatureError("Malformed PayPal signature")
+
+    cert = _paypal_cert(cert_url)
+    if not cert.not_valid_before_utc <= timezone.now() <= cert.not_valid_after_utc:
+        raise WebhookSignatureError("PayPal certificate is not valid now")
+    message = f"{transmission_id}|{transmission_time}|{settings.PAYPAL_WEBHOOK_ID}|{zlib.crc32(body)}"
+    try:
+        cert.public_key().verify(signature, message.encode(), padding.PKCS1v15(), hashes.SHA256())
+    except (InvalidSignature, TypeError):
+        raise WebhookSignatureError("Invalid PayPal signature")
+
+
+def _paypal_cert(url):
+    # the URL comes from the request: never fetch a certificate from
+    # anywhere but PayPal
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not (parts.hostname or "").endswith(".paypal.com"):
+        raise WebhookSignatureError("Untrusted PayPal certificate URL")
+    cert = _paypal_certs.get(url)
+    if cert is None:
+        try:
+            response = httpx.get(url, timeout=5)
+            response.raise_for_status()
+            cert = x509.load_pem_x509_certificate(response.content)
+        except (httpx.HTTPError, ValueError):
+            raise WebhookSignatureError("Could not load the PayPal certificate")
+        _paypal_certs.set(url, cert)
+    return cert
+
+
+def stage_event(provider, event):
+    """Queue a verified event for apply_pending_events(); returns False when
+    it is not a payment event (nothing staged). Redeliveries are ignored."""
+    event_type = event.get("type") if provider == "stripe" else event.get("event_type")
+    if event_type not in PAYMENT_EVENT_TYPES[provider]:
+        return False
+    PaymentEvent.objects.bulk_create(
+        [PaymentEvent(provider=provider, event_id=str(event["id"]), event_type=event_type, payload=event)],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def _stripe_payment(payload):
+    # a PaymentIntent created with metadata={"campaign_id": ..., "donor_id": ...};
+    # amounts are in cents (two-decimal currencies only)
+    intent = payload["data"]["object"]
+    metadata = intent.get("metadata") or {}
+    amount = Decimal(intent["amount_received"]) / 100
+    return intent["id"], amount, intent["currency"], metadata["campaign_id"], metadata.get("donor_id")
+
+
+def _paypal_payment(payload):
+    # a capture of an order whose purchase unit has custom_id "<campaign id>[:<donor id>]"
+    capture = payload["resource"]
+    campaign_id, _, donor_id = capture["custom_id"].partition(":")
+    return capture["id"], capture["amount"]["value"], capture["amount"]["currency_code"], campaign_id, donor_id
+
+
+_PAYMENT_PARSERS = {"stripe": _stripe_payment, "paypal": _paypal_payment}
+
+
+def _event_donation(event):
+    try:
+        ref, amount, currency, campaign_id, donor_id = _PAYMENT_PARSERS[event.provider](event.payload)
+        campaign_id = int(campaign_id)
+        donor_id = int(donor_id) if donor_id else None
+    except (KeyError, TypeError, ValueError, AttributeError, InvalidOperation):
+        raise PaymentError(f"Unrecognised {event.event_type} payload")
+    return Donation(
+        campaign_id=campaign_id, donor_id=donor_id, amount=_amount(amount),
+        currency=str(currency).lower(), provider=event.provider, provider_ref=str(ref),
+    )
+
+
+def _insert_new(donations):
+    # bulk INSERT of the donations not in the ledger yet; returns those
+    while donations:
+        recorded = set(
+            Donation.objects.filter(provider_ref__in={d.provider_ref for d in donations})
+            .values_list("provider", "provider_ref")
+        )
+        donations = [d for d in donations if (d.provider, d.provider_ref) not in recorded]
+        try:
+            with transaction.atomic():
+                return Donation.objects.bulk_create(donations)
+        except IntegrityError:
+            # another transaction recorded one of them meanwhile; it has
+            # committed by now, so the next lookup sees it
+            pass
+    return donations
+
+
+def apply_pending_events(batch_size=None):
+    """Apply up to ``batch_size`` (default PAYMENT_EVENTS_BATCH_SIZE) staged
+    events, oldest first, in one transaction; returns ``(applied, failed)``.
+
+    Events that cannot be applied (bad payload, unknown campaign) are marked
+    processed with their ``error`` set rather than retried. Payments already
+    in the ledger, including those recorded by a concurrent transaction, are
+    not counted again.
+    """
+    batch_size = batch_size or settings.PAYMENT_EVENTS_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects.filter(processed_at__isnull=True)
+            .order_by("id")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not events:
+            return 0, 0
+
+        pending = {}  # (provider, provider_ref) -> (event, donation)
+        for event in events:
+            event.processed_at = now
+            try:
+                donation = _event_donation(event)
+            except PaymentError as e:
+                event.error = str(e)
+                continue
+            # the same payment may be reported by several events
+            pending.setdefault((donation.provider, donation.provider_ref), (event, donation))
+
+        campaign_ids = set(
+            Campaign.objects.filter(id__in={d.campaign_id for _, d in pending.values()}).values_list("id", flat=True)
+        )
+        donor_ids = set(
+            DonorProfile.objects.filter(id__in={d.donor_id for _, d in pending.values()}).values_list("id", flat=True)
+        )
+        donations = []
+        for event, donation in pending.values():
+            if donation.campaign_id not in campaign_ids:
+                event.error = f"Campaign {donation.campaign_id} not found"
+                continue
+            if donation.donor_id not in donor_ids:
+                # the money still counts for the campaign
+                donation.donor_id = None
+            donations.append(donation)
+        donations = _insert_new(donations)
+
+        by_campaign = defaultdict(Decimal)
+        by_donor = defaultdict(Decimal)
+        for donation in donations:
+            by_campaign[donation.campaign_id] += donation.amount
+            if donation.donor_id is not None:
+                by_donor[donation.donor_id] += donation.amount
+        # ascending ids, donors before campaigns: the same lock order as
+        # record_donation and every other batch
+        students = {}
+        with connection.cursor() as cursor:
+            for donor_id in sorted(by_donor):
+                _add_to_donor(cursor, donor_id, by_donor[donor_id], now)
+            new_donors = _add_supporters(
+                cursor, [(d.campaign_id, d.donor_id) for d in donations if d.donor_id is not None], now
+            )
+            for campaign_id in sorted(by_campaign):
+                students[campaign_id] = _add_to_campaign(
+                    cursor, campaign_id, by_campaign[campaign_id], now, new_donors[campaign_id]
+                )
+
+        analytics.queue_rollup(donations)
+        PaymentEvent.objects.bulk_update(events, ["processed_at", "error"])
+        if students:
+            transaction.on_commit(lambda: _invalidate(students))
+
+    failed = sum(1 for event in events if event.error)
+    return len(events) - failed, failed
+
+
+def replay_events(since, until, provider=None):
+    """Queue the events received in [since, until) again, e.g. after fixing
+    the cause of their errors; returns how many. Payments they already
+    recorded are not counted twice."""
+    events = PaymentEvent.objects.filter(received_at__gte=since, received_at__lt=until, processed_at__isnull=False)
+    if provider:
+        events = events.filter(provider=provider)
+    return events.update(processed_at=None, error="")
+
+
+_DRIFT_SQL = """
+WITH actual AS (
+    SELECT campaign_id, count(DISTINCT donor_id) AS n
+    FROM {donation_table}
+    WHERE campaign_id IS NOT NULL AND donor_id IS NOT NULL
+    GROUP BY campaign_id
+), drift AS (
+    SELECT c.id, c.donors_count AS stored, coalesce(a.n, 0) AS actual
+    FROM {campaign_table} c LEFT JOIN actual a ON a.campaign_id = c.id
+    WHERE c.donors_count <> coalesce(a.n, 0)
+)
+"""
+
+# a delta, so that increments committed meanwhile are kept
+_FIX_DRIFT_SQL = """
+UPDATE {campaign_table} c
+SET donors_count = c.donors_count + drift.actual - drift.stored, updated_at = %s
+FROM drift WHERE c.id = drift.id
+RETURNING c.id, drift.stored, drift.actual, c.student_id
+"""
+
+_AMOUNT_DRIFT_SQL = """
+WITH actual AS (
+    SELECT campaign_id, sum(amount) AS total
+    FROM {donation_table}
+    WHERE campaign_id IS NOT NULL
+    GROUP BY campaign_id
+), drift AS (
+    SELECT c.id, c.current_amount AS stored, coalesce(a.total, 0) AS actual
+    FROM {campaign_table} c LEFT JOIN actual a ON a.campaign_id = c.id
+    WHERE c.current_amount <> coalesce(a.total, 0)
+)
+"""
+
+_FIX_AMOUNT_DRIFT_SQL = """
+UPDATE {campaign_table} c
+SET current_amount = c.current_amount + drift.actual - drift.stored, updated_at = %s
+FROM drift WHERE c.id = drift.id
+RETURNING c.id, drift.stored, drift.actual, c.student_id
+"""
+
+# the supporter rows must agree with the ledger too, or the next donation
+# would be miscounted
+_SUPPORTERS_SQL = """
+INSERT INTO {supporter_table} (campaign_id, donor_id, first_donated_at)
+SELECT campaign_id, donor_id, min(created_at) FROM {donation_table}
+WHERE campaign_id IS NOT NULL AND donor_id IS NOT NULL
+GROUP BY campaign_id, donor_id
+ON CONFLICT (campaign_id, donor_id) DO NOTHING;
+DELETE FROM {supporter_table} s WHERE NOT EXISTS (
+    SELECT 1 FROM {donation_table} d WHERE d.campaign_id = s.campaign_id AND d.donor_id = s.donor_id
+);
+"""
+
+
+def _reconcile(drift_sql, fix_sql, fix, rebuild_sql=None):
+    tables = {
+        "campaign_table": Campaign._meta.db_table,
+        "donation_table": Donation._meta.db_table,
+        "supporter_table": CampaignDonor._meta.db_table,
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not fix:
+            cursor.execute((drift_sql + "SELECT id, stored, actual FROM drift ORDER BY id").format(**tables))
+            return cursor.fetchall()
+
+        if rebuild_sql:
+            cursor.execute(rebuild_sql.format(**tables))
+        cursor.execute((drift_sql + fix_sql).format(**tables), [timezone.now()])
+        rows = sorted(cursor.fetchall())
+        if rows:
+            transaction.on_commit(lambda: _invalidate({row[0]: row[3] for row in rows}))
+    return [row[:3] for row in rows]
+
+
+def reconcile_donors_count(fix=False):
+    """Compare every Campaign.donors_count with the ledger; returns the
+    drifted campaigns as ``[(campaign_id, stored, actual)]``.
+
+    With ``fix`` the supporter rows are rebuilt from the ledger as well and
+    the counts corrected.
+    """
+    return _reconcile(_DRIFT_SQL, _FIX_DRIFT_SQL, fix, rebuild_sql=_SUPPORTERS_SQL)
+
+
+def reconcile_current_amount(fix=False):
+    """Compare every Campaign.current_amount with the sum of its donations;
+    returns the drifted campaigns as ``[(campaign_id, stored, actual)]``,
+    corrected with ``fix``. Money raised before the ledger existed has no
+    donations behind it and shows up as drift."""
+    return _reconcile(_AMOUNT_DRIFT_SQL, _FIX_AMOUNT_DRIFT_SQL, fix)
@@ -0,0 +1,178 @@
+# app/ranking.py
+# Precomputed discovery ranking. ``rank_campaigns()`` (run on a schedule by
+# ``manage.py rank_campaigns``) scores every active campaign and stores the
+# result in app_campaignrank; recommended feeds are then a keyset range scan
+# of its (score, campaign) index, optionally per category.
+#
+# Scoring is one set-based INSERT ... SELECT ... ON CONFLICT: PostgreSQL
+# evaluates the formula over all rows in a single pass without shipping them
+# to Python, and the statement runs under RANKING_TIME_BUDGET_SECONDS. When
+# the budget is exceeded the transaction rolls back and the previous ranking
+# stays in place. Rows whose score moved by less than SCORE_TOLERANCE are not
+# rewritten: scores drift with time on every run, and rewriting a million
+# rows (plus their index entries) costs far more than computing them.
+#
+# score = category weight * sum of weighted components, each in [0, 1]:
+#   progress   share of the goal raised; 0 once fully funded
+#   urgency    1 / (1 + days to deadline / 7)
+#   freshness  exp(-age in days / 30)
+#   velocity   v / (v + VELOCITY_SCALE), v = amount donated per day over the
+#              last VELOCITY_WINDOW_DAYS (or the campaign's age, if younger),
+#              read from the donation ledger, so a campaign that raised a lot
+#              long ago does not outrank one that is raising now
+# Campaigns past their deadline are not ranked.
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.models import Campaign, CampaignRank, Donation
+from app.pagination import KeysetPaginator
+
+WEIGHTS = {
+    "progress": 0.35,
+    "urgency": 0.25,
+    "freshness": 0.15,
+    "velocity": 0.25,
+}
+
+# dollars per day at which the velocity component reaches 0.5
+VELOCITY_SCALE = 50.0
+# donations counted towards velocity; a range scan of the ledger's
+# (created_at, id) index, so its cost follows recent donations, not history
+VELOCITY_WINDOW_DAYS = 7
+
+CATEGORY_WEIGHTS = {
+    "tuition": 1.1,
+    "scholarship": 1.1,
+    "education": 1.0,
+    "student_loans": 1.0,
+    "living_expenses": 0.95,
+    "other": 0.9,
+}
+
+# smallest score change written back; feeds are exact to within this
+SCORE_TOLERANCE = 0.001
+
+RANK_PAGINATOR = KeysetPaginator(("-score", "-campaign_id"))
+
+_RANK_SQL = """
+INSERT INTO {rank_table} AS r (campaign_id, student_id, category, score, computed_at)
+SELECT id, student_id, category,
+       (CASE category {category_cases} ELSE 1.0 END) * (
+           %(progress)s * CASE WHEN goal_amount > 0 AND current_amount < goal_amount
+                               THEN (current_amount / goal_amount)::float8 ELSE 0 END
+         + %(urgency)s / (1 + days_left / 7)
+         + %(freshness)s * exp(-age_days / 30)
+         + %(velocity)s * rate / (rate + %(scale)s)
+       ),
+       %(now)s
+FROM (
+    SELECT id, student_id, category, goal_amount, current_amount, days_left, age_days,
+           COALESCE(recent.amount, 0) / LEAST(age_days, %(window)s) AS rate
+    FROM (
+        SELECT id, student_id, category, goal_amount, current_amount,
+               EXTRACT(EPOCH FROM deadline - %(now)s)::float8 / 86400 AS days_left,
+               -- at least a day, so a new campaign's velocity is not inflated
+               GREATEST(EXTRACT(EPOCH FROM %(now)s - created_at)::float8 / 86400, 1) AS age_days
+        FROM {campaign_table}
+        WHERE status = 'active' AND deadline > %(now)s
+    ) campaign
+    LEFT JOIN (
+        SELECT campaign_id, SUM(amount)::float8 AS amount
+        FROM {donation_table}
+        WHERE created_at > %(now)s - make_interval(days => %(window)s) AND created_at <= %(now)s
+        GROUP BY campaign_id
+    ) recent ON recent.campaign_id = campaign.id
+) c
+ON CONFLICT (campaign_id) DO UPDATE
+    SET student_id = EXCLUDED.student_id, category = EXCLUDED.category,
+        score = EXCLUDED.score, computed_at = EXCLUDED.computed_at
+    WHERE abs(r.score - EXCLUDED.score) >= %(tolerance)s OR r.category <> EXCLUDED.category
+"""
+
+# campaigns that ended or closed since the last run
+_DROP_SQL = """
+DELETE FROM {rank_table} r
+WHERE NOT EXISTS (
+    SELECT 1 FROM {campaign_table} c
+    WHERE c.id = r.campaign_id AND c.status = 'active' AND c.deadline > %(now)s
+)
+"""
+
+
+def available():
+    """Whether the database can rank campaigns (PostgreSQL only). Without it
+    the recommended feeds fall back to their plain order."""
+    return connection.vendor == "postgresql"
+
+
+def rank_campaigns(now=None):
+    """Rescore all active campaigns as of ``now`` (default: the current
+    time); returns ``(updated, dropped, seconds)``, ``updated`` counting only
+    the rows written.
+
+    Raises django.db.OperationalError (query canceled) when the run does
+    not fit RANKING_TIME_BUDGET_SECONDS; nothing is changed then, and
+    ImproperlyConfigured on databases other than PostgreSQL.
+    """
+    if not available():
+        raise ImproperlyConfigured("campaign ranking requires PostgreSQL")
+    from app.response_cache import catalog_cache
+
+    now = now or timezone.now()
+    category_cases = " ".join(
+        f"WHEN '{category}' THEN {float(weight)}" for category, weight in CATEGORY_WEIGHTS.items()
+    )
+    tables = {
+        "rank_table": CampaignRank._meta.db_table,
+        "campaign_table": Campaign._meta.db_table,
+        "donation_table": Donation._meta.db_table,
+    }
+    started = time.perf_counter()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # SET LOCAL, as a function so the value can be a parameter
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true)",
+                [str(int(settings.RANKING_TIME_BUDGET_SECONDS * 1000))],
+            )
+            cursor.execute(
+                _RANK_SQL.format(category_cases=category_cases, **tables),
+                {
+                    **WEIGHTS, "scale": VELOCITY_SCALE, "window": VELOCITY_WINDOW_DAYS,
+                    "tolerance": SCORE_TOLERANCE, "now": now,
+                },
+            )
+            updated = cursor.rowcount
+            cursor.execute(_DROP_SQL.format(**tables), {"now": now})
+            dropped = cursor.rowcount
+    if updated or dropped:
+        # the order of the recommended feeds changed
+        catalog_cache.bump_version()
+    return updated, dropped, time.perf_counter() - started
+
+
+def recommended_page(request, category=None):
+    """One keyset page of the ranking: ``(rows, next_cursor)`` with rows as
+    dicts of campaign_id and student_id, best first. Raises InvalidCursor."""
+    return RANK_PAGINATOR.paginate(_ranks(category), request)
+
+
+async def arecommended_page(request, category=None):
+    return await RANK_PAGINATOR.apaginate(_ranks(category), request)
+
+
+def _ranks(category):
+    ranks = CampaignRank.objects.all()
+    if category:
+        ranks = ranks.filter(category=category)
+    return ranks.values("campaign_id", "student_id", "score")
+
+
+def in_rank_order(ids, objs, key):
+    """``objs`` sorted like ``ids``; objects missing from ``objs`` are skipped."""
+    by_key = {key(obj): obj for obj in objs}
+    return [by_key[i] for i in ids if i in by_key]
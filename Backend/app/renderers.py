@@ -0,0 +1,150 @@
+# app/renderers.py
+# JSON output through orjson, several times faster than the stdlib encoder
+# DRF uses by default: a DRF renderer (REST_FRAMEWORK settings), an
+# HttpResponse for the plain Django views, and streamed JSON arrays for large
+# listings, written row by row instead of materializing the whole list.
+#
+# Types orjson does not know are converted the way DRF's encoder does, except
+# Decimal, which becomes a string (as every payload here already formats
+# money) instead of a lossy float. Subclasses of builtins go through the same
+# fallback: orjson reads list/dict internals directly, which is wrong for e.g.
+# Django's ErrorList (a UserList that keeps its items elsewhere).
+import datetime
+import decimal
+import uuid
+
+import orjson
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    if isinstance(obj, (str, Promise)):
+        return str(obj)
+    if isinstance(obj, bool):
+        return bool(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    if isinstance(obj, float):
+        return float(obj)
+    if isinstance(obj, dict):
+        return dict(obj)
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        if representation.endswith("+00:00"):
+            representation = representation[:-6] + "Z"
+        return representation
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "__getitem__"):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, "__iter__"):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    return orjson.dumps(data, default=_default, option=OPTIONS)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+    format = "json"
+    charset = None  # UTF-8 is implied by application/json
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return dumps(data)
+
+
+class ORJSONResponse(HttpResponse):
+    """JsonResponse encoded with orjson."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
+
+
+# --- streaming ---
+
+def wants_stream(request):
+    """``?stream=true``: the whole result as one streamed array."""
+    return request.GET.get("stream", "").lower() in ("1", "true")
+
+
+def _chunks(rows, serialize, flush_bytes):
+    buffer = [b"["]
+    size = 1
+    first = True
+    for row in rows:
+        item = dumps(serialize(row))
+        if not first:
+            buffer.append(b",")
+        first = False
+        buffer.append(item)
+        size += len(item) + 1
+        if size >= flush_bytes:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    buffer.append(b"]")
+    yield b"".join(buffer)
+
+
+async def _achunks(rows, serialize, flush_bytes):
+    buffer = [b"["]
+    size = 1
+    first = True
+    async for row in rows:
+        item = dumps(serialize(row))
+        if not first:
+            buffer.append(b",")
+        first = False
+        buffer.append(item)
+        size += len(item) + 1
+        if size >= flush_bytes:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    buffer.append(b"]")
+    yield b"".join(buffer)
+
+
+def stream_json_array(queryset, serialize):
+    """StreamingHttpResponse writing ``queryset`` as one JSON array.
+
+    Rows are fetched ``STREAM_CHUNK_SIZE`` at a time through a server-side
+    cursor (QuerySet.iterator), so memory stays flat however many rows
+    match; output is flushed every ``STREAM_FLUSH_BYTES``. The status is
+    sent before the first row, so errors must be raised before calling this.
+    """
+    rows = queryset.iterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+    return StreamingHttpResponse(
+        _chunks(rows, serialize, settings.STREAM_FLUSH_BYTES), content_type="application/json"
+    )
+
+
+def astream_json_array(queryset, serialize):
+    """stream_json_array for async views (QuerySet.aiterator)."""
+    rows = queryset.aiterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+    return StreamingHttpResponse(
+        _achunks(rows, serialize, settings.STREAM_FLUSH_BYTES), content_type="application/json"
+    )
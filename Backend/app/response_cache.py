@@ -0,0 +1,416 @@
+# app/response_cache.py
+# Shared cache for the public catalog listings (discover_students,
+# get_campaigns). Their responses depend only on the query string, so a page
+# is built once and served to every caller until the catalog changes.
+#
+# Entries live in the "catalog" Django cache (settings.CACHES). Keys embed a
+# global catalog version; saving or deleting a Campaign or StudentProfile
+# replaces the version (app/signals.py) and every older entry becomes
+# unreachable at once. Versions are also bumped by payments applied in
+# run_workers and by rank_campaigns, other processes than the web workers.
+#
+# With a backend shared by every process (Redis, Memcached) those bumps are
+# seen everywhere at once. The default, LocMemCache, is per process: right
+# for a single-process deployment, but with several workers each caches on
+# its own and a change made in another process shows up only once the entry
+# expires (CATALOG_CACHE_TTL_SECONDS for listings, DETAIL_CACHE_TTL_SECONDS
+# for detail pages); manage.py check warns (app.W001). Set
+# CATALOG_CACHE_PROCESS_LOCAL=false to build every response instead.
+#
+# Expired entries are rebuilt by one worker at a time: threads of a worker
+# coalesce on a single-flight, workers race for a lock key with cache.add(),
+# and the losers serve the stale copy meanwhile (or wait briefly for the
+# winner when there is none).
+#
+# Detail pages (one student, one campaign) use DetailCache instead: payloads
+# stay in worker memory (LRU, bounded in bytes) and are checked against a
+# per-object version token in the same shared cache, so invalidating one
+# campaign touches nothing else. With a process-local backend the tokens
+# only see this process's invalidations, and DETAIL_CACHE_TTL_SECONDS bounds
+# how long another process's change can go unseen.
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from app.utils import AsyncSingleFlight, LRUCache, SingleFlight
+
+VERSION_KEY = "catalog:version"
+
+# backends that keep entries inside one process
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared(alias):
+    """Whether the cache ``alias`` is seen by every process."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
+
+
+def is_enabled(alias):
+    """Whether responses are cached in ``alias``: always when it is shared,
+    and when it is process-local unless CATALOG_CACHE_PROCESS_LOCAL is off
+    (DummyCache stores nothing either way)."""
+    if is_shared(alias):
+        return True
+    return settings.CATALOG_CACHE_PROCESS_LOCAL and not isinstance(caches[alias], DummyCache)
+
+
+class ResponseCache:
+    def __init__(self, alias="catalog", ttl=30, stale_ttl=300, lock_timeout=10, wait_timeout=2):
+        self.alias = alias
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self._flights = SingleFlight()
+        self._async_flights = AsyncSingleFlight()
+        self.lookups = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.max_rebuild_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            ttl=settings.CATALOG_CACHE_TTL_SECONDS,
+            stale_ttl=settings.CATALOG_CACHE_STALE_SECONDS,
+            lock_timeout=settings.CATALOG_CACHE_LOCK_SECONDS,
+            wait_timeout=settings.CATALOG_CACHE_WAIT_SECONDS,
+        )
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def shared(self):
+        return is_shared(self.alias)
+
+    @property
+    def enabled(self):
+        return is_enabled(self.alias)
+
+    # --- versioning ---
+
+    def version(self):
+        version = self.cache.get(VERSION_KEY)
+        if version is None:
+            # a random token, not a counter: if the key is ever evicted, a
+            # restarted count could collide with entries still cached
+            self.cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = self.cache.get(VERSION_KEY)
+        return version
+
+    async def aversion(self):
+        version = await self.cache.aget(VERSION_KEY)
+        if version is None:
+            await self.cache.aadd(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = await self.cache.aget(VERSION_KEY)
+        return version
+
+    def bump_version(self):
+        """Invalidate every cached listing."""
+        self.cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+    @staticmethod
+    def key(version, name, params):
+        """``params`` is the request's QueryDict; parameter order is ignored."""
+        items = sorted((k, sorted(values)) for k, values in params.lists())
+        digest = hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()
+        return f"catalog:{version}:{name}:{digest}"
+
+    # --- lookups ---
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry[0] < self.ttl
+
+    def _timed(self, started):
+        elapsed = time.perf_counter() - started
+        self.rebuilds += 1
+        self.rebuild_seconds += elapsed
+        self.max_rebuild_seconds = max(self.max_rebuild_seconds, elapsed)
+
+    def _build(self, build):
+        started = time.perf_counter()
+        value = build()
+        self._timed(started)
+        return value
+
+    async def _abuild(self, abuild):
+        started = time.perf_counter()
+        value = await abuild()
+        self._timed(started)
+        return value
+
+    def _store(self, key, started, value):
+        self._timed(started)
+        self.cache.set(key, (time.time(), value), timeout=self.ttl + self.stale_ttl)
+
+    async def _astore(self, key, started, value):
+        self._timed(started)
+        await self.cache.aset(key, (time.time(), value), timeout=self.ttl + self.stale_ttl)
+
+    def get_or_build(self, name, params, build):
+        """Return ``build()``'s result for ``(name, params)``, cached.
+
+        ``build`` must return something picklable; exceptions propagate and
+        are not cached. When caching is disabled (see is_enabled) every call
+        builds; concurrent identical requests of this process still share one
+        build.
+        """
+        self.lookups += 1
+        if not self.enabled:
+            return self._flights.do(self.key("", name, params), lambda: self._build(build))
+        key = self.key(self.version(), name, params)
+        entry = self.cache.get(key)
+        if self._fresh(entry):
+            self.hits += 1
+            return entry[1]
+        return self._flights.do(key, lambda: self._rebuild(key, entry, build))
+
+    def _rebuild(self, key, entry, build):
+        lock_key = f"{key}:lock"
+        if self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+            try:
+                started = time.perf_counter()
+                value = build()
+                self._store(key, started, value)
+                return value
+            finally:
+                self.cache.delete(lock_key)
+
+        # another worker is rebuilding this entry
+        if entry is not None:
+            self.stale_hits += 1
+            return entry[1]
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+        # the other worker is too slow (or died holding the lock)
+        started = time.perf_counter()
+        value = build()
+        self._store(key, started, value)
+        return value
+
+    async def aget_or_build(self, name, params, abuild):
+        """Async variant of get_or_build; ``abuild`` is a coroutine function."""
+        self.lookups += 1
+        if not self.enabled:
+            return await self._async_flights.do(self.key("", name, params), lambda: self._abuild(abuild))
+        key = self.key(await self.aversion(), name, params)
+        entry = await self.cache.aget(key)
+        if self._fresh(entry):
+            self.hits += 1
+            return entry[1]
+        return await self._async_flights.do(key, lambda: self._arebuild(key, entry, abuild))
+
+    async def _arebuild(self, key, entry, abuild):
+        lock_key = f"{key}:lock"
+        if await self.cache.aadd(lock_key, 1, timeout=self.lock_timeout):
+            try:
+                started = time.perf_counter()
+                value = await abuild()
+                await self._astore(key, started, value)
+                return value
+            finally:
+                await self.cache.adelete(lock_key)
+
+        if entry is not None:
+            self.stale_hits += 1
+            return entry[1]
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+            entry = await self.cache.aget(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+        started = time.perf_counter()
+        value = await abuild()
+        await self._astore(key, started, value)
+        return value
+
+    def stats(self):
+        """Per-worker counters. ``hit_ratio`` is the share of lookups that did
+        not run a rebuild (fresh, stale or coalesced)."""
+        return {
+            "backend": type(self.cache).__name__,
+            "shared": self.shared,
+            "enabled": self.enabled,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "rebuilds": self.rebuilds,
+            "hit_ratio": (1 - self.rebuilds / self.lookups) if self.lookups else 0.0,
+            "avg_rebuild_ms": (1000 * self.rebuild_seconds / self.rebuilds) if self.rebuilds else 0.0,
+            "max_rebuild_ms": 1000 * self.max_rebuild_seconds,
+            "single_flight": self._flights.stats(),
+            "async_single_flight": self._async_flights.stats(),
+        }
+
+
+def _payload_size(entry):
+    # approximate: the JSON size of the payload, not Python's object overhead
+    return len(json.dumps(entry[1], default=str))
+
+
+class DetailCache:
+    """Read-through cache of per-object payloads, keyed ``(kind, pk)``.
+
+    An entry is served only while the object's version token in the shared
+    cache still equals the token read before the payload was built, so an
+    invalidation in any process is seen by all of them on their next request.
+    ``variant`` stores other data derived from the same object (e.g. its
+    conditional-GET fingerprint) under the same token. When caching is
+    disabled (see is_enabled) every lookup builds.
+    """
+
+    def __init__(self, alias="catalog", max_bytes=32 * 1024 * 1024, ttl=300):
+        self.alias = alias
+        self._local = LRUCache(max_entries=100_000, default_ttl=ttl, max_bytes=max_bytes, sizeof=_payload_size)
+        self._flights = SingleFlight()
+        self._async_flights = AsyncSingleFlight()
+        self.builds = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(max_bytes=settings.DETAIL_CACHE_MAX_BYTES, ttl=settings.DETAIL_CACHE_TTL_SECONDS)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def shared(self):
+        return is_shared(self.alias)
+
+    @property
+    def enabled(self):
+        return is_enabled(self.alias)
+
+    @staticmethod
+    def _token_key(kind, pk):
+        return f"detail:{kind}:{pk}"
+
+    def _token(self, kind, pk):
+        key = self._token_key(kind, pk)
+        token = self.cache.get(key)
+        if token is None:
+            self.cache.add(key, uuid.uuid4().hex, timeout=None)
+            token = self.cache.get(key)
+        return token
+
+    async def _atoken(self, kind, pk):
+        key = self._token_key(kind, pk)
+        token = await self.cache.aget(key)
+        if token is None:
+            await self.cache.aadd(key, uuid.uuid4().hex, timeout=None)
+            token = await self.cache.aget(key)
+        return token
+
+    def invalidate(self, kind, pk):
+        # variants are dropped lazily, by the token mismatch
+        self.cache.set(self._token_key(kind, pk), uuid.uuid4().hex, timeout=None)
+        self._local.delete((kind, str(pk), ""))
+
+    # The student and campaign payloads embed each other, so a change to
+    # either object invalidates both pages.
+
+    def invalidate_campaign(self, campaign_id, student_id):
+        self.invalidate("campaign", campaign_id)
+        self.invalidate("student", student_id)
+
+    def invalidate_student(self, student_id, campaign_id=None):
+        self.invalidate("student", student_id)
+        if campaign_id is not None:
+            self.invalidate("campaign", campaign_id)
+
+    def get_or_build(self, kind, pk, build, variant=""):
+        """``build()`` returns the payload; exceptions (e.g. DoesNotExist)
+        propagate and are not cached."""
+        key = (kind, str(pk), variant)
+        if not self.enabled:
+            return self._flights.do(key, lambda: self._build(key, None, build))
+        token = self._token(kind, pk)
+        entry = self._local.get(key)
+        if entry is not None and entry[0] == token:
+            return entry[1]
+        return self._flights.do(key, lambda: self._build(key, token, build))
+
+    def _build(self, key, token, build):
+        payload = build()
+        self.builds += 1
+        if token is not None:
+            self._local.set(key, (token, payload))
+        return payload
+
+    def get_many(self, kind, pks, build_many, variant=""):
+        """Payloads of ``pks`` as ``{pk: payload}``. Cached ones cost one
+        shared-cache round trip in total; ``build_many(missing_pks)`` returns
+        ``{pk: payload}`` for the rest (absent: the object does not exist)."""
+        if not self.enabled:
+            built = build_many(list(pks))
+            self.builds += len(built)
+            return built
+        token_keys = {pk: self._token_key(kind, pk) for pk in pks}
+        tokens = self.cache.get_many(list(token_keys.values()))
+        found, missing = {}, []
+        for pk, token_key in token_keys.items():
+            token = tokens.get(token_key)
+            if token is None:
+                token = tokens[token_key] = self._token(kind, pk)
+            entry = self._local.get((kind, str(pk), variant))
+            if entry is not None and entry[0] == token:
+                found[pk] = entry[1]
+            else:
+                missing.append(pk)
+        if missing:
+            built = build_many(missing)
+            self.builds += len(built)
+            for pk, payload in built.items():
+                self._local.set((kind, str(pk), variant), (tokens[token_keys[pk]], payload))
+            found.update(built)
+        return found
+
+    async def aget_or_build(self, kind, pk, abuild, variant=""):
+        key = (kind, str(pk), variant)
+        if not self.enabled:
+            return await self._async_flights.do(key, lambda: self._abuild(key, None, abuild))
+        token = await self._atoken(kind, pk)
+        entry = self._local.get(key)
+        if entry is not None and entry[0] == token:
+            return entry[1]
+        return await self._async_flights.do(key, lambda: self._abuild(key, token, abuild))
+
+    async def _abuild(self, key, token, abuild):
+        payload = await abuild()
+        self.builds += 1
+        if token is not None:
+            self._local.set(key, (token, payload))
+        return payload
+
+    def stats(self):
+        return {
+            "shared": self.shared,
+            "enabled": self.enabled,
+            "local": self._local.stats(),
+            "builds": self.builds,
+            "single_flight": self._flights.stats(),
+            "async_single_flight": self._async_flights.stats(),
+        }
+
+
+catalog_cache = ResponseCache.from_settings()
+detail_cache = DetailCache.from_settings()
@@ -0,0 +1,84 @@
+# app/search.py
+# Postgres full-text search over students and campaigns, with trigram
+# matching as the fallback for typos.
+#
+# Each table carries a stored generated ``search_vector`` tsvector column with
+# a GIN index (migration 0008). The columns are deliberately not model fields:
+# Django would otherwise select the whole vector on every Campaign/
+# StudentProfile query. They are only referenced here, through SearchVectorColumn.
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+    TrigramWordSimilarity,
+)
+from django.db.models import Expression, F, FloatField
+from django.db.models.functions import Cast
+
+from app.models import Campaign, StudentProfile
+
+# must match the text search configuration of the generated columns
+SEARCH_CONFIG = "english"
+
+
+class SearchVectorColumn(Expression):
+    """The query's own ``search_vector`` column. Resolved against the base
+    table alias at compile time, so it also works inside subqueries (where
+    Django renames the table to U0)."""
+
+    output_field = SearchVectorField()
+
+    def as_sql(self, compiler, connection):
+        alias = compiler.query.get_initial_alias()
+        return f"{compiler.quote_name_unless_alias(alias)}.search_vector", []
+
+
+def _rank(expression):
+    # ts_rank/word_similarity return real; as double precision the value
+    # survives the JSON round trip through the pagination cursor exactly
+    return Cast(expression, FloatField())
+
+
+def _query(q):
+    # websearch syntax: quoted phrases, "or", and -exclusions all work
+    return SearchQuery(q, search_type="websearch", config=SEARCH_CONFIG)
+
+
+def search_students(q):
+    """Students with a campaign matching ``q`` on name, university or major,
+    annotated with ``relevance`` (higher is better)."""
+    query = _query(q)
+    students = StudentProfile.objects.select_related("campaign").filter(campaign__isnull=False)
+
+    matches = students.alias(document=SearchVectorColumn()).filter(document=query)
+    if matches.exists():
+        return matches.annotate(relevance=_rank(SearchRank(F("document"), query)))
+
+    # no lexeme matched: probably a typo, so match names by trigram similarity
+    return students.filter(full_name__trigram_word_similar=q).annotate(
+        relevance=_rank(TrigramWordSimilarity(q, "full_name"))
+    )
+
+
+def search_campaigns(q):
+    """Active campaigns matching ``q`` on title/description or on the
+    student's name, university or major, annotated with ``relevance``."""
+    query = _query(q)
+    campaigns = Campaign.objects.select_related("student").filter(status="active")
+
+    student_ids = StudentProfile.objects.alias(
+        document=SearchVectorColumn()
+    ).filter(document=query).values("id")
+    # a UNION of two GIN index lookups; ``document OR student_id IN (...)``
+    # cannot use either index and filters every active campaign
+    matching_ids = (
+        Campaign.objects.alias(document=SearchVectorColumn()).filter(document=query).values("id")
+        .union(Campaign.objects.filter(student_id__in=student_ids).values("id"))
+    )
+    matches = campaigns.alias(document=SearchVectorColumn()).filter(id__in=matching_ids)
+    if matches.exists():
+        return matches.annotate(relevance=_rank(SearchRank(F("document"), query)))
+
+    return campaigns.filter(title__trigram_word_similar=q).annotate(
+        relevance=_rank(TrigramWordSimilarity(q, "title"))
+    )
@@ -0,0 +1,360 @@
+# app/serializers.py
+# Declarative read serializers for the JSON payloads of the views.
+# A serializer lists its output fields once; the select_related() / only()
+# projection that loads exactly those columns is derived from that list, so a
+# payload can never trigger a lazy per-row query (N+1) or load columns it
+# does not print. Views build their queryset with ``Serializer.project()``
+# and render rows with ``Serializer.serialize()`` / ``many()``.
+#
+# Clients can ask for fewer fields with ``?fields=``: a preset name (``card``,
+# ``full``) or a comma-separated list, dotted for nested fields
+# (``id,full_name,campaign.progress_percentage``). ``Serializer.subset()``
+# turns that into a smaller serializer, so the SQL projection shrinks with
+# the JSON.
+#
+# Output-only: writes still go through the views' own validation.
+from functools import lru_cache
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from app.models import Campaign, DonorProfile, StudentProfile
+
+
+class Field:
+    """Model attribute ``source`` (default: the output name), optionally
+    passed through ``format`` when not None. ``requires`` lists the columns
+    a property reads, e.g. ``progress_percentage``."""
+
+    def __init__(self, source=None, format=None, requires=None):
+        self.source = source
+        self.format = format
+        self.requires = requires
+
+    def bind(self, name):
+        if self.source is None:
+            self.source = name
+
+    def columns(self):
+        return list(self.requires) if self.requires is not None else [self.source]
+
+    def to_representation(self, obj):
+        value = getattr(obj, self.source)
+        if value is None or self.format is None:
+            return value
+        return self.format(value)
+
+
+def DecimalString(source=None):
+    return Field(source, format=str)
+
+
+def Timestamp(source=None):
+    return Field(source, format=lambda value: value.isoformat())
+
+
+class Nested(Field):
+    """A forward or reverse one-to-one / foreign key, rendered with
+    ``serializer``; ``None`` when there is no related row."""
+
+    def __init__(self, serializer, source=None):
+        super().__init__(source)
+        self.serializer = serializer
+
+    def columns(self):
+        return [f"{self.source}__{c}" for c in self.serializer.only_fields()]
+
+    def to_representation(self, obj):
+        try:
+            related = getattr(obj, self.source)
+        except ObjectDoesNotExist:
+            return None
+        return None if related is None else self.serializer.serialize(related)
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+class Serializer:
+    model = None
+    fields = {}
+    # ?fields= preset name -> field list; "full" (every field) is implicit
+    presets = {}
+    # the ?fields= selection this serializer stands for; "" = all fields
+    key = ""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, field in cls.fields.items():
+            field.bind(name)
+
+    @classmethod
+    def select_related(cls):
+        paths = []
+        for field in cls.fields.values():
+            if isinstance(field, Nested):
+                related = [field.source]
+                related += [f"{field.source}__{p}" for p in field.serializer.select_related()]
+            else:
+                # a flattened relation, e.g. requires=("tier__name",)
+                related = [c.rsplit("__", 1)[0] for c in field.columns() if "__" in c]
+            paths += [p for p in related if p not in paths]
+        return paths
+
+    @classmethod
+    def only_fields(cls):
+        columns = []
+        for field in cls.fields.values():
+            for column in field.columns():
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    @classmethod
+    def project(cls, queryset=None, extra=()):
+        """``queryset`` (default: all rows) loading exactly what serialize()
+        reads in one query. ``extra`` adds columns the caller needs too, such
+        as keyset sort keys; annotations in it are ignored."""
+        if queryset is None:
+            queryset = cls.model.objects.all()
+        extra = [name for name in extra if name not in queryset.query.annotations]
+        related = cls.select_related()
+        if related:
+            # without arguments, select_related() would join every foreign key
+            queryset = queryset.select_related(*related)
+        return queryset.only(*cls.only_fields(), *extra)
+
+    @classmethod
+    def serialize(cls, obj):
+        return {name: field.to_representation(obj) for name, field in cls.fields.items()}
+
+    @classmethod
+    def many(cls, objs):
+        return [cls.serialize(obj) for obj in objs]
+
+    @classmethod
+    def subset(cls, spec):
+        """The serializer for a ``?fields=`` value (None: every field).
+        Raises InvalidFields for unknown names."""
+        if not spec or spec == "full":
+            return cls
+        names = cls.presets.get(spec)
+        if names is None:
+            names = [name.strip() for name in spec.split(",") if name.strip()]
+        return _subset(cls, tuple(dict.fromkeys(names)))
+
+    @classmethod
+    def for_request(cls, request):
+        return cls.subset(request.GET.get("fields"))
+
+
+@lru_cache(maxsize=256)
+def _subset(serializer, names):
+    # top-level name -> None (whole field) or the nested names asked for
+    wanted = {}
+    for name in names:
+        top, _, rest = name.partition(".")
+        field = serializer.fields.get(top)
+        if field is None:
+            raise InvalidFields(f"Unknown field '{name}'")
+        if rest and not isinstance(field, Nested):
+            raise InvalidFields(f"'{top}' has no nested fields")
+        if not rest:
+            wanted[top] = None
+        elif wanted.get(top, ()) is not None:
+            wanted.setdefault(top, []).append(rest)
+    if not wanted:
+        raise InvalidFields("No fields selected")
+
+    fields = {}
+    for name, field in serializer.fields.items():  # declaration order
+        if name not in wanted:
+            continue
+        if wanted[name] is not None:
+            field = Nested(field.serializer.subset(",".join(wanted[name])), source=field.source)
+        fields[name] = field
+    return type(serializer.__name__, (Serializer,), {
+        "model": serializer.model,
+        "fields": fields,
+        "key": ",".join(names),
+    })
+
+
+def _avatar(url):
+    # blank avatar_url means "no avatar"
+    return url or None
+
+
+def _gpa(gpa):
+    # the student page has always shown a zero GPA as "not given"
+    return str(gpa) if gpa else None
+
+
+def _excerpt(text):
+    return text[:200] + "..." if len(text) > 200 else text
+
+
+# --- students ---
+
+class StudentProfileSerializer(Serializer):
+    model = StudentProfile
+    fields = {
+        "id": Field(),
+        "full_name": Field(),
+        "email": Field(),
+        "avatar": Field("avatar_url", format=_avatar),
+        "university": Field(),
+        "major": Field(),
+        "academic_year": Field(),
+        "gpa": DecimalString(),
+    }
+    presets = {
+        "card": ["id", "full_name", "avatar", "university"],
+    }
+
+
+class CampaignSummarySerializer(Serializer):
+    model = Campaign
+    fields = {
+        "id": Field(),
+        "title": Field(),
+        "goal_amount": DecimalString(),
+        "current_amount": DecimalString(),
+        "progress_percentage": Field(requires=("goal_amount", "current_amount")),
+        "category": Field(),
+    }
+
+
+class DiscoverStudentSerializer(Serializer):
+    model = StudentProfile
+    fields = {
+        **StudentProfileSerializer.fields,
+        "campaign": Nested(CampaignSummarySerializer),
+    }
+    presets = {
+        "card": ["id", "full_name", "avatar", "campaign.id", "campaign.progress_percentage"],
+    }
+
+
+class StudentCampaignSerializer(Serializer):
+    model = Campaign
+    fields = {
+        "id": Field(),
+        "title": Field(),
+        "description": Field(),
+        "goal_amount": DecimalString(),
+        "current_amount": DecimalString(),
+        "category": Field(),
+        "progress_percentage": Field(requires=("goal_amount", "current_amount")),
+        "image_url": Field(),
+        "deadline": Timestamp(),
+    }
+
+
+class StudentDetailSerializer(Serializer):
+    model = StudentProfile
+    fields = {
+        "id": Field(),
+        "full_name": Field(),
+        "avatar": Field("avatar_url", format=_avatar),
+        "email": Field(),
+        "university": Field(),
+        "major": Field(),
+        "academic_year": Field(),
+        "gpa": Field(format=_gpa),
+        "campaign": Nested(StudentCampaignSerializer),
+    }
+    presets = {
+        "card": [
+            "id", "full_name", "avatar", "university", "major",
+            "campaign.id", "campaign.title", "campaign.goal_amount",
+            "campaign.current_amount", "campaign.progress_percentage",
+        ],
+    }
+
+
+# --- donors ---
+
+class DonorProfileSerializer(Serializer):
+    model = DonorProfile
+    fields = {
+        "full_name": Field(),
+        "email": Field(),
+        "avatar": Field("avatar_url", format=_avatar),
+        "total_donations": DecimalString(),
+        "tier": Field("tier", format=lambda tier: tier.name, requires=("tier__name",)),
+        "tier_benefits": Field("tier", format=lambda tier: tier.benefits, requires=("tier__benefits",)),
+    }
+
+
+# --- campaigns ---
+
+class StudentRefSerializer(Serializer):
+    model = StudentProfile
+    fields = {
+        "id": Field(),
+        "full_name": Field(),
+    }
+
+
+class CampaignListSerializer(Serializer):
+    model = Campaign
+    fields = {
+        "id": Field(),
+        "title": Field(),
+        "description": Field(format=_excerpt),
+        "goal_amount": DecimalString(),
+        "current_amount": DecimalString(),
+        "progress_percentage": Field(requires=("goal_amount", "current_amount")),
+        "donors_count": Field(),
+        "category": Field(),
+        "image_url": Field(),
+        "student": Nested(StudentRefSerializer),
+        "deadline": Timestamp(),
+        "created_at": Timestamp(),
+    }
+    presets = {
+        "card": [
+            "id", "title", "goal_amount", "current_amount", "progress_percentage",
+            "category", "image_url", "student", "deadline",
+        ],
+    }
+
+
+class CampaignStudentSerializer(Serializer):
+    model = StudentProfile
+    fields = {
+        "id": Field(),
+        "full_name": Field(),
+        "email": Field(),
+        "university": Field(),
+        "major": Field(),
+    }
+
+
+class CampaignDetailSerializer(Serializer):
+    model = Campaign
+    fields = {
+        "id": Field(),
+        "title": Field(),
+        "description": Field(),
+        "goal_amount": DecimalString(),
+        "current_amount": DecimalString(),
+        "progress_percentage": Field(requires=("goal_amount", "current_amount")),
+        "donors_count": Field(),
+        "category": Field(),
+        "image_url": Field(),
+        "status": Field(),
+        "student": Nested(CampaignStudentSerializer),
+        "deadline": Timestamp(),
+        "is_deadline_passed": Field(requires=("deadline",)),
+        "created_at": Timestamp(),
+        "updated_at": Timestamp(),
+    }
+    presets = {
+        "card": [
+            "id", "title", "goal_amount", "current_amount", "progress_percentage",
+            "category", "image_url", "status", "student.id", "student.full_name",
+            "deadline", "is_deadline_passed",
+        ],
+    }
@@ -0,0 +1,43 @@
+# app/signals.py
+# Model signal handlers, connected in AppConfig.ready().
+# Caches are invalidated after commit, so a concurrent rebuild cannot cache
+# the pre-commit rows under the new version. QuerySet.update() sends no
+# signal: code using it must invalidate the caches itself.
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app import jobs
+from app.models import Campaign, DonorTier, StudentProfile
+from app.response_cache import catalog_cache, detail_cache
+from app.tiers import tier_table
+
+
+@receiver(post_save, sender=Campaign)
+@receiver(post_delete, sender=Campaign)
+def invalidate_campaign(sender, instance, **kwargs):
+    transaction.on_commit(catalog_cache.bump_version)
+    transaction.on_commit(lambda: detail_cache.invalidate_campaign(instance.pk, instance.student_id))
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+def invalidate_student(sender, instance, **kwargs):
+    transaction.on_commit(catalog_cache.bump_version)
+
+    def invalidate_detail():
+        # a deleted student's campaign is cascaded and sends its own signal
+        campaign_id = Campaign.objects.filter(student_id=instance.pk).values_list("id", flat=True).first()
+        detail_cache.invalidate_student(instance.pk, campaign_id)
+
+    transaction.on_commit(invalidate_detail)
+
+
+@receiver(post_save, sender=DonorTier)
+@receiver(post_delete, sender=DonorTier)
+def reload_tiers(sender, instance, **kwargs):
+    # this worker only; the others reload within TIER_TABLE_TTL_SECONDS
+    transaction.on_commit(tier_table.invalidate)
+    # and move the donors across the new thresholds; several edits in a row
+    # queue one recompute
+    jobs.enqueue("tiers.recompute", key="tiers.recompute")
@@ -0,0 +1,267 @@
+# app/supabase.py
+# Shared HTTP client for every call the backend makes to Supabase.
+# One pooled keep-alive session per worker process, a deadline budget per call
+# (retries included), retries with jittered backoff for idempotent calls, and
+# a circuit breaker that fails fast with a 503 while Supabase is unhealthy
+# instead of tying up every worker on a slow upstream. Async views use the
+# same policy through arequest(), backed by an httpx.AsyncClient.
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+
+class SupabaseError(Exception):
+    """Supabase could not be reached or kept failing."""
+
+    status = 502
+
+    def __init__(self, message, detail=None):
+        super().__init__(message)
+        self.message = message
+        self.detail = detail
+
+
+class SupabaseUnavailable(SupabaseError):
+    """The circuit breaker is open; the call was not attempted."""
+
+    status = 503
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # let a single trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning("Supabase circuit breaker opened after %s failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class _Call:
+    """Policy for one logical call, shared by request() and arequest(): the
+    deadline budget, the backoff schedule, breaker bookkeeping and what
+    counts as a failure. The callers only do the I/O."""
+
+    def __init__(self, breaker, deadline, retries):
+        self.breaker = breaker
+        self.retries = retries
+        self.budget_end = time.monotonic() + deadline
+        self.attempt = 0
+        self.last_error = None
+        self.res = None
+
+    def remaining(self):
+        return self.budget_end - time.monotonic()
+
+    def failed(self, error):
+        self.last_error = error
+        self.res = None
+
+    def answered(self, res):
+        """Record a response; True when it should be handed to the caller."""
+        self.last_error = None
+        self.res = res
+        if res.status_code not in RETRYABLE_STATUSES and res.status_code < 500:
+            self.breaker.record_success()
+            return True
+        return False
+
+    def backoff(self):
+        """Seconds to sleep before the next attempt, or None to stop."""
+        if self.attempt >= self.retries:
+            return None
+        self.attempt += 1
+        # full jitter backoff, never sleeping past the budget
+        backoff = random.uniform(0, min(1.0, 0.1 * 2 ** self.attempt))
+        if time.monotonic() + backoff >= self.budget_end:
+            return None
+        return backoff
+
+    def give_up(self):
+        """Count the failure; return the last response or raise SupabaseError."""
+        self.breaker.record_failure()
+        if self.res is not None:
+            return self.res
+        detail = str(self.last_error) if self.last_error else "deadline exceeded"
+        raise SupabaseError("Failed to contact Supabase", detail=detail)
+
+
+class SupabaseClient:
+    def __init__(self, base_url, anon_key, pool_size=10, connect_timeout=3.0,
+                 deadline=5.0, max_retries=2, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.anon_key = anon_key
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # httpx.AsyncClient is bound to the event loop that created it
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_ANON_KEY,
+            pool_size=settings.SUPABASE_HTTP_POOL_SIZE,
+            connect_timeout=settings.SUPABASE_HTTP_CONNECT_TIMEOUT,
+            deadline=settings.SUPABASE_HTTP_DEADLINE_SECONDS,
+            max_retries=settings.SUPABASE_HTTP_MAX_RETRIES,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.SUPABASE_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.SUPABASE_BREAKER_RESET_SECONDS,
+            ),
+        )
+
+    @property
+    def session(self):
+        # Sessions must not be shared across a fork (gunicorn preload), so a
+        # new pool is built the first time each worker process uses it.
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers["apikey"] = self.anon_key
+                    self._session = session
+                    self._pid = pid
+        return self._session
+
+    def _call(self, method, deadline, retries, idempotent):
+        if not self.breaker.allow():
+            raise SupabaseUnavailable("Supabase is temporarily unavailable")
+        if method.upper() != "GET" and not idempotent:
+            retries = 0
+        elif retries is None:
+            retries = self.max_retries
+        return _Call(self.breaker, deadline or self.deadline, retries)
+
+    def request(self, method, path, headers=None, json=None, deadline=None, retries=None, idempotent=False):
+        """Send a request and return the ``requests.Response``.
+
+        ``deadline`` is the total time budget in seconds for every attempt.
+        GETs are retried (``retries`` times, default max_retries); other
+        methods are sent once unless the caller passes ``idempotent=True``.
+        Raises SupabaseUnavailable while the breaker is open and SupabaseError
+        when no response could be obtained.
+        """
+        call = self._call(method, deadline, retries, idempotent)
+        url = f"{self.base_url}{path}"
+        while (remaining := call.remaining()) > 0:
+            try:
+                res = self.session.request(
+                    method, url, headers=headers, json=json,
+                    timeout=(min(self.connect_timeout, remaining), remaining),
+                )
+            except requests.RequestException as e:
+                call.failed(e)
+            else:
+                if call.answered(res):
+                    return res
+            backoff = call.backoff()
+            if backoff is None:
+                break
+            time.sleep(backoff)
+        return call.give_up()
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"apikey": self.anon_key},
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.pool_size),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def arequest(self, method, path, headers=None, json=None, deadline=None, retries=None, idempotent=False):
+        """Non-blocking version of ``request``; returns an ``httpx.Response``."""
+        call = self._call(method, deadline, retries, idempotent)
+        client = self._async_client()
+        while (remaining := call.remaining()) > 0:
+            try:
+                res = await client.request(
+                    method, path, headers=headers, json=json,
+                    timeout=httpx.Timeout(remaining, connect=min(self.connect_timeout, remaining)),
+                )
+            except httpx.HTTPError as e:
+                call.failed(e)
+            else:
+                if call.answered(res):
+                    return res
+            backoff = call.backoff()
+            if backoff is None:
+                break
+            await asyncio.sleep(backoff)
+        return call.give_up()
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    async def aget(self, path, **kwargs):
+        return await self.arequest("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = SupabaseClient.from_settings()
+    return _client
@@ -0,0 +1,29 @@
+# app/tasks.py
+# Background job handlers (app/jobs.py). Imported by AppConfig.ready(), so
+# web and worker processes register the same names.
+from django.conf import settings
+
+from app import analytics, jobs, payments, tiers
+
+
+@jobs.task("payments.apply_events")
+def apply_payment_events():
+    """Drain the staged payment webhooks into the ledger (app/payments.py)."""
+    batch_size = settings.PAYMENT_EVENTS_BATCH_SIZE
+    while sum(payments.apply_pending_events(batch_size)) >= batch_size:
+        pass
+
+
+@jobs.task("tiers.recompute")
+def recompute_tiers():
+    """Reassign donor tiers after a threshold changed (app/tiers.py)."""
+    tiers.recompute_tiers()
+
+
+@jobs.task("analytics.rollup")
+def rollup_donations():
+    """Add the donations recorded since the last run to the daily rollups
+    (app/analytics.py)."""
+    batch_size = settings.ANALYTICS_ROLLUP_BATCH_SIZE
+    while analytics.rollup_pending(batch_size) >= batch_size:
+        pass
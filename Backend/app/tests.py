@@ -0,0 +1,2389 @@
+# app/tests.py
+# Run with ``python manage.py test app`` against PostgreSQL (the schema uses
+# pg_trgm, partial indexes and ON CONFLICT). Key material, signatures and
+# upstream servers are generated locally; nothing here calls Supabase,
+# Stripe or PayPal.
+import asyncio
+import base64
+import hashlib
+import hmac
+import importlib
+import importlib.util
+import io
+import json
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+import httpx
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+from psycopg.conninfo import make_conninfo
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.forms.utils import ErrorList
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from app import auth
+from app.auth import SupabaseAuthError, verify_token_locally
+from app.checks import catalog_cache_check
+from app import analytics, exports, identity, jobs, live, payments, ranking, search
+from app.filters import filter_campaigns
+from app.models import (
+    Campaign, CampaignDailyStats, CampaignDonor, CampaignRank, CategoryDailyStats, DeadJob, Donation, DonorProfile,
+    DonorTier, EduUser, Job, PaymentEvent, PendingRollup, StudentProfile, UniversityDailyStats,
+)
+from app.renderers import ORJSONRenderer, ORJSONResponse, astream_json_array
+from app.response_cache import DetailCache, ResponseCache
+from app.serializers import CampaignDetailSerializer, CampaignListSerializer
+from backend import async_views, views
+from app.supabase import CircuitBreaker, SupabaseClient, SupabaseError, SupabaseUnavailable
+from app.tiers import recompute_tiers, tier_table
+from app.utils import AsyncSingleFlight, LRUCache, SingleFlight
+
+ISSUER = "https://project.supabase.test/auth/v1"
+
+
+def _claims(**overrides):
+    now = int(time.time())
+    claims = {
+        "sub": "8d5c6b8e-0000-4000-8000-000000000001",
+        "email": "ada@example.edu",
+        "aud": "authenticated",
+        "iss": ISSUER,
+        "iat": now,
+        "exp": now + 3600,
+        "user_metadata": {"first_name": "Ada"},
+    }
+    claims.update(overrides)
+    return claims
+
+
+def _in_threads(n, target):
+    """Run ``target(i)`` in ``n`` threads released together; returns what
+    each returned or raised."""
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def run(i):
+        try:
+            barrier.wait()
+            results[i] = target(i)
+        except Exception as e:
+            results[i] = e
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _rsa_jwk(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update(kid=kid, alg="RS256", use="sig")
+    return private_key, jwk
+
+
+@override_settings(
+    SUPABASE_JWT_SECRETS=["current-secret", "previous-secret"],
+    SUPABASE_JWKS_URL="",
+    SUPABASE_JWT_AUDIENCE="authenticated",
+    SUPABASE_JWT_ISSUER=ISSUER,
+    SUPABASE_JWT_LEEWAY_SECONDS=10,
+)
+class LocalTokenVerificationTests(SimpleTestCase):
+    def test_valid_token(self):
+        user = verify_token_locally(jwt.encode(_claims(), "current-secret", algorithm="HS256"))
+        self.assertEqual(user["id"], "8d5c6b8e-0000-4000-8000-000000000001")
+        self.assertEqual(user["email"], "ada@example.edu")
+        self.assertEqual(user["user_metadata"], {"first_name": "Ada"})
+
+    def test_previous_secret_still_accepted_during_rotation(self):
+        user = verify_token_locally(jwt.encode(_claims(), "previous-secret", algorithm="HS256"))
+        self.assertEqual(user["email"], "ada@example.edu")
+
+    def test_unknown_secret_rejected(self):
+        with self.assertRaisesMessage(SupabaseAuthError, "Invalid Supabase token"):
+            verify_token_locally(jwt.encode(_claims(), "someone-elses-secret", algorithm="HS256"))
+
+    def test_expired_token_rejected(self):
+        now = int(time.time())
+        token = jwt.encode(_claims(iat=now - 7200, exp=now - 60), "current-secret", algorithm="HS256")
+        with self.assertRaisesMessage(SupabaseAuthError, "Supabase token has expired"):
+            verify_token_locally(token)
+
+    def test_expiry_within_leeway_accepted(self):
+        token = jwt.encode(_claims(exp=int(time.time()) - 5), "current-secret", algorithm="HS256")
+        self.assertEqual(verify_token_locally(token)["email"], "ada@example.edu")
+
+    def test_tampered_payload_rejected(self):
+        header, payload, signature = jwt.encode(_claims(), "current-secret", algorithm="HS256").split(".")
+        forged = jwt.encode(_claims(sub="someone-else"), "attacker", algorithm="HS256").split(".")[1]
+        with self.assertRaises(SupabaseAuthError):
+            verify_token_locally(f"{header}.{forged}.{signature}")
+
+    def test_wrong_audience_rejected(self):
+        token = jwt.encode(_claims(aud="anon"), "current-secret", algorithm="HS256")
+        with self.assertRaisesMessage(SupabaseAuthError, "Invalid Supabase token"):
+            verify_token_locally(token)
+
+    def test_wrong_issuer_rejected(self):
+        token = jwt.encode(_claims(iss="https://other.supabase.test/auth/v1"), "current-secret", algorithm="HS256")
+        with self.assertRaises(SupabaseAuthError):
+            verify_token_locally(token)
+
+    def test_missing_subject_rejected(self):
+        claims = _claims()
+        del claims["sub"]
+        with self.assertRaises(SupabaseAuthError):
+            verify_token_locally(jwt.encode(claims, "current-secret", algorithm="HS256"))
+
+    def test_unsigned_token_rejected(self):
+        token = jwt.encode(_claims(), None, algorithm="none")
+        with self.assertRaisesMessage(SupabaseAuthError, "Unsupported token algorithm"):
+            verify_token_locally(token)
+
+    def test_garbage_rejected(self):
+        with self.assertRaisesMessage(SupabaseAuthError, "Invalid Supabase token"):
+            verify_token_locally("not-a-jwt")
+
+
+@override_settings(
+    SUPABASE_JWT_SECRETS=[],
+    SUPABASE_JWKS_URL="https://project.supabase.test/auth/v1/.well-known/jwks.json",
+    SUPABASE_JWT_AUDIENCE="authenticated",
+    SUPABASE_JWT_ISSUER=ISSUER,
+)
+class JwksVerificationTests(SimpleTestCase):
+    def setUp(self):
+        auth._jwks_client = None
+        self.addCleanup(setattr, auth, "_jwks_client", None)
+        self.old_key, self.old_jwk = _rsa_jwk("key-1")
+        self.new_key, self.new_jwk = _rsa_jwk("key-2")
+
+    def _token(self, private_key, kid, **claims):
+        return jwt.encode(_claims(**claims), private_key, algorithm="RS256", headers={"kid": kid})
+
+    def test_signed_with_published_key(self):
+        with mock.patch.object(jwt.PyJWKClient, "fetch_data", return_value={"keys": [self.old_jwk]}):
+            user = verify_token_locally(self._token(self.old_key, "key-1"))
+        self.assertEqual(user["email"], "ada@example.edu")
+
+    def test_rotated_key_picked_up_by_refetching_the_key_set(self):
+        key_sets = [{"keys": [self.old_jwk]}, {"keys": [self.old_jwk, self.new_jwk]}]
+        with mock.patch.object(jwt.PyJWKClient, "fetch_data", side_effect=key_sets) as fetch:
+            # the key set is cached after the first token
+            verify_token_locally(self._token(self.old_key, "key-1"))
+            user = verify_token_locally(self._token(self.new_key, "key-2"))
+        self.assertEqual(user["email"], "ada@example.edu")
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_unknown_kid_rejected(self):
+        with mock.patch.object(jwt.PyJWKClient, "fetch_data", return_value={"keys": [self.old_jwk]}):
+            with self.assertRaisesMessage(SupabaseAuthError, "Unknown Supabase signing key"):
+                verify_token_locally(self._token(self.new_key, "key-3"))
+
+    def test_key_id_of_another_key_rejected(self):
+        # signed with the new key but claiming the published one's kid
+        with mock.patch.object(jwt.PyJWKClient, "fetch_data", return_value={"keys": [self.old_jwk]}):
+            with self.assertRaisesMessage(SupabaseAuthError, "Invalid Supabase token"):
+                verify_token_locally(self._token(self.new_key, "key-1"))
+
+    def test_expired_rejected(self):
+        now = int(time.time())
+        with mock.patch.object(jwt.PyJWKClient, "fetch_data", return_value={"keys": [self.old_jwk]}):
+            with self.assertRaisesMessage(SupabaseAuthError, "Supabase token has expired"):
+                verify_token_locally(self._token(self.old_key, "key-1", iat=now - 7200, exp=now - 60))
+
+    def test_wrong_audience_rejected(self):
+        with mock.patch.object(jwt.PyJWKClient, "fetch_data", return_value={"keys": [self.old_jwk]}):
+            with self.assertRaises(SupabaseAuthError):
+                verify_token_locally(self._token(self.old_key, "key-1", aud="service_role"))
+
+    def test_hs256_token_rejected_without_secret(self):
+        # an attacker cannot downgrade to HMAC keyed with the public key
+        token = jwt.encode(_claims(), "anything", algorithm="HS256")
+        with self.assertRaisesMessage(SupabaseAuthError, "No JWT secret configured for HS256 tokens"):
+            verify_token_locally(token)
+
+    def test_key_server_unreachable(self):
+        error = jwt.PyJWKClientConnectionError("connection refused")
+        with mock.patch.object(jwt.PyJWKClient, "fetch_data", side_effect=error):
+            with self.assertRaises(SupabaseAuthError) as cm:
+                verify_token_locally(self._token(self.old_key, "key-1"))
+        self.assertEqual(cm.exception.status, 502)
+
+
+class FakeUpstream:
+    """A local HTTP server answering with the queued ``(status, delay)``
+    replies in order, then 200s."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.hits = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                upstream.hits.append(self.command)
+                status, delay = upstream.replies.pop(0) if upstream.replies else (200, 0)
+                time.sleep(delay)
+                body = b'{"ok": true}'
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except ConnectionError:
+                    # the client gave up (deadline tests)
+                    pass
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SupabaseClientTests(SimpleTestCase):
+    def client_for(self, *replies, deadline=2.0, max_retries=2, breaker=None):
+        upstream = FakeUpstream(*replies)
+        self.addCleanup(upstream.close)
+        client = SupabaseClient(upstream.url, "anon", deadline=deadline, max_retries=max_retries, breaker=breaker)
+        return client, upstream
+
+    def test_get_retried_until_success(self):
+        client, upstream = self.client_for((503, 0), (502, 0))
+        self.assertEqual(client.get("/auth/v1/user").status_code, 200)
+        self.assertEqual(len(upstream.hits), 3)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_get_gives_up_after_max_retries(self):
+        client, upstream = self.client_for((503, 0), (503, 0), (503, 0), (200, 0), max_retries=2)
+        self.assertEqual(client.get("/auth/v1/user").status_code, 503)
+        self.assertEqual(len(upstream.hits), 3)
+
+    def test_post_sent_once(self):
+        client, upstream = self.client_for((503, 0))
+        self.assertEqual(client.post("/storage/v1/object/sign/avatars/a.png", json={}).status_code, 503)
+        self.assertEqual(upstream.hits, ["POST"])
+
+    def test_post_not_retried_even_when_asked(self):
+        client, upstream = self.client_for((503, 0))
+        client.request("POST", "/storage/v1/object/sign/avatars/a.png", retries=3)
+        self.assertEqual(upstream.hits, ["POST"])
+
+    def test_idempotent_post_retried(self):
+        client, upstream = self.client_for((503, 0))
+        res = client.post("/storage/v1/object/sign/avatars/a.png", json={}, idempotent=True)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(upstream.hits, ["POST", "POST"])
+
+    def test_client_errors_not_retried(self):
+        client, upstream = self.client_for((401, 0))
+        self.assertEqual(client.get("/auth/v1/user").status_code, 401)
+        self.assertEqual(len(upstream.hits), 1)
+
+    def test_deadline_covers_every_attempt(self):
+        client, upstream = self.client_for((200, 1.0), (200, 1.0), deadline=0.3)
+        started = time.monotonic()
+        with self.assertRaises(SupabaseError):
+            client.get("/auth/v1/user")
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_spent_deadline_raises_supabase_error(self):
+        client, upstream = self.client_for(deadline=1e-9)
+        with self.assertRaisesMessage(SupabaseError, "Failed to contact Supabase"):
+            client.get("/auth/v1/user")
+        self.assertEqual(upstream.hits, [])
+
+    def test_breaker_opens_then_half_opens(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+        client, upstream = self.client_for((503, 0), (503, 0), max_retries=0, breaker=breaker)
+        client.get("/auth/v1/user")
+        client.get("/auth/v1/user")
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(SupabaseUnavailable):
+            client.get("/auth/v1/user")
+        self.assertEqual(len(upstream.hits), 2)
+
+        time.sleep(0.25)
+        # one trial call goes through and closes the breaker
+        self.assertEqual(client.get("/auth/v1/user").status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_trial_call_reopens_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+        client, upstream = self.client_for((503, 0), (503, 0), max_retries=0, breaker=breaker)
+        client.get("/auth/v1/user")
+        time.sleep(0.25)
+        client.get("/auth/v1/user")
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(SupabaseUnavailable):
+            client.get("/auth/v1/user")
+        self.assertEqual(len(upstream.hits), 2)
+
+    def test_async_get_retried_until_success(self):
+        client, upstream = self.client_for((503, 0))
+
+        async def call():
+            return await client.aget("/auth/v1/user")
+
+        self.assertEqual(asyncio.run(call()).status_code, 200)
+        self.assertEqual(len(upstream.hits), 2)
+
+    def test_async_post_retried_only_when_idempotent(self):
+        client, upstream = self.client_for((503, 0), (503, 0))
+        path = "/storage/v1/object/sign/avatars/a.png"
+        self.assertEqual(asyncio.run(client.arequest("POST", path)).status_code, 503)
+        self.assertEqual(asyncio.run(client.arequest("POST", path, idempotent=True)).status_code, 200)
+        self.assertEqual(upstream.hits, ["POST", "POST", "POST"])
+
+    def test_async_spent_deadline_raises_supabase_error(self):
+        client, upstream = self.client_for(deadline=1e-9)
+        with self.assertRaises(SupabaseError):
+            asyncio.run(client.aget("/auth/v1/user"))
+
+
+@override_settings(
+    SUPABASE_JWT_SECRETS=["current-secret"],
+    SUPABASE_JWKS_URL="",
+    SUPABASE_JWT_AUDIENCE="authenticated",
+    SUPABASE_JWT_ISSUER=ISSUER,
+)
+class ConcurrentLoginTests(TransactionTestCase):
+    def test_first_logins_racing_create_one_user_and_profile(self):
+        token = jwt.encode(
+            _claims(user_metadata={"role": "student", "first_name": "Ada"}), "current-secret", algorithm="HS256"
+        )
+        body = json.dumps({"access_token": token})
+
+        def login(i):
+            return Client().post("/auth/login", body, content_type="application/json")
+
+        responses = _in_threads(2, login)
+        self.assertEqual([r.status_code for r in responses], [200, 200], [r.content for r in responses])
+        self.assertEqual(sorted(r.json()["is_new"] for r in responses), [False, True])
+        self.assertEqual(len({r.json()["user"]["id"] for r in responses}), 1)
+        self.assertEqual(EduUser.objects.filter(email="ada@example.edu").count(), 1)
+        self.assertEqual(StudentProfile.objects.filter(user__email="ada@example.edu").count(), 1)
+
+
+class _Clock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.005)
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_byte_budget(self):
+        cache = LRUCache(max_entries=100, max_bytes=10, sizeof=len)
+        cache.set("a", "xxxx")
+        cache.set("b", "yyyy")
+        cache.set("c", "zzzz")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.bytes, 8)
+        # larger than the whole budget: not stored, and the old value is gone
+        cache.set("b", "y" * 11)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.bytes, 4)
+
+    def test_entries_expire_after_their_ttl(self):
+        clock = _Clock()
+        with mock.patch("app.utils.time.monotonic", clock):
+            cache = LRUCache(default_ttl=60)
+            cache.set("default", 1)
+            cache.set("short", 2, ttl=5)
+            clock.advance(5)
+            self.assertIsNone(cache.get("short"))
+            self.assertEqual(cache.get("default"), 1)
+            clock.advance(55)
+            self.assertIsNone(cache.get("default"))
+        self.assertEqual(cache.stats()["expirations"], 2)
+        self.assertEqual(len(cache), 0)
+
+    def test_delete_where(self):
+        cache = LRUCache(max_bytes=100, sizeof=lambda v: v)
+        for key, value in [("a", 1), ("b", 2), ("c", 3)]:
+            cache.set(key, value)
+        self.assertEqual(cache.delete_where(lambda v: v % 2), 2)
+        self.assertEqual((cache.get("b"), cache.bytes), (2, 2))
+
+
+class SingleFlightTests(SimpleTestCase):
+    n = 8
+
+    def test_concurrent_misses_run_once(self):
+        flights, calls = SingleFlight(), []
+
+        def fetch():
+            calls.append(1)
+            # hold the flight until every other caller has joined it
+            _wait_for(lambda: flights.coalesced == self.n - 1)
+            return "value"
+
+        results = _in_threads(self.n, lambda i: flights.do("key", fetch))
+        self.assertEqual(results, ["value"] * self.n)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats(), {"executions": 1, "coalesced": self.n - 1})
+        # nothing is kept once the flight lands
+        self.assertEqual(flights.do("key", lambda: "again"), "again")
+
+    def test_error_reaches_every_waiter(self):
+        flights = SingleFlight()
+        error = RuntimeError("upstream down")
+
+        def fetch():
+            _wait_for(lambda: flights.coalesced == self.n - 1)
+            raise error
+
+        self.assertEqual(_in_threads(self.n, lambda i: flights.do("key", fetch)), [error] * self.n)
+        self.assertEqual(flights.do("key", lambda: "recovered"), "recovered")
+
+    def test_keys_do_not_coalesce(self):
+        flights = SingleFlight()
+        results = _in_threads(2, lambda i: flights.do(i, lambda: i))
+        self.assertEqual(results, [0, 1])
+        self.assertEqual(flights.executions, 2)
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    n = 8
+
+    def test_concurrent_misses_run_once(self):
+        flights, calls = AsyncSingleFlight(), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        async def run():
+            return await asyncio.gather(*(flights.do("key", fetch) for _ in range(self.n)))
+
+        self.assertEqual(asyncio.run(run()), ["value"] * self.n)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats(), {"executions": 1, "coalesced": self.n - 1})
+
+    def test_error_reaches_every_waiter(self):
+        flights = AsyncSingleFlight()
+        error = RuntimeError("upstream down")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise error
+
+        async def run():
+            return await asyncio.gather(*(flights.do("key", fetch) for _ in range(self.n)), return_exceptions=True)
+
+        self.assertEqual(asyncio.run(run()), [error] * self.n)
+
+    def test_cancelled_waiter_does_not_cancel_the_flight(self):
+        flights = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "value"
+
+        async def run():
+            leader = asyncio.create_task(flights.do("key", fetch))
+            waiter = asyncio.create_task(flights.do("key", fetch))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            return await leader, await asyncio.gather(waiter, return_exceptions=True)
+
+        value, (cancelled,) = asyncio.run(run())
+        self.assertEqual(value, "value")
+        self.assertIsInstance(cancelled, asyncio.CancelledError)
+
+
+@override_settings(IDENTITY_CACHE_NEGATIVE_TTL_SECONDS=30)
+class IdentityCacheTests(TransactionTestCase):
+    n = 8
+
+    def setUp(self):
+        identity.identity_cache.clear()
+        self.upstream = mock.patch("app.identity.resolve_supabase_user").start()
+        self.aupstream = mock.patch("app.identity.aresolve_supabase_user").start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(identity.identity_cache.clear)
+        self.upstream.side_effect = self.user_data
+
+    @staticmethod
+    def user_data(token, ttl=120):
+        return {"email": f"{token}@example.edu", "exp": time.time() + ttl, "user_metadata": {"role": "donor"}}
+
+    def test_hit_skips_upstream_and_database(self):
+        first = identity.resolve_edu_user("ada")
+        with self.assertNumQueries(0):
+            second = identity.resolve_edu_user("ada")
+        self.assertEqual(self.upstream.call_count, 1)
+        self.assertEqual((first.id, first.is_donor), (second.id, True))
+        self.assertIsNot(first, second)
+
+    def test_entry_expires_with_the_token(self):
+        clock = _Clock()
+        with mock.patch("app.utils.time.monotonic", clock):
+            identity.resolve_edu_user("ada")
+            clock.advance(119)
+            identity.resolve_edu_user("ada")
+            self.assertEqual(self.upstream.call_count, 1)
+            clock.advance(2)
+            identity.resolve_edu_user("ada")
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_expired_token_is_not_cached(self):
+        self.upstream.side_effect = lambda token: self.user_data(token, ttl=-1)
+        identity.resolve_edu_user("ada")
+        identity.resolve_edu_user("ada")
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_rejection_is_cached_until_the_negative_ttl(self):
+        clock = _Clock()
+        self.upstream.side_effect = SupabaseAuthError("Invalid token")
+        with mock.patch("app.utils.time.monotonic", clock):
+            for _ in range(3):
+                with self.assertRaises(SupabaseAuthError):
+                    identity.resolve_edu_user("bad")
+            self.assertEqual(self.upstream.call_count, 1)
+            clock.advance(30)
+            with self.assertRaises(SupabaseAuthError):
+                identity.resolve_edu_user("bad")
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_upstream_outage_is_not_cached(self):
+        self.upstream.side_effect = SupabaseAuthError("Supabase unavailable", status=503)
+        for _ in range(2):
+            with self.assertRaises(SupabaseAuthError):
+                identity.resolve_edu_user("ada")
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_invalidate_user(self):
+        user = identity.resolve_edu_user("ada")
+        self.assertEqual(identity.invalidate_user(user.id), 1)
+        identity.resolve_edu_user("ada")
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def slow_upstream(self, result):
+        # the flight counters are per process, not per test
+        before = identity.identity_flights.coalesced
+
+        def fetch(token):
+            _wait_for(lambda: identity.identity_flights.coalesced - before == self.n - 1)
+            if isinstance(result, Exception):
+                raise result
+            return self.user_data(token)
+        return fetch
+
+    def test_concurrent_misses_share_one_lookup(self):
+        self.upstream.side_effect = self.slow_upstream(None)
+        users = _in_threads(self.n, lambda i: identity.resolve_edu_user("ada"))
+        self.assertEqual(self.upstream.call_count, 1)
+        self.assertEqual({user.id for user in users}, {EduUser.objects.get(email="ada@example.edu").id})
+
+    def test_concurrent_rejection_reaches_every_waiter(self):
+        error = SupabaseAuthError("Invalid token")
+        self.upstream.side_effect = self.slow_upstream(error)
+        self.assertEqual(_in_threads(self.n, lambda i: identity.resolve_edu_user("bad")), [error] * self.n)
+        self.assertEqual(self.upstream.call_count, 1)
+
+    def test_async_concurrent_misses_share_one_lookup(self):
+        async def fetch(token):
+            await asyncio.sleep(0.01)
+            return self.user_data(token)
+
+        async def run():
+            return await asyncio.gather(*(identity.aresolve_edu_user("ada") for _ in range(self.n)))
+
+        self.aupstream.side_effect = fetch
+        users = asyncio.run(run())
+        self.assertEqual(self.aupstream.call_count, 1)
+        self.assertEqual(len({user.id for user in users}), 1)
+        # and the sync path now hits the same entry
+        identity.resolve_edu_user("ada")
+        self.upstream.assert_not_called()
+
+    def test_async_rejection_reaches_every_waiter(self):
+        error = SupabaseAuthError("Invalid token")
+
+        async def fetch(token):
+            await asyncio.sleep(0.01)
+            raise error
+
+        async def run():
+            return await asyncio.gather(*(identity.aresolve_edu_user("bad") for _ in range(self.n)), return_exceptions=True)
+
+        self.aupstream.side_effect = fetch
+        self.assertEqual(asyncio.run(run()), [error] * self.n)
+        self.assertEqual(self.aupstream.call_count, 1)
+
+
+class MergeDuplicateEmailsTests(TestCase):
+    merge = staticmethod(importlib.import_module("app.migrations.0006_eduuser_email_unique").merge_duplicate_emails)
+
+    def setUp(self):
+        # users from before the constraint; rolled back with the test
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX app_eduuser_email_unique")
+
+    def user(self, username, **fields):
+        return EduUser.objects.create(username=username, email="ada@example.edu", **fields)
+
+    def run_merge(self):
+        with connection.schema_editor() as editor:
+            self.merge(apps, editor)
+
+    def test_profiles_move_to_one_user(self):
+        first = self.user("first", is_donor=True)
+        second = self.user("second", is_student=True)
+        DonorProfile.objects.create(user=first, full_name="Ada", email="ada@example.edu")
+        StudentProfile.objects.create(user=second, full_name="Ada", email="ada@example.edu")
+        self.run_merge()
+        kept = EduUser.objects.get(email="ada@example.edu")
+        self.assertEqual(kept.id, first.id)
+        self.assertTrue(kept.is_student and kept.is_donor)
+        self.assertEqual(kept.studentprofile.full_name, "Ada")
+        self.assertEqual(kept.donor_profile.full_name, "Ada")
+        self.assertFalse(EduUser.objects.filter(id=second.id).exists())
+
+    def test_student_with_campaign_is_kept(self):
+        first = self.user("first", is_student=True)
+        second = self.user("second", is_student=True)
+        StudentProfile.objects.create(user=first, full_name="Old", email="ada@example.edu")
+        running = StudentProfile.objects.create(user=second, full_name="Ada", email="ada@example.edu")
+        Campaign.objects.create(
+            student=running, title="Tuition", description="", goal_amount=100, deadline=timezone.now(),
+        )
+        self.run_merge()
+        self.assertEqual(EduUser.objects.get(email="ada@example.edu").id, second.id)
+        # the other profile cannot move; it stays, under a blank email
+        self.assertEqual(EduUser.objects.get(id=first.id).email, "")
+        self.assertEqual(StudentProfile.objects.count(), 2)
+
+
+class CampaignListIndexTests(TestCase):
+    """Each filter/sort combination is an index range scan in the sort's
+    order: no Sort node, whatever the table size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # enough rows, analyzed, for the planner's choice not to hinge on
+        # whatever statistics an earlier test left (rolled back after the class)
+        n = 2000
+        categories = [choice for choice, _ in Campaign.CATEGORY_CHOICES]
+        users = EduUser.objects.bulk_create(
+            EduUser(username=f"indexed{i}", email=f"indexed{i}@example.edu", is_student=True) for i in range(n)
+        )
+        students = StudentProfile.objects.bulk_create(
+            StudentProfile(user=user, full_name=user.username, email=user.email) for user in users
+        )
+        now = timezone.now()
+        Campaign.objects.bulk_create(
+            Campaign(
+                student=student, title=f"Campaign {i}", description="", goal_amount=100 + i, current_amount=i,
+                category=categories[i % len(categories)], status="active" if i % 10 else "completed",
+                deadline=now + timedelta(days=i % 90),
+            )
+            for i, student in enumerate(students)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Campaign._meta.db_table}")
+
+    def plan(self, query):
+        request = RequestFactory().get("/campaigns", query)
+        campaigns, paginator = filter_campaigns(request.GET)
+        page, _ = paginator.page_queryset(campaigns, request)
+        return page.explain()
+
+    def assertUsesIndex(self, query, index):
+        plan = self.plan(query)
+        self.assertIn(index, plan)
+        self.assertNotIn("Sort", plan)
+        return plan
+
+    def test_default_listing(self):
+        self.assertUsesIndex({}, "app_campaign_status_new_idx")
+
+    def test_category(self):
+        self.assertUsesIndex({"category": "education"}, "app_campaign_cat_new_idx")
+
+    def test_sorts(self):
+        for sort, index in [
+            ("deadline", "app_campaign_deadline_idx"),
+            ("goal_asc", "app_campaign_goal_idx"),
+            ("goal_desc", "app_campaign_goal_idx"),
+            ("most_funded", "app_campaign_raised_idx"),
+        ]:
+            with self.subTest(sort=sort):
+                self.assertUsesIndex({"sort": sort, "goal_min": "100"}, index)
+
+    def test_next_page(self):
+        cursor = filter_campaigns(RequestFactory().get("/campaigns").GET)[1].encode(
+            {"created_at": timezone.now(), "id": 10}
+        )
+        plan = self.assertUsesIndex({"cursor": cursor}, "app_campaign_status_new_idx")
+        # the row comparison bounds the index range, not a filter after it
+        self.assertRegex(plan, r"Index Cond: .*ROW\(created_at, id\) <")
+
+
+def _student(i):
+    user = EduUser.objects.create(username=f"student{i}", email=f"student{i}@example.edu", is_student=True)
+    student = StudentProfile.objects.create(
+        user=user, full_name=f"Student {i}", email=user.email, university="State", gpa=3.5
+    )
+    Campaign.objects.create(
+        student=student, title=f"Campaign {i}", description="Tuition", goal_amount=1000,
+        deadline=timezone.now() + timedelta(days=30),
+    )
+    return student
+
+
+class PayloadQueryCountTests(TestCase):
+    """List and detail payloads load in a fixed number of queries, however
+    many rows they print (no per-row lazy loads): the conditional-GET
+    fingerprint, then the page or object."""
+
+    def setUp(self):
+        caches["catalog"].clear()
+        self.students = [_student(i) for i in range(3)]
+
+    def assertQueriesFlat(self, path, queries):
+        with self.assertNumQueries(queries):
+            first = self.client.get(path)
+        self.assertEqual(first.status_code, 200)
+        self.students += [_student(i) for i in range(3, 10)]
+        caches["catalog"].clear()
+        with self.assertNumQueries(queries):
+            self.assertEqual(self.client.get(path).status_code, 200)
+
+    def test_campaign_list(self):
+        self.assertQueriesFlat("/campaigns", 2)
+
+    def test_discover_students(self):
+        self.assertQueriesFlat("/students/discover", 2)
+
+    def test_campaign_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/campaigns/{self.students[0].campaign.id}")
+        self.assertEqual(response.status_code, 200)
+
+    def test_student_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/students/{self.students[0].id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["gpa"], "3.5")
+        self.assertEqual(response.json()["campaign"]["title"], "Campaign 0")
+
+    # search: the full-text probe (else the trigram fallback), then the page
+
+    def test_campaign_search(self):
+        self.assertQueriesFlat("/campaigns/search?q=tuition", 2)
+
+    def test_student_search(self):
+        self.assertQueriesFlat("/students/search?q=student", 2)
+
+    @override_settings(
+        SUPABASE_JWT_SECRETS=["current-secret"],
+        SUPABASE_JWKS_URL="",
+        SUPABASE_JWT_AUDIENCE="authenticated",
+        SUPABASE_JWT_ISSUER=ISSUER,
+    )
+    def test_students_for_donor(self):
+        # not routed; called directly, with the token already resolved
+        token = jwt.encode(_claims(user_metadata={"role": "donor"}), "current-secret", algorithm="HS256")
+        factory = RequestFactory(headers={"authorization": f"Bearer {token}"})
+        identity.identity_cache.clear()
+        self.addCleanup(identity.identity_cache.clear)
+        views.list_students_for_donor(factory.get("/"))
+        for count in (3, 10):
+            self.students += [_student(i) for i in range(len(self.students), count)]
+            with self.assertNumQueries(1):
+                response = views.list_students_for_donor(factory.get("/"))
+            self.assertEqual(len(response.data), count)
+
+    def test_student_detail_zero_gpa_is_null(self):
+        student = self.students[1]
+        StudentProfile.objects.filter(id=student.id).update(gpa=0)
+        self.assertIsNone(self.client.get(f"/students/{student.id}").json()["gpa"])
+
+
+class JSONRendererTests(TestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        self.students = [_student(i) for i in range(5)]
+
+    def test_matches_drf_encoder(self):
+        payload = {
+            "amount": Decimal("10.50"),
+            "at": datetime(2025, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+            "day": date(2025, 1, 2),
+            "took": timedelta(seconds=90),
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "label": gettext_lazy("Active"),
+            # a UserList: orjson would read the wrong internals without the fallback
+            "errors": ErrorList(["required"]),
+            "nested": [{"ok": True, "n": None}],
+        }
+        rendered = json.loads(ORJSONRenderer().render(payload))
+        # Decimal is the one deliberate difference: a string, not a lossy float
+        self.assertEqual(rendered.pop("amount"), "10.50")
+        del payload["amount"]
+        self.assertEqual(rendered, json.loads(JSONRenderer().render(payload)))
+        self.assertEqual(rendered["at"], "2025-01-02T03:04:05Z")
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_api_views_render_with_orjson(self):
+        response = self.client.get("/campaigns")
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_response_refuses_non_dict_unless_unsafe(self):
+        with self.assertRaises(TypeError):
+            ORJSONResponse([1])
+        self.assertEqual(ORJSONResponse([1], safe=False).content, b"[1]")
+
+    def streamed(self, path):
+        response = self.client.get(path)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+        chunks = list(response.streaming_content)
+        return chunks, json.loads(b"".join(chunks))
+
+    @override_settings(STREAM_FLUSH_BYTES=200, STREAM_CHUNK_SIZE=2)
+    def test_stream_is_the_whole_list_in_pieces(self):
+        chunks, streamed = self.streamed("/campaigns?stream=1&limit=2")
+        # every row, not one page, and in the listing's order
+        self.assertEqual(streamed, self.client.get("/campaigns?limit=100").json())
+        self.assertEqual(len(streamed), 5)
+        self.assertGreater(len(chunks), 1)
+
+    def test_stream_honours_filters_and_fields(self):
+        Campaign.objects.filter(student=self.students[0]).update(category="tuition")
+        _, streamed = self.streamed("/campaigns?stream=1&category=tuition&fields=id,title")
+        self.assertEqual(streamed, [{"id": self.students[0].campaign.id, "title": "Campaign 0"}])
+
+    def test_empty_stream(self):
+        _, streamed = self.streamed("/campaigns?stream=1&status=completed")
+        self.assertEqual(streamed, [])
+
+    def test_stream_errors_before_the_first_row(self):
+        response = self.client.get("/campaigns?stream=1&sort=nope")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+    @override_settings(STREAM_FLUSH_BYTES=100, STREAM_CHUNK_SIZE=2)
+    async def test_async_stream(self):
+        queryset = CampaignListSerializer.project().order_by("id")
+        response = astream_json_array(queryset, CampaignListSerializer.serialize)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([c["title"] for c in json.loads(b"".join(chunks))], [f"Campaign {i}" for i in range(5)])
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        self.students = [_student(i) for i in range(2)]
+        self.campaign = self.students[0].campaign
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_presets(self):
+        card = CampaignListSerializer.presets["card"]
+        self.assertEqual([list(row) for row in self.get("/campaigns?fields=card")], [card, card])
+        self.assertEqual(self.get("/campaigns?fields=full"), self.get("/campaigns"))
+        detail_card = CampaignDetailSerializer.presets["card"]
+        self.assertEqual(
+            list(self.get(f"/campaigns/{self.campaign.id}?fields=card")),
+            list(dict.fromkeys(name.partition(".")[0] for name in detail_card)),
+        )
+
+    def test_field_list_keeps_declaration_order(self):
+        self.assertEqual(self.get("/campaigns?fields=title,id")[0], {"id": self.students[1].campaign.id, "title": "Campaign 1"})
+
+    def test_dotted_nested_fields(self):
+        row = self.get("/students/discover?fields=card")[0]
+        self.assertEqual(row, {
+            "id": self.students[0].id, "full_name": "Student 0", "avatar": None,
+            "campaign": {"id": self.campaign.id, "progress_percentage": 0.0},
+        })
+        student = self.get(f"/campaigns/{self.campaign.id}?fields=id,student.full_name")["student"]
+        self.assertEqual(student, {"full_name": "Student 0"})
+        # a whole nested field wins over a subset of it
+        student = self.get(f"/campaigns/{self.campaign.id}?fields=student.id,student")["student"]
+        self.assertEqual(set(student), set(CampaignDetailSerializer.fields["student"].serializer.fields))
+
+    def test_invalid_selections(self):
+        for spec, error in [
+            ("nope", "Unknown field 'nope'"),
+            ("title.x", "'title' has no nested fields"),
+            ("student.nope", "Unknown field 'nope'"),
+            (",", "No fields selected"),
+        ]:
+            for path in ["/campaigns", f"/campaigns/{self.campaign.id}"]:
+                with self.subTest(spec=spec, path=path):
+                    response = self.client.get(path, {"fields": spec})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json()["error"], error)
+        response = self.client.get("/students/discover", {"fields": "campaign.nope"})
+        self.assertEqual(response.json(), {"error": "Unknown field 'nope'"})
+
+    def test_projection_shrinks_with_the_fields(self):
+        serializer = CampaignListSerializer.subset("id,student.full_name")
+        self.assertEqual(serializer.only_fields(), ["id", "student__full_name"])
+        self.assertEqual(serializer.select_related(), ["student"])
+        with CaptureQueriesContext(connection) as queries:
+            self.get("/campaigns?fields=id,title")
+        page_sql = queries.captured_queries[-1]["sql"]
+        self.assertIn('"title"', page_sql)
+        self.assertNotIn('"description"', page_sql)
+        self.assertNotIn("JOIN", page_sql)
+        # same for a serializer with no relation at all
+        self.assertNotIn("JOIN", str(CampaignListSerializer.subset("id").project().query))
+
+    def test_subsets_are_cached_separately(self):
+        full = self.get(f"/campaigns/{self.campaign.id}")
+        self.assertEqual(self.get(f"/campaigns/{self.campaign.id}?fields=id"), {"id": self.campaign.id})
+        self.assertEqual(self.get(f"/campaigns/{self.campaign.id}"), full)
+        self.assertIs(CampaignListSerializer.subset("id,title"), CampaignListSerializer.subset("id,title"))
+
+
+class BatchEndpointTests(TestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        self.students = [_student(i) for i in range(3)]
+        self.campaigns = [student.campaign for student in self.students]
+
+    def batch(self, path, ids, **params):
+        return self.client.get(path, {"ids": ",".join(str(i) for i in ids), **params})
+
+    def test_results_keep_request_order_and_list_missing(self):
+        ids = [self.students[2].id, 999999, self.students[0].id, self.students[2].id]
+        body = self.batch("/students/batch", ids).json()
+        self.assertEqual([s["id"] for s in body["results"]], [self.students[2].id, self.students[0].id])
+        self.assertEqual(body["missing"], [999999])
+
+        ids = [self.campaigns[1].id, 999999, self.campaigns[0].id]
+        body = self.batch("/campaigns/batch", ids).json()
+        self.assertEqual([c["id"] for c in body["results"]], [self.campaigns[1].id, self.campaigns[0].id])
+        self.assertEqual(body["missing"], [999999])
+
+    def test_payloads_match_the_detail_pages(self):
+        for path, detail, objects in [
+            ("/students/batch", "/students/{}", self.students),
+            ("/campaigns/batch", "/campaigns/{}", self.campaigns),
+        ]:
+            with self.subTest(path=path):
+                ids = [obj.id for obj in objects]
+                for fields in ({}, {"fields": "card"}):
+                    results = self.batch(path, ids, **fields).json()["results"]
+                    self.assertEqual(results, [self.client.get(detail.format(i), fields).json() for i in ids])
+
+    def test_one_query_for_any_number_of_ids(self):
+        for path, objects in [("/students/batch", self.students), ("/campaigns/batch", self.campaigns)]:
+            with self.subTest(path=path):
+                with self.assertNumQueries(1):
+                    self.batch(path, [obj.id for obj in objects])
+                # cached now, in the detail cache shared with the detail pages
+                with self.assertNumQueries(0):
+                    self.batch(path, [obj.id for obj in objects])
+
+    def test_saved_object_is_rebuilt(self):
+        self.batch("/campaigns/batch", [self.campaigns[0].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campaigns[0].title = "Renamed"
+            self.campaigns[0].save()
+        results = self.batch("/campaigns/batch", [self.campaigns[0].id]).json()["results"]
+        self.assertEqual(results[0]["title"], "Renamed")
+
+    @override_settings(BATCH_MAX_IDS=2)
+    def test_invalid_ids(self):
+        for query, error in [
+            ({}, "Missing 'ids' query parameter"),
+            ({"ids": " , "}, "Missing 'ids' query parameter"),
+            ({"ids": "1,x"}, "'ids' must be a comma-separated list of integers"),
+            ({"ids": "1,2,3"}, "At most 2 ids per request"),
+            ({"ids": "1", "fields": "nope"}, "Unknown field 'nope'"),
+        ]:
+            for path in ("/students/batch", "/campaigns/batch"):
+                with self.subTest(path=path, query=query):
+                    response = self.client.get(path, query)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {"error": error})
+        # duplicates count once
+        self.assertEqual(self.client.get("/campaigns/batch", {"ids": "1,1,2"}).status_code, 200)
+
+
+def _has_extension(name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = %s", [name])
+        return cursor.fetchone() is not None
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.robotics = self.campaign("Robotics club kit", "Parts for the team", full_name="Grace Hopper")
+        self.lab = self.campaign("Lab fees", "Fees for the robotics lab", full_name="Alan Turing")
+        self.closed = self.campaign("Robotics finals", "Travel", full_name="Ada Byron", status="completed")
+        self.chemistry = self.campaign(
+            "Semester abroad", "Exchange year", full_name="Rosalind Franklin", university="Kings", major="Chemistry"
+        )
+
+    def campaign(self, title, description, full_name, university="State", major="Engineering", status="active"):
+        i = StudentProfile.objects.count()
+        user = EduUser.objects.create(username=f"searcher{i}", email=f"searcher{i}@example.edu", is_student=True)
+        student = StudentProfile.objects.create(
+            user=user, full_name=full_name, email=user.email, university=university, major=major
+        )
+        return Campaign.objects.create(
+            student=student, title=title, description=description, goal_amount=1000, status=status,
+            deadline=timezone.now() + timedelta(days=30),
+        )
+
+    def ids(self, path, q, **params):
+        response = self.client.get(path, {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.json()]
+
+    def test_title_match_ranks_above_description_match(self):
+        self.assertEqual(self.ids("/campaigns/search", "robotics"), [self.robotics.id, self.lab.id])
+
+    def test_stemmed_words_match(self):
+        self.assertEqual(self.ids("/campaigns/search", "fee"), [self.lab.id])
+
+    def test_campaign_found_by_its_students_major(self):
+        self.assertEqual(self.ids("/campaigns/search", "chemistry"), [self.chemistry.id])
+
+    def test_students_searched_by_name_and_university(self):
+        self.assertEqual(self.ids("/students/search", "turing"), [self.lab.student_id])
+        self.assertEqual(self.ids("/students/search", "kings"), [self.chemistry.student_id])
+
+    def test_pages_follow_rank_order(self):
+        response = self.client.get("/campaigns/search", {"q": "robotics", "limit": 1})
+        self.assertEqual([row["id"] for row in response.json()], [self.robotics.id])
+        cursor = response["X-Next-Cursor"]
+        self.assertEqual(self.ids("/campaigns/search", "robotics", limit=1, cursor=cursor), [self.lab.id])
+
+    def test_missing_or_blank_query(self):
+        for path in ("/campaigns/search", "/students/search"):
+            for params in ({}, {"q": ""}, {"q": "   "}):
+                with self.subTest(path=path, params=params):
+                    response = self.client.get(path, params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {"error": "Missing 'q' query parameter"})
+
+    def test_query_of_stop_words_only_matches_nothing(self):
+        if not _has_extension("pg_trgm"):
+            self.skipTest("pg_trgm is not installed")
+        self.assertEqual(self.ids("/campaigns/search", "the"), [])
+
+    def test_typo_falls_back_to_trigram_similarity(self):
+        if not _has_extension("pg_trgm"):
+            self.skipTest("pg_trgm is not installed")
+        self.assertEqual(self.ids("/campaigns/search", "robotcs"), [self.robotics.id])
+        self.assertEqual(self.ids("/students/search", "Rosalind Frankln"), [self.chemistry.student_id])
+
+    def assertUsesIndex(self, queryset, index):
+        with connection.cursor() as cursor:
+            # the test tables are tiny, so a walk of the whole primary key
+            # looks cheapest; GIN is only read through bitmap scans. With
+            # one-row estimates a nested loop may also start from the other
+            # table and filter the few rows it joins instead.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_indexscan = off")
+            cursor.execute("SET LOCAL enable_nestloop = off")
+        plan = queryset.explain()
+        self.assertIn(f"Bitmap Index Scan on {index}", plan)
+        self.assertNotIn("SubPlan", plan)
+
+    def test_full_text_match_uses_gin_index(self):
+        self.assertUsesIndex(search.search_campaigns("robotics"), "app_campaign_search_idx")
+        self.assertUsesIndex(search.search_students("turing"), "app_student_search_idx")
+
+
+def _shared_caches(directory):
+    # the file backend is seen by every process on the host
+    return {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "catalog": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": directory},
+    }
+
+
+class CatalogCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+
+    def counting_build(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return len(builds)
+        return build, builds
+
+    def test_process_local_backend_caches_until_version_bump(self):
+        cache = ResponseCache()
+        build, builds = self.counting_build()
+        self.assertFalse(cache.shared)
+        self.assertTrue(cache.enabled)
+        self.assertEqual(cache.get_or_build("get_campaigns", QueryDict("sort=newest"), build), 1)
+        self.assertEqual(cache.get_or_build("get_campaigns", QueryDict("sort=newest"), build), 1)
+        ResponseCache().bump_version()
+        self.assertEqual(cache.get_or_build("get_campaigns", QueryDict("sort=newest"), build), 2)
+        self.assertEqual(cache.stats()["rebuilds"], 2)
+
+    def test_process_local_entries_expire_after_ttl(self):
+        # all that bounds staleness when another process changed the catalog
+        cache = ResponseCache(ttl=0)
+        build, builds = self.counting_build()
+        cache.get_or_build("get_campaigns", QueryDict(), build)
+        self.assertEqual(cache.get_or_build("get_campaigns", QueryDict(), build), 2)
+
+    @override_settings(CATALOG_CACHE_PROCESS_LOCAL=False)
+    def test_process_local_caching_can_be_disabled(self):
+        cache = ResponseCache()
+        build, builds = self.counting_build()
+        self.assertFalse(cache.enabled)
+        cache.get_or_build("get_campaigns", QueryDict("sort=newest"), build)
+        cache.get_or_build("get_campaigns", QueryDict("sort=newest"), build)
+        self.assertEqual(len(builds), 2)
+        self.assertEqual(cache.stats()["rebuilds"], 2)
+
+    def test_dummy_backend_is_not_used(self):
+        dummy = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        with self.settings(CACHES={**settings.CACHES, "catalog": dummy}):
+            self.assertFalse(ResponseCache().enabled)
+
+    def test_shared_backend_caches_until_version_bump(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(CACHES=_shared_caches(directory)):
+            cache = ResponseCache()
+            build, builds = self.counting_build()
+            self.assertTrue(cache.shared)
+            self.assertEqual(cache.get_or_build("get_campaigns", QueryDict("a=1&b=2"), build), 1)
+            self.assertEqual(cache.get_or_build("get_campaigns", QueryDict("b=2&a=1"), build), 1)
+            # another process bumping the version is seen here
+            ResponseCache().bump_version()
+            self.assertEqual(cache.get_or_build("get_campaigns", QueryDict("a=1&b=2"), build), 2)
+
+    def async_twice(self, cache):
+        calls = []
+
+        async def abuild():
+            calls.append(1)
+            return len(calls)
+
+        async def twice():
+            await cache.aget_or_build("get_campaigns", QueryDict(), abuild)
+            return await cache.aget_or_build("get_campaigns", QueryDict(), abuild)
+
+        return asyncio.run(twice())
+
+    def test_async_process_local_backend_caches(self):
+        self.assertEqual(self.async_twice(ResponseCache()), 1)
+
+    @override_settings(CATALOG_CACHE_PROCESS_LOCAL=False)
+    def test_async_process_local_caching_can_be_disabled(self):
+        self.assertEqual(self.async_twice(ResponseCache()), 2)
+
+    @override_settings(DEBUG=False)
+    def test_check_warns_about_process_local_backend(self):
+        [warning] = catalog_cache_check(None)
+        self.assertEqual(warning.id, "app.W001")
+        self.assertIn("CATALOG_CACHE_TTL_SECONDS", warning.msg)
+        with self.settings(CATALOG_CACHE_PROCESS_LOCAL=False):
+            [warning] = catalog_cache_check(None)
+            self.assertIn("not cached", warning.msg)
+        with tempfile.TemporaryDirectory() as directory, self.settings(CACHES=_shared_caches(directory)):
+            self.assertEqual(catalog_cache_check(None), [])
+
+
+class DetailCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+
+    def test_process_local_backend_caches_until_invalidated(self):
+        cache = DetailCache()
+        self.assertFalse(cache.shared)
+        self.assertEqual(cache.get_or_build("campaign", 1, lambda: "old"), "old")
+        self.assertEqual(cache.get_or_build("campaign", 1, lambda: "new"), "old")
+        self.assertEqual(cache.get_many("campaign", [1, 2], lambda pks: {pk: "new" for pk in pks}), {
+            1: "old", 2: "new",
+        })
+        cache.invalidate_campaign(1, 7)
+        self.assertEqual(cache.get_or_build("campaign", 1, lambda: "new"), "new")
+        self.assertEqual(cache.builds, 3)
+
+    @override_settings(CATALOG_CACHE_PROCESS_LOCAL=False)
+    def test_process_local_caching_can_be_disabled(self):
+        cache = DetailCache()
+        cache.get_or_build("campaign", 1, lambda: {"id": 1})
+        cache.get_or_build("campaign", 1, lambda: {"id": 1})
+        self.assertEqual(cache.get_many("campaign", [1, 2], lambda pks: {pk: {"id": pk} for pk in pks}), {
+            1: {"id": 1}, 2: {"id": 2},
+        })
+        self.assertEqual(cache.builds, 4)
+
+    def test_invalidation_by_another_process_is_seen(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(CACHES=_shared_caches(directory)):
+            cache, other_process = DetailCache(), DetailCache()
+            self.assertEqual(cache.get_or_build("campaign", 1, lambda: "old"), "old")
+            self.assertEqual(cache.get_or_build("campaign", 1, lambda: "new"), "old")
+            other_process.invalidate_campaign(1, 7)
+            self.assertEqual(cache.get_or_build("campaign", 1, lambda: "new"), "new")
+            self.assertEqual(cache.builds, 2)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        self.students = [_student(i) for i in range(2)]
+
+    def test_list_revalidates(self):
+        etag = self.client.get("/campaigns")["ETag"]
+        self.assertEqual(self.client.get("/campaigns", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_list_has_no_last_modified(self):
+        response = self.client.get("/campaigns")
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(
+            self.client.get("/campaigns", HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT").status_code, 200
+        )
+
+    def test_deleting_the_newest_row_changes_the_list_etag(self):
+        etag = self.client.get("/campaigns")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Campaign.objects.get(student=self.students[-1]).delete()
+        response = self.client.get("/campaigns", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_etag_varies_with_accept(self):
+        as_json = self.client.get("/campaigns", HTTP_ACCEPT="application/json")
+        as_html = self.client.get("/campaigns", HTTP_ACCEPT="text/html")
+        self.assertNotEqual(as_json["ETag"], as_html["ETag"])
+        self.assertIn("Accept", as_json["Vary"])
+        revalidated = self.client.get("/campaigns", HTTP_ACCEPT="text/html", HTTP_IF_NONE_MATCH=as_json["ETag"])
+        self.assertEqual(revalidated.status_code, 200)
+        not_modified = self.client.get("/campaigns", HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=as_json["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn("Accept", not_modified["Vary"])
+
+    def test_detail_keeps_last_modified(self):
+        self.assertIn("Last-Modified", self.client.get(f"/campaigns/{self.students[0].campaign.id}"))
+
+
+class DonationExportTests(TestCase):
+    def setUp(self):
+        campaign = _student(0).campaign
+        self.donations = [
+            Donation.objects.create(campaign=campaign, amount=10 + i, provider="stripe", provider_ref=f"pi_{i}")
+            for i in range(5)
+        ]
+
+    def test_every_donation_in_created_order_across_batches(self):
+        rows = list(exports.rows("donations", batch_size=2))
+        self.assertEqual([row[0] for row in rows], [d.id for d in self.donations])
+        self.assertEqual(rows[0][2], "Campaign 0")
+
+    def test_since_bounds_created_at(self):
+        since = self.donations[3].created_at
+        self.assertEqual([row[0] for row in exports.rows("donations", since=since)], [d.id for d in self.donations[3:]])
+
+    def test_csv(self):
+        lines = b"".join(exports.export("donations", "csv")).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "campaign_id", "campaign_title"])
+        self.assertEqual(len(lines), 6)
+
+
+def _async_urlconf():
+    """backend/urls.py as imported with ASYNC_VIEWS on, as a separate module
+    so the default URLconf is left alone."""
+    spec = importlib.util.find_spec("backend.urls")
+    module = importlib.util.module_from_spec(spec)
+    with override_settings(ASYNC_VIEWS=True):
+        spec.loader.exec_module(module)
+    return module
+
+
+@override_settings(
+    SUPABASE_JWT_SECRETS=["current-secret"],
+    SUPABASE_JWKS_URL="",
+    SUPABASE_JWT_AUDIENCE="authenticated",
+    SUPABASE_JWT_ISSUER=ISSUER,
+    # every response below is built, not served from the other view's entry
+    CATALOG_CACHE_PROCESS_LOCAL=False,
+)
+class AsyncViewTests(TestCase):
+    """The async views, served through the ASGI handler, answer exactly as
+    the sync views they replace."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.async_urls = _async_urlconf()
+
+    def setUp(self):
+        identity.identity_cache.clear()
+        self.addCleanup(identity.identity_cache.clear)
+        self.students = [_student(i) for i in range(3)]
+        self.campaign = Campaign.objects.get(student=self.students[0])
+
+    def test_async_views_are_routed(self):
+        for path, view in [
+            ("/auth/profile", async_views.get_my_profile),
+            ("/donor/profile", async_views.get_donor_profile),
+            ("/students/discover", async_views.discover_students),
+            ("/campaigns", async_views.get_campaigns),
+            (f"/campaigns/{self.campaign.id}", async_views.get_campaign_detail),
+        ]:
+            with self.subTest(path=path):
+                self.assertIs(resolve(path, urlconf=self.async_urls).func, view)
+                self.assertIsNot(resolve(path).func, view)
+
+    async def aget(self, path, headers):
+        with self.settings(ROOT_URLCONF=self.async_urls):
+            response = await self.async_client.get(path, headers=headers)
+            # resolver_match is lazy: read it while the override is on
+            self.assertTrue(iscoroutinefunction(response.resolver_match.func), path)
+        if response.streaming:
+            return response, b"".join([chunk async for chunk in response.streaming_content])
+        return response, response.content
+
+    def assertSameResponse(self, path, **headers):
+        sync = self.client.get(path, headers=headers)
+        sync_body = b"".join(sync.streaming_content) if sync.streaming else sync.content
+        response, body = async_to_sync(self.aget)(path, headers)
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(json.loads(body or "null"), json.loads(sync_body or "null"))
+        for header in ("Content-Type", "ETag", "X-Next-Cursor", "Link"):
+            self.assertEqual(response.get(header), sync.get(header), header)
+        return response
+
+    def test_catalog_matches_sync_views(self):
+        for path in [
+            "/campaigns",
+            "/campaigns?limit=2",
+            "/campaigns?sort=goal_desc&fields=id,title",
+            "/campaigns?stream=1",
+            "/campaigns?sort=nope",
+            "/students/discover",
+            "/students/discover?limit=1",
+            "/students/discover?stream=1",
+            "/students/discover?fields=nope",
+            f"/campaigns/{self.campaign.id}",
+            "/campaigns/999999",
+        ]:
+            with self.subTest(path=path):
+                response = self.assertSameResponse(path)
+                self.assertIn(response.status_code, (200, 400, 404))
+
+    def test_next_page_matches(self):
+        cursor = self.assertSameResponse("/campaigns?limit=2")["X-Next-Cursor"]
+        self.assertSameResponse(f"/campaigns?limit=2&cursor={cursor}")
+
+    def test_not_modified_matches(self):
+        etag = self.client.get("/campaigns")["ETag"]
+        self.assertEqual(self.assertSameResponse("/campaigns", if_none_match=etag).status_code, 304)
+
+    def token(self, role):
+        claims = _claims(email=f"{role}@example.edu", user_metadata={"role": role, "first_name": "Ada"})
+        return f"Bearer {jwt.encode(claims, 'current-secret', algorithm='HS256')}"
+
+    def test_profiles_match_sync_views(self):
+        student, donor = self.token("student"), self.token("donor")
+        # the first requests create the users (and the student's profile);
+        # compare once both sides see them
+        self.client.get("/auth/profile", headers={"authorization": student})
+        self.client.get("/donor/profile", headers={"authorization": donor})
+        DonorProfile.objects.create(
+            user=EduUser.objects.get(email="donor@example.edu"), full_name="Ada", email="donor@example.edu"
+        )
+        for path, authorization, status in [
+            ("/auth/profile", student, 200),
+            ("/donor/profile", donor, 200),
+            ("/donor/profile", student, 403),
+            ("/auth/profile", None, 401),
+        ]:
+            with self.subTest(path=path, status=status):
+                headers = {"authorization": authorization} if authorization else {}
+                self.assertEqual(self.assertSameResponse(path, **headers).status_code, status)
+
+
+class RankingVelocityTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        stale, trending, new = [_student(i).campaign for i in range(3)]
+        self.stale, self.trending, self.new = stale, trending, new
+        # alike in everything but when their money came in
+        Campaign.objects.filter(id__in=[stale.id, trending.id]).update(
+            current_amount=600, created_at=self.now - timedelta(days=60), deadline=self.now + timedelta(days=30),
+        )
+        Campaign.objects.filter(id=new.id).update(created_at=self.now - timedelta(hours=6))
+        self.donate(stale, 500, days_ago=50)
+        self.donate(stale, 100, days_ago=8)
+        self.donate(trending, 100, days_ago=50)
+        self.donate(trending, 500, days_ago=2)
+
+    def donate(self, campaign, amount, days_ago):
+        donation = Donation.objects.create(campaign=campaign, amount=amount)
+        Donation.objects.filter(id=donation.id).update(created_at=self.now - timedelta(days=days_ago))
+
+    def scores(self, now):
+        ranking.rank_campaigns(now=now)
+        return dict(CampaignRank.objects.values_list("campaign_id", "score"))
+
+    def velocity(self, rate):
+        return ranking.WEIGHTS["velocity"] * rate / (rate + ranking.VELOCITY_SCALE)
+
+    def test_recent_donations_outrank_old_ones(self):
+        scores = self.scores(self.now)
+        self.assertGreater(scores[self.trending.id], scores[self.stale.id])
+        # the gap is the velocity component alone: 500 over the last 7 days
+        # against nothing
+        self.assertAlmostEqual(scores[self.trending.id] - scores[self.stale.id], self.velocity(500 / 7), places=6)
+
+    def test_window_moves_with_now(self):
+        # a week earlier, the stale campaign's 100 was the recent money
+        scores = self.scores(self.now - timedelta(days=7))
+        self.assertGreater(scores[self.stale.id], scores[self.trending.id])
+
+    def test_new_campaign_rate_is_per_day_at_least(self):
+        before = self.scores(self.now)[self.new.id]
+        self.donate(self.new, 70, days_ago=0.1)
+        # six hours old: 70 counts as 70 a day, not 280
+        self.assertAlmostEqual(self.scores(self.now)[self.new.id] - before, self.velocity(70), places=6)
+
+    def test_donations_after_now_are_ignored(self):
+        before = self.scores(self.now - timedelta(days=3))
+        self.donate(self.stale, 1000, days_ago=1)
+        self.assertEqual(self.scores(self.now - timedelta(days=3)), before)
+
+
+class RecommendedFeedTests(TestCase):
+    def setUp(self):
+        caches["catalog"].clear()
+        self.students = [_student(i) for i in range(3)]
+        ranking.rank_campaigns()
+        # closed after the ranking run: still ranked until the next one
+        Campaign.objects.filter(student=self.students[0]).update(status="completed")
+
+    def test_stream_skips_closed_campaigns(self):
+        response = self.client.get("/students/discover", {"sort": "recommended", "stream": "1"})
+        ids = [student["id"] for student in json.loads(b"".join(response.streaming_content))]
+        self.assertEqual(sorted(ids), sorted(s.id for s in self.students[1:]))
+
+    async def test_async_stream_skips_closed_campaigns(self):
+        request = AsyncRequestFactory().get("/students/discover", {"sort": "recommended", "stream": "1"})
+        response = await async_views.discover_students(request)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(sorted(s["id"] for s in json.loads(body)), sorted(s.id for s in self.students[1:]))
+
+    def test_ranking_requires_postgresql(self):
+        with mock.patch.object(ranking, "available", return_value=False):
+            with self.assertRaises(ImproperlyConfigured):
+                ranking.rank_campaigns()
+            with self.assertRaisesMessage(CommandError, "campaign ranking requires PostgreSQL"):
+                call_command("rank_campaigns")
+
+    def test_feeds_fall_back_without_ranking(self):
+        with mock.patch.object(ranking, "available", return_value=False):
+            students = self.client.get("/students/discover", {"sort": "recommended"}).json()
+            campaigns = self.client.get("/campaigns/recommended").json()
+        self.assertEqual([s["full_name"] for s in students], ["Student 0", "Student 1", "Student 2"])
+        # newest first, active only
+        self.assertEqual([c["title"] for c in campaigns], ["Campaign 2", "Campaign 1"])
+
+
+def _donor(i):
+    user = EduUser.objects.create(username=f"donor{i}", email=f"donor{i}@example.com", is_donor=True)
+    return DonorProfile.objects.create(user=user, full_name=f"Donor {i}", email=user.email)
+
+
+class DonorTierTests(TestCase):
+    def setUp(self):
+        self.bronze = DonorTier.objects.create(name="bronze", min_donation=10)
+        self.silver = DonorTier.objects.create(name="silver", min_donation=100)
+        self.gold = DonorTier.objects.create(name="gold", min_donation=1000)
+        # the table lives in worker memory, past this test's rollback
+        tier_table.invalidate()
+        self.addCleanup(tier_table.invalidate)
+
+    def test_thresholds(self):
+        for total, tier in [
+            ("0", None), ("9.99", None), ("10", self.bronze), ("99.99", self.bronze), ("100", self.silver),
+            ("999.99", self.silver), ("1000", self.gold), ("99999999.99", self.gold),
+        ]:
+            with self.subTest(total=total):
+                self.assertEqual(tier_table.tier_for(Decimal(total)), tier and tier.id)
+
+    def test_table_is_read_once(self):
+        tier_table.tier_for(Decimal("1"))
+        with self.assertNumQueries(0):
+            for total in range(0, 2000, 7):
+                tier_table.tier_for(Decimal(total))
+
+    def test_donations_move_donor_across_thresholds(self):
+        campaign, donor = _student(0).campaign, _donor(0)
+        for n, (amount, tier) in enumerate([("9.99", None), ("0.01", self.bronze), ("90", self.silver), ("900", self.gold)]):
+            payments.record_donation(campaign.id, amount, donor.id, "stripe", f"pi_{n}")
+            donor.refresh_from_db()
+            self.assertEqual(donor.tier_id, tier and tier.id, amount)
+
+    def test_saving_a_tier_queues_one_recompute(self):
+        donor = _donor(0)
+        DonorProfile.objects.filter(id=donor.id).update(total_donations=60, tier=self.bronze)
+        Job.objects.all().delete()
+        self.silver.min_donation = 50
+        with self.captureOnCommitCallbacks(execute=True):
+            self.silver.save()
+            self.gold.save()
+        self.assertEqual(list(Job.objects.values_list("name", "key")), [("tiers.recompute", "tiers.recompute")])
+        # this worker reloaded at commit
+        self.assertEqual(tier_table.tier_for(Decimal("60")), self.silver.id)
+        call_command("run_workers", "--burst")
+        donor.refresh_from_db()
+        self.assertEqual(donor.tier_id, self.silver.id)
+
+    def test_recompute_in_chunks_writes_only_changes(self):
+        donors = [_donor(i) for i in range(5)]
+        totals = ["0", "10", "150", "1000", "5"]
+        for donor, total in zip(donors, totals):
+            DonorProfile.objects.filter(id=donor.id).update(total_donations=total, tier=self.bronze)
+        changed, _ = recompute_tiers(chunk_size=2)
+        self.assertEqual(changed, 4)
+        self.assertEqual(
+            [DonorProfile.objects.get(id=d.id).tier_id for d in donors],
+            [None, self.bronze.id, self.silver.id, self.gold.id, None],
+        )
+        stamped = list(DonorProfile.objects.order_by("id").values_list("updated_at", flat=True))
+        self.assertEqual(recompute_tiers(chunk_size=2)[0], 0)
+        self.assertEqual(list(DonorProfile.objects.order_by("id").values_list("updated_at", flat=True)), stamped)
+
+    def test_recompute_without_tiers_clears_them(self):
+        donor = _donor(0)
+        DonorProfile.objects.filter(id=donor.id).update(total_donations=500, tier=self.silver)
+        DonorTier.objects.all().delete()
+        self.assertEqual(recompute_tiers()[0], 0)  # on_delete=SET_NULL already cleared it
+        self.assertIsNone(tier_table.tier_for(Decimal("500")))
+
+
+class RecordDonationTests(TestCase):
+    def setUp(self):
+        self.campaign = _student(0).campaign
+
+    def test_unknown_donor(self):
+        with self.assertRaisesMessage(payments.PaymentError, "Donor 999999 not found"):
+            payments.record_donation(self.campaign.id, "10", donor_id=999999, provider="stripe", provider_ref="pi_1")
+        self.assertFalse(Donation.objects.exists())
+
+    def test_unknown_campaign(self):
+        with self.assertRaises(payments.PaymentError):
+            payments.record_donation(999999, "10")
+        self.assertFalse(Donation.objects.exists())
+
+    def test_payment_counted_once(self):
+        donor = _donor(0)
+        first, created = payments.record_donation(self.campaign.id, "10", donor.id, "stripe", "pi_1")
+        again, created_again = payments.record_donation(self.campaign.id, "10", donor.id, "stripe", "pi_1")
+        self.assertEqual((first.id, created, created_again), (again.id, True, False))
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.current_amount, self.campaign.donors_count), (Decimal("10.00"), 1))
+
+
+class ReconcileTests(TestCase):
+    def setUp(self):
+        self.campaign = _student(0).campaign
+        self.other = _student(1).campaign
+        self.donors = [_donor(i) for i in range(3)]
+        for n, (campaign, donor, amount) in enumerate([
+            (self.campaign, self.donors[0], "10"), (self.campaign, self.donors[0], "5"),
+            (self.campaign, self.donors[1], "20"), (self.campaign, None, "2.50"),
+            (self.other, self.donors[2], "7"),
+        ]):
+            payments.record_donation(campaign.id, amount, donor and donor.id, "stripe", f"pi_{n}")
+
+    def state(self):
+        return (
+            list(Campaign.objects.order_by("id").values_list("id", "current_amount", "donors_count", "updated_at")),
+            sorted(CampaignDonor.objects.values_list("campaign_id", "donor_id")),
+        )
+
+    def test_consistent_ledger_left_unchanged(self):
+        before = self.state()
+        self.assertEqual(payments.reconcile_donors_count(), [])
+        self.assertEqual(payments.reconcile_current_amount(), [])
+        self.assertEqual(payments.reconcile_donors_count(fix=True), [])
+        self.assertEqual(payments.reconcile_current_amount(fix=True), [])
+        self.assertEqual(self.state(), before)
+
+    def test_drifted_donors_count_detected_and_fixed(self):
+        Campaign.objects.filter(id=self.campaign.id).update(donors_count=5)
+        # a lost supporter row: the next donation from this donor would count them again
+        CampaignDonor.objects.filter(campaign=self.other).delete()
+        Campaign.objects.filter(id=self.other.id).update(donors_count=0)
+
+        drift = [(self.campaign.id, 5, 2), (self.other.id, 0, 1)]
+        self.assertEqual(payments.reconcile_donors_count(), drift)
+        self.assertEqual(Campaign.objects.get(id=self.campaign.id).donors_count, 5)  # report only
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(payments.reconcile_donors_count(fix=True), drift)
+        self.assertEqual(
+            list(Campaign.objects.order_by("id").values_list("donors_count", flat=True)), [2, 1]
+        )
+        self.assertEqual(CampaignDonor.objects.filter(campaign=self.other).count(), 1)
+        self.assertEqual(payments.reconcile_donors_count(), [])
+
+        payments.record_donation(self.other.id, "1", self.donors[2].id, "stripe", "pi_again")
+        self.assertEqual(Campaign.objects.get(id=self.other.id).donors_count, 1)
+
+    def test_drifted_current_amount_detected_and_fixed(self):
+        Campaign.objects.filter(id=self.campaign.id).update(current_amount=Decimal("30.00"))
+        drift = [(self.campaign.id, Decimal("30.00"), Decimal("37.50"))]
+        self.assertEqual(payments.reconcile_current_amount(), drift)
+        self.assertEqual(payments.reconcile_current_amount(fix=True), drift)
+        self.assertEqual(
+            list(Campaign.objects.order_by("id").values_list("current_amount", flat=True)),
+            [Decimal("37.50"), Decimal("7.00")],
+        )
+        self.assertEqual(payments.reconcile_current_amount(), [])
+
+    def test_command_reports_and_fixes(self):
+        Campaign.objects.filter(id=self.campaign.id).update(donors_count=9, current_amount=1)
+        out = io.StringIO()
+        with self.assertRaises(SystemExit) as exited:
+            call_command("reconcile_donors_count", stdout=out)
+        self.assertEqual(exited.exception.code, 1)
+        self.assertIn(f"campaign {self.campaign.id}: donors_count stored 9, actual 2", out.getvalue())
+        self.assertIn(f"campaign {self.campaign.id}: current_amount stored 1.00, actual 37.50", out.getvalue())
+
+        call_command("reconcile_donors_count", "--fix", "--counts-only", stdout=io.StringIO())
+        self.assertEqual(
+            Campaign.objects.filter(id=self.campaign.id).values_list("donors_count", "current_amount").get(),
+            (2, Decimal("1.00")),
+        )
+        call_command("reconcile_donors_count", "--fix", stdout=io.StringIO())
+        call_command("reconcile_donors_count", stdout=io.StringIO())  # no drift: exits 0
+
+
+class DailyRollupTests(TransactionTestCase):
+    # rebuild_rollups() sets its own isolation level, so it needs a real
+    # transaction, not a savepoint inside the test's
+
+    def setUp(self):
+        self.campaign = _student(0).campaign
+        self.other = _student(1).campaign
+        Campaign.objects.filter(id=self.other.id).update(category="tuition")
+        StudentProfile.objects.filter(id=self.other.student_id).update(university="Tech")
+
+    def donate(self, campaign, amount, at):
+        donation, _ = payments.record_donation(campaign.id, amount, provider="stripe", provider_ref=f"pi_{at.isoformat()}")
+        Donation.objects.filter(id=donation.id).update(created_at=at)
+        return donation
+
+    def rollups(self):
+        return (
+            sorted(CampaignDailyStats.objects.values_list("campaign_id", "day", "amount", "donations")),
+            sorted(CategoryDailyStats.objects.values_list("category", "day", "amount", "donations")),
+            sorted(UniversityDailyStats.objects.values_list("university", "day", "amount", "donations")),
+        )
+
+    def test_rollup_drains_pending_donations(self):
+        at = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+        self.donate(self.campaign, "10", at)
+        self.donate(self.campaign, "5", at + timedelta(minutes=1))
+        self.donate(self.other, "7", at + timedelta(minutes=2))
+        self.assertEqual(PendingRollup.objects.count(), 3)
+
+        self.assertEqual(analytics.rollup_pending(batch_size=2), 2)
+        self.assertEqual(PendingRollup.objects.count(), 1)
+        self.assertEqual(analytics.rollup_pending(batch_size=2), 1)
+        self.assertFalse(PendingRollup.objects.exists())
+
+        day = date(2026, 3, 1)
+        self.assertEqual(self.rollups(), (
+            [(self.campaign.id, day, Decimal("15.00"), 2), (self.other.id, day, Decimal("7.00"), 1)],
+            [("education", day, Decimal("15.00"), 2), ("tuition", day, Decimal("7.00"), 1)],
+            [("State", day, Decimal("15.00"), 2), ("Tech", day, Decimal("7.00"), 1)],
+        ))
+
+    def test_runs_are_idempotent(self):
+        at = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+        self.donate(self.campaign, "10", at)
+        self.donate(self.other, "7", at + timedelta(days=1))
+        analytics.rollup_pending()
+        incremental = self.rollups()
+        # nothing is pending any more: a second run adds nothing
+        self.assertEqual(analytics.rollup_pending(), 0)
+        self.assertEqual(self.rollups(), incremental)
+        # a rebuild recomputes the same sums, however often it runs
+        for _ in range(2):
+            self.assertEqual(analytics.rebuild_rollups()[0], 2)
+            self.assertEqual(self.rollups(), incremental)
+        self.assertEqual(analytics.rebuild_rollups(since=date(2026, 3, 2))[0], 1)
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_days_are_utc(self):
+        plus_two = dt_timezone(timedelta(hours=2))
+        for amount, at in [
+            ("1", datetime(2026, 3, 1, 23, 59, 59, 999999, tzinfo=dt_timezone.utc)),
+            ("2", datetime(2026, 3, 2, 0, 0, tzinfo=dt_timezone.utc)),
+            # 01:00 on the 2nd at +02:00 is still the 1st in UTC
+            ("4", datetime(2026, 3, 2, 1, 0, tzinfo=plus_two)),
+        ]:
+            self.donate(self.campaign, amount, at)
+        analytics.rollup_pending()
+        self.assertEqual(self.rollups()[0], [
+            (self.campaign.id, date(2026, 3, 1), Decimal("5.00"), 2),
+            (self.campaign.id, date(2026, 3, 2), Decimal("2.00"), 1),
+        ])
+
+    def test_recording_a_donation_queues_one_delayed_rollup(self):
+        self.donate(self.campaign, "1", timezone.now())
+        self.donate(self.campaign, "2", timezone.now() + timedelta(seconds=1))
+        job = Job.objects.get(name="analytics.rollup")
+        self.assertEqual(job.key, "analytics.rollup")
+        self.assertGreater(job.run_at, timezone.now())
+
+    def test_endpoints(self):
+        self.donate(self.campaign, "10", datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc))
+        self.donate(self.other, "30", datetime(2026, 3, 2, 12, tzinfo=dt_timezone.utc))
+        analytics.rollup_pending()
+        window = {"since": "2026-03-01", "until": "2026-03-03"}
+
+        days = self.client.get(f"/analytics/campaigns/{self.campaign.id}/daily", window).json()["days"]
+        self.assertEqual(days, [
+            {"day": "2026-03-01", "amount": "10.00", "donations": 1},
+            {"day": "2026-03-02", "amount": "0.00", "donations": 0},
+            {"day": "2026-03-03", "amount": "0.00", "donations": 0},
+        ])
+        categories = self.client.get("/analytics/categories/daily", {**window, "category": "tuition"}).json()
+        self.assertEqual(list(categories["categories"]), ["tuition"])
+        self.assertEqual(categories["categories"]["tuition"][1]["amount"], "30.00")
+        top = self.client.get("/analytics/universities/top", {**window, "limit": 1}).json()
+        self.assertEqual(top["universities"], [{"university": "Tech", "amount": "30.00", "donations": 1}])
+
+        default = self.client.get(f"/analytics/campaigns/{self.campaign.id}/daily").json()
+        self.assertEqual(len(default["days"]), 30)
+        self.assertEqual(default["days"][-1]["day"], timezone.now().date().isoformat())
+
+    def test_endpoint_validation(self):
+        campaign_path = f"/analytics/campaigns/{self.campaign.id}/daily"
+        for path, params, error in [
+            ("/analytics/universities/top", {"limit": "0"}, "'limit' must be between 1 and 100"),
+            ("/analytics/universities/top", {"limit": "101"}, "'limit' must be between 1 and 100"),
+            ("/analytics/universities/top", {"limit": "ten"}, "Invalid 'limit'"),
+            (campaign_path, {"since": "yesterday"}, "'since' and 'until' must be dates (YYYY-MM-DD)"),
+            (campaign_path, {"until": "2026-02-30"}, "'since' and 'until' must be dates (YYYY-MM-DD)"),
+            (campaign_path, {"since": "2026-03-02", "until": "2026-03-01"}, "'since' must not be after 'until'"),
+            (campaign_path, {"since": "2025-01-01", "until": "2026-01-02"}, "At most 366 days at a time"),
+            ("/analytics/categories/daily", {"category": "travel"}, "Unknown category 'travel'"),
+        ]:
+            with self.subTest(path=path, params=params):
+                response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": error})
+        self.assertEqual(self.client.get("/analytics/campaigns/999999/daily").status_code, 404)
+        # a leap year's 366 days are allowed
+        self.assertEqual(self.client.get(campaign_path, {"since": "2024-01-01", "until": "2024-12-31"}).status_code, 200)
+
+
+class ConcurrentDonationTests(TransactionTestCase):
+    threads = 8
+    donations_per_thread = 5
+
+    def test_totals_exact_under_contention(self):
+        campaign = _student(0).campaign
+        # two threads per donor, so first donations to the campaign race too
+        donors = [_donor(i) for i in range(self.threads // 2)]
+
+        def donate(i):
+            donor = donors[i % len(donors)]
+            for n in range(self.donations_per_thread):
+                payments.record_donation(campaign.id, "1.25", donor.id, "stripe", f"pi_{i}_{n}")
+
+        errors = [e for e in _in_threads(self.threads, donate) if e is not None]
+        self.assertEqual(errors, [])
+
+        campaign.refresh_from_db()
+        donations = self.threads * self.donations_per_thread
+        self.assertEqual(campaign.current_amount, Decimal("1.25") * donations)
+        self.assertEqual(campaign.donors_count, len(donors))
+        self.assertEqual(CampaignDonor.objects.filter(campaign=campaign).count(), len(donors))
+        self.assertEqual(Donation.objects.count(), donations)
+        per_donor = Decimal("1.25") * self.donations_per_thread * 2
+        self.assertEqual(
+            list(DonorProfile.objects.values_list("total_donations", flat=True).distinct()), [per_donor]
+        )
+
+
+# handlers for the job queue tests; ``calls`` records what ran
+calls = []
+
+
+@jobs.task("tests.record")
+def _record_job(**args):
+    calls.append(args)
+
+
+@jobs.task("tests.fail")
+def _failing_job(**args):
+    raise RuntimeError("boom")
+
+
+def _job(name="tests.record", key="", priority=0, ago=0, **fields):
+    return Job.objects.create(
+        name=name, key=key, priority=priority, max_attempts=fields.pop("max_attempts", 3),
+        run_at=timezone.now() - timedelta(seconds=ago), **fields,
+    )
+
+
+@override_settings(JOB_RETRY_BASE_SECONDS=10, JOB_RETRY_MAX_SECONDS=60, JOB_TIMEOUT_SECONDS=600)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_keyed_enqueue_coalesces_while_queued(self):
+        self.assertTrue(jobs.enqueue("tests.record", key="k", n=1))
+        self.assertFalse(jobs.enqueue("tests.record", key="k", n=2))
+        self.assertEqual(list(Job.objects.values_list("args", flat=True)), [{"n": 1}])
+        # a running job does not count: work arriving meanwhile is queued
+        jobs.claim()
+        self.assertTrue(jobs.enqueue("tests.record", key="k", n=3))
+
+    def test_unknown_task(self):
+        with self.assertRaises(jobs.UnknownTask):
+            jobs.enqueue("tests.nope")
+
+    def test_claim_order_and_due_time(self):
+        low = _job(priority=0, ago=20)
+        high = _job(priority=5, ago=10)
+        older = _job(priority=5, ago=30)
+        _job(ago=-60)  # not due yet
+        self.assertEqual([job.id for job in jobs.claim(10)], [older.id, high.id, low.id])
+        self.assertEqual(jobs.claim(10), [])
+        self.assertEqual(Job.objects.get(id=low.id).attempts, 1)
+
+    def test_run_marks_done(self):
+        job = _job(args={"n": 1})
+        self.assertTrue(jobs.run(jobs.claim()[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, calls), (Job.DONE, [{"n": 1}]))
+
+    def test_failed_attempt_retried_with_backoff(self):
+        job = _job(name="tests.fail")
+        for attempt, base in [(1, 10), (2, 20)]:
+            with self.assertLogs("app.jobs", "ERROR"):
+                self.assertFalse(jobs.run(jobs.claim()[0]))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.QUEUED, attempt))
+            self.assertIn("RuntimeError: boom", job.last_error)
+            # exponential, with +-25% jitter
+            delay = (job.run_at - timezone.now()).total_seconds()
+            self.assertTrue(base * 0.75 - 1 < delay <= base * 1.25, delay)
+            Job.objects.filter(id=job.id).update(run_at=timezone.now())
+
+    def test_dead_lettered_after_max_attempts(self):
+        job = _job(name="tests.fail", key="k", max_attempts=2, args={"n": 1})
+        for _ in range(2):
+            with self.assertLogs("app.jobs", "ERROR"):
+                jobs.run(jobs.claim()[0])
+            Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual((dead.name, dead.key, dead.args, dead.attempts), ("tests.fail", "k", {"n": 1}, 2))
+        self.assertIn("RuntimeError: boom", dead.error)
+
+    def test_retry_dropped_when_its_key_was_queued_meanwhile(self):
+        job = _job(name="tests.fail", key="k")
+        claimed = jobs.claim()[0]
+        jobs.enqueue("tests.record", key="k")
+        with self.assertLogs("app.jobs", "ERROR"):
+            jobs.run(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+    def test_recover_stalled(self):
+        stalled = _job(key="a", status=Job.RUNNING, attempts=1, started_at=timezone.now() - timedelta(seconds=601))
+        last_try = _job(key="b", status=Job.RUNNING, attempts=3, started_at=timezone.now() - timedelta(seconds=601))
+        busy = _job(status=Job.RUNNING, attempts=1, started_at=timezone.now() - timedelta(seconds=60))
+        self.assertEqual(jobs.recover_stalled(), 2)
+        stalled.refresh_from_db()
+        self.assertEqual(stalled.status, Job.QUEUED)
+        self.assertIn("Timed out after 600s", stalled.last_error)
+        self.assertEqual(DeadJob.objects.get().key, last_try.key)
+        self.assertEqual(Job.objects.get(id=busy.id).status, Job.RUNNING)
+
+    def test_requeue_dead_keeps_key(self):
+        DeadJob.objects.create(name="tests.record", key="k", priority=3, args={"n": 1}, attempts=5, created_at=timezone.now())
+        self.assertEqual(jobs.requeue_dead(), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.key, job.priority, job.args, job.attempts), ("k", 3, {"n": 1}, 0))
+        self.assertFalse(DeadJob.objects.exists())
+        # the requeued job coalesces with later enqueues, as before it died
+        self.assertFalse(jobs.enqueue("tests.record", key="k"))
+
+    def test_requeue_dead_coalesces_with_queued_key(self):
+        queued = _job(key="k")
+        for _ in range(2):
+            DeadJob.objects.create(name="tests.record", key="k", attempts=5, created_at=timezone.now())
+        DeadJob.objects.create(name="tests.record", attempts=5, created_at=timezone.now())
+        self.assertEqual(jobs.requeue_dead(), 1)
+        self.assertEqual(Job.objects.filter(key="k").get().id, queued.id)
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertFalse(DeadJob.objects.exists())
+
+    def test_run_workers_burst(self):
+        _job(args={"n": 1})
+        _job(args={"n": 2}, priority=1)
+        _job(args={"n": 3}, ago=-60)
+        call_command("run_workers", "--burst", "--batch-size", "2")
+        self.assertEqual(calls, [{"n": 2}, {"n": 1}])
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+
+class JobClaimConcurrencyTests(TransactionTestCase):
+    def test_claim_skips_rows_locked_by_another_worker(self):
+        locked, second = _job(ago=20), _job(ago=10)
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(id=locked.id)
+                    holding.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        holding.wait(5)
+        started = time.monotonic()
+        claimed = jobs.claim(2)
+        waited = time.monotonic() - started
+        release.set()
+        holder.join()
+        self.assertEqual([job.id for job in claimed], [second.id])
+        self.assertLess(waited, 1)
+
+    def test_each_job_claimed_once(self):
+        ids = {_job().id for _ in range(40)}
+
+        def drain(i):
+            claimed = []
+            while batch := jobs.claim(3):
+                claimed += [job.id for job in batch]
+            return claimed
+
+        claimed = [job_id for batch in _in_threads(4, drain) for job_id in batch]
+        self.assertEqual(sorted(claimed), sorted(ids))
+
+
+class SSEClient:
+    """Drives one request through the ASGI application, as a server would."""
+
+    def __init__(self, path, method="GET", headers=()):
+        from backend.asgi import application
+
+        scope = {"type": "http", "method": method, "path": path, "query_string": b"", "headers": list(headers)}
+        self.requests = asyncio.Queue()
+        self.messages = asyncio.Queue()
+        self.task = asyncio.ensure_future(application(scope, self.requests.get, self.messages.put))
+
+    async def start(self):
+        """``(status, headers)`` of the response."""
+        message = await asyncio.wait_for(self.messages.get(), 5)
+        return message["status"], dict(message["headers"])
+
+    async def body(self):
+        return (await asyncio.wait_for(self.messages.get(), 5))["body"]
+
+    async def event(self):
+        """The next event's data; skips the retry field and keepalives."""
+        while True:
+            body = await self.body()
+            lines = [line for line in body.decode().split("\n") if line.startswith("data: ")]
+            if lines:
+                return json.loads(lines[0][len("data: "):])
+
+    async def disconnect(self):
+        await self.requests.put({"type": "http.disconnect"})
+        await asyncio.wait_for(self.task, 5)
+
+
+class ProgressStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.campaign = _student(0).campaign
+        self.donor = _donor(0)
+        # LISTEN on the test database, which is where record_donation notifies
+        connection.ensure_connection()
+        conninfo = make_conninfo(connection.connection.info.dsn, password=connection.settings_dict["PASSWORD"] or None)
+        self.enterContext(override_settings(PROGRESS_STREAM_DATABASE_URL=conninfo))
+        self.enterContext(mock.patch.object(live.progress_hub, "coalesce", 0.3))
+        self.enterContext(mock.patch.object(live.progress_hub, "heartbeat", 0.2))
+
+    @staticmethod
+    async def donate(campaign_id, *payments_):
+        def record():
+            try:
+                for amount, donor_id, ref in payments_:
+                    payments.record_donation(campaign_id, amount, donor_id, "stripe", ref)
+            finally:
+                connections.close_all()
+        await asyncio.to_thread(record)
+
+    async def listening(self):
+        # the hub's LISTEN connection is opened by the first subscriber
+        for _ in range(250):
+            if live.progress_hub.stats()["listening"]:
+                return
+            await asyncio.sleep(0.02)
+        self.fail("progress hub never started listening")
+
+    def test_snapshot_then_donations(self):
+        async def scenario():
+            client = SSEClient(f"/campaigns/{self.campaign.id}/stream")
+            status, headers = await client.start()
+            first = await client.body()
+            await self.listening()
+            await self.donate(self.campaign.id, ("25", self.donor.id, "pi_1"))
+            update = await client.event()
+            await client.disconnect()
+            return status, headers, first, update
+
+        status, headers, first, update = asyncio.run(scenario())
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b"content-type"], b"text/event-stream")
+        self.assertEqual(headers[b"cache-control"], b"no-cache")
+        self.assertTrue(first.startswith(b"retry: 5000\nevent: progress\ndata: {"))
+        self.assertTrue(first.endswith(b"}\n\n"))
+        self.assertEqual(
+            json.loads(first.split(b"data: ", 1)[1]),
+            {"id": self.campaign.id, "current_amount": "0.00", "goal_amount": "1000.00",
+             "progress_percentage": 0.0, "donors_count": 0},
+        )
+        self.assertEqual(
+            update,
+            {"id": self.campaign.id, "current_amount": "25.00", "goal_amount": "1000.00",
+             "progress_percentage": 2.5, "donors_count": 1, "delta": "25.00"},
+        )
+
+    def test_burst_coalesced_into_one_event(self):
+        async def scenario():
+            client = SSEClient(f"/campaigns/{self.campaign.id}/stream")
+            await client.start()
+            await client.event()
+            await self.listening()
+            await self.donate(
+                self.campaign.id, ("10", self.donor.id, "pi_1"), ("5", self.donor.id, "pi_2"), ("1", None, "pi_3")
+            )
+            update = await client.event()
+            # nothing else is pending: the next write is a heartbeat
+            heartbeat = await client.body()
+            await client.disconnect()
+            return update, heartbeat
+
+        update, heartbeat = asyncio.run(scenario())
+        self.assertEqual((update["current_amount"], update["delta"]), ("16.00", "16.00"))
+        self.assertEqual(heartbeat, b": keepalive\n\n")
+
+    def test_rolled_back_donation_not_announced(self):
+        async def scenario():
+            client = SSEClient(f"/campaigns/{self.campaign.id}/stream")
+            await client.start()
+            await client.event()
+            await self.listening()
+            with self.assertRaises(payments.PaymentError):
+                await self.donate(self.campaign.id, ("10", 999999, "pi_1"))
+            # longer than the coalescing window: only heartbeats arrive
+            bodies = [await client.body() for _ in range(3)]
+            await client.disconnect()
+            return bodies
+
+        self.assertEqual(asyncio.run(scenario()), [b": keepalive\n\n"] * 3)
+
+    def test_disconnect_unsubscribes(self):
+        async def scenario():
+            clients = [SSEClient(f"/campaigns/{self.campaign.id}/stream") for _ in range(3)]
+            for client in clients:
+                await client.start()
+            open_streams = live.progress_hub.stats()
+            for client in clients:
+                await client.disconnect()
+            return open_streams, live.progress_hub.stats(), [client.task.exception() for client in clients]
+
+        open_streams, closed, errors = asyncio.run(scenario())
+        self.assertEqual((open_streams["subscribers"], open_streams["campaigns"]), (3, 1))
+        self.assertEqual((closed["subscribers"], closed["campaigns"]), (0, 0))
+        self.assertEqual(errors, [None, None, None])
+
+    def test_connection_cap(self):
+        async def scenario():
+            first = SSEClient(f"/campaigns/{self.campaign.id}/stream")
+            await first.start()
+            second = SSEClient(f"/campaigns/{self.campaign.id}/stream")
+            refused = await second.start(), json.loads(await second.body())
+            await first.disconnect()
+            return refused
+
+        with mock.patch.object(live.progress_hub, "max_subscribers", 1):
+            (status, headers), body = asyncio.run(scenario())
+        self.assertEqual((status, headers[b"retry-after"]), (503, b"30"))
+        self.assertEqual(body, {"error": "Too many open streams"})
+
+    def test_refusals(self):
+        Campaign.objects.filter(id=self.campaign.id).update(status="completed")
+
+        async def refusal(path, method="GET"):
+            client = SSEClient(path, method)
+            status, _ = await client.start()
+            body = json.loads(await client.body())
+            await asyncio.wait_for(client.task, 5)
+            return status, body
+
+        for path, method, expected in [
+            (f"/campaigns/{self.campaign.id}/stream", "GET", (410, {"error": "Campaign is not active"})),
+            ("/campaigns/999999/stream", "GET", (404, {"error": "Campaign not found"})),
+            (f"/campaigns/{self.campaign.id}/stream", "POST", (405, {"error": "Method not allowed"})),
+        ]:
+            with self.subTest(path=path, method=method):
+                self.assertEqual(asyncio.run(refusal(path, method)), expected)
+        self.assertEqual(live.progress_hub.subscribers, 0)
+
+
+STRIPE_SECRET = "whsec_current"
+
+
+def _stripe_headers(body, secret=STRIPE_SECRET, timestamp=None):
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    signature = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return {"Stripe-Signature": f"t={timestamp},v1={signature}"}
+
+
+def _stripe_event(event_id, intent_id, campaign_id, donor_id=None, cents=1000):
+    metadata = {"campaign_id": str(campaign_id)}
+    if donor_id is not None:
+        metadata["donor_id"] = str(donor_id)
+    return json.dumps({
+        "id": event_id,
+        "type": "payment_intent.succeeded",
+        "data": {"object": {"id": intent_id, "amount_received": cents, "currency": "usd", "metadata": metadata}},
+    }).encode()
+
+
+@override_settings(STRIPE_WEBHOOK_SECRETS=[STRIPE_SECRET, "whsec_previous"], STRIPE_WEBHOOK_TOLERANCE_SECONDS=300)
+class StripeSignatureTests(SimpleTestCase):
+    body = _stripe_event("evt_1", "pi_1", 1)
+
+    def test_valid(self):
+        self.assertEqual(payments.verify_webhook("stripe", self.body, _stripe_headers(self.body))["id"], "evt_1")
+
+    def test_previous_secret_still_accepted(self):
+        payments.verify_webhook("stripe", self.body, _stripe_headers(self.body, secret="whsec_previous"))
+
+    def test_tampered_body(self):
+        headers = _stripe_headers(self.body)
+        tampered = self.body.replace(b"1000", b"9000")
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "Invalid Stripe signature"):
+            payments.verify_webhook("stripe", tampered, headers)
+
+    def test_unknown_secret(self):
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "Invalid Stripe signature"):
+            payments.verify_webhook("stripe", self.body, _stripe_headers(self.body, secret="whsec_other"))
+
+    def test_stale_timestamp(self):
+        headers = _stripe_headers(self.body, timestamp=int(time.time()) - 301)
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "outside tolerance"):
+            payments.verify_webhook("stripe", self.body, headers)
+
+    def test_malformed_header(self):
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "Malformed"):
+            payments.verify_webhook("stripe", self.body, {"Stripe-Signature": "v1=abc"})
+
+
+PAYPAL_CERT_URL = "https://api.paypal.com/v1/notifications/certs/CERT-test"
+
+
+def _self_signed_cert(not_before, not_after):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "messageverificationcerts.paypal.com")])
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_before)
+        .not_valid_after(not_after)
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM)
+
+
+@override_settings(PAYPAL_WEBHOOK_ID="WH-TEST")
+class PayPalSignatureTests(SimpleTestCase):
+    body = json.dumps({"id": "WH-EVT-1", "event_type": "PAYMENT.CAPTURE.COMPLETED"}).encode()
+
+    def setUp(self):
+        now = timezone.now()
+        self.key, self.pem = _self_signed_cert(now - timedelta(days=1), now + timedelta(days=1))
+        payments._paypal_certs.delete(PAYPAL_CERT_URL)
+        self.addCleanup(payments._paypal_certs.delete, PAYPAL_CERT_URL)
+        patcher = mock.patch.object(payments.httpx, "get", side_effect=self.serve_cert)
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve_cert(self, url, timeout):
+        return httpx.Response(200, content=self.pem, request=httpx.Request("GET", url))
+
+    def headers(self, body=None, webhook_id="WH-TEST", key=None, cert_url=PAYPAL_CERT_URL):
+        transmission_id, transmission_time = "b2384410-f8d2-11e5-a5b5-6b5fa1a8f4f9", "2026-10-18T12:00:00Z"
+        message = f"{transmission_id}|{transmission_time}|{webhook_id}|{zlib.crc32(body or self.body)}"
+        signature = (key or self.key).sign(message.encode(), padding.PKCS1v15(), hashes.SHA256())
+        return {
+            "Paypal-Transmission-Id": transmission_id,
+            "Paypal-Transmission-Time": transmission_time,
+            "Paypal-Transmission-Sig": base64.b64encode(signature).decode(),
+            "Paypal-Cert-Url": cert_url,
+            "Paypal-Auth-Algo": "SHA256withRSA",
+        }
+
+    def test_valid(self):
+        self.assertEqual(payments.verify_webhook("paypal", self.body, self.headers())["id"], "WH-EVT-1")
+
+    def test_certificate_fetched_once(self):
+        payments.verify_webhook("paypal", self.body, self.headers())
+        payments.verify_webhook("paypal", self.body, self.headers())
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_tampered_body(self):
+        headers = self.headers()
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "Invalid PayPal signature"):
+            payments.verify_webhook("paypal", self.body.replace(b"WH-EVT-1", b"WH-EVT-2"), headers)
+
+    def test_signed_for_another_webhook(self):
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "Invalid PayPal signature"):
+            payments.verify_webhook("paypal", self.body, self.headers(webhook_id="WH-OTHER"))
+
+    def test_signed_with_another_key(self):
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "Invalid PayPal signature"):
+            payments.verify_webhook("paypal", self.body, self.headers(key=other_key))
+
+    def test_expired_certificate(self):
+        now = timezone.now()
+        self.key, self.pem = _self_signed_cert(now - timedelta(days=10), now - timedelta(days=1))
+        with self.assertRaisesMessage(payments.WebhookSignatureError, "not valid now"):
+            payments.verify_webhook("paypal", self.body, self.headers())
+
+    def test_certificate_only_fetched_from_paypal(self):
+        for url in ("https://evil.example/cert.pem", "http://api.paypal.com/cert.pem", "https://paypal.com.evil.example/c"):
+            with self.subTest(url=url), self.assertRaisesMessage(payments.WebhookSignatureError, "Untrusted"):
+                payments.verify_webhook("paypal", self.body, self.headers(cert_url=url))
+        self.fetch.assert_not_called()
+
+
+@override_settings(STRIPE_WEBHOOK_SECRETS=[STRIPE_SECRET])
+class WebhookReplayTests(TestCase):
+    def setUp(self):
+        self.campaign = _student(0).campaign
+        self.donor = _donor(0)
+
+    def deliver(self, body):
+        return self.client.post(
+            "/payments/webhook/stripe", body, content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=_stripe_headers(body)["Stripe-Signature"],
+        )
+
+    def test_redelivered_event_is_staged_once(self):
+        body = _stripe_event("evt_1", "pi_1", self.campaign.id, self.donor.id)
+        self.assertEqual(self.deliver(body).json(), {"received": True, "staged": True})
+        self.assertEqual(self.deliver(body).status_code, 200)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        self.assertEqual(payments.apply_pending_events(), (1, 0))
+        self.assertEqual(payments.apply_pending_events(), (0, 0))
+        self.assertEqual(Donation.objects.count(), 1)
+
+    def test_replayed_payment_counted_once(self):
+        self.deliver(_stripe_event("evt_1", "pi_1", self.campaign.id, self.donor.id))
+        payments.apply_pending_events()
+        # the same payment under a new event id (a replay), and twice in one batch
+        self.deliver(_stripe_event("evt_2", "pi_1", self.campaign.id, self.donor.id))
+        self.deliver(_stripe_event("evt_3", "pi_1", self.campaign.id, self.donor.id))
+        self.assertEqual(payments.apply_pending_events(), (2, 0))
+
+        self.assertEqual(Donation.objects.count(), 1)
+        self.campaign.refresh_from_db()
+        self.donor.refresh_from_db()
+        self.assertEqual((self.campaign.current_amount, self.campaign.donors_count), (Decimal("10.00"), 1))
+        self.assertEqual(self.donor.total_donations, Decimal("10.00"))
+
+    def test_bad_signature_is_rejected(self):
+        body = _stripe_event("evt_1", "pi_1", self.campaign.id)
+        response = self.client.post(
+            "/payments/webhook/stripe", body, content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=_stripe_headers(body, secret="whsec_other")["Stripe-Signature"],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
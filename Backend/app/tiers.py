@@ -0,0 +1,88 @@
+# app/tiers.py
+# Donor tiers. A donor's tier is the DonorTier with the highest min_donation
+# not above their total_donations (none below the lowest threshold).
+#
+# Payments re-evaluate the tier whenever they raise a donor's total
+# (app/payments.py), against ``tier_table``: the thresholds sorted in worker
+# memory, so each check is a binary search rather than a query. The table is
+# reloaded every TIER_TABLE_TTL_SECONDS, and at once in the worker that saves
+# a DonorTier (app/signals.py).
+#
+# Changing a threshold moves donors who will not donate again soon, so it is
+# followed by ``manage.py recompute_tiers``: one set-based UPDATE per chunk of
+# donor ids, evaluating the same thresholds as a CASE in the database and
+# writing only the rows whose tier actually changes.
+import bisect
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from app.models import DonorProfile, DonorTier
+
+
+class TierTable:
+    """DonorTier thresholds in ascending order, loaded lazily and kept for
+    ``ttl`` seconds."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # (loaded at, thresholds, tier ids), replaced as a whole so readers
+        # never see half a reload
+        self._table = None
+
+    def load(self):
+        """Reload from the database; returns ``[(min_donation, tier_id)]``."""
+        rows = list(DonorTier.objects.order_by("min_donation", "id").values_list("min_donation", "id"))
+        self._table = (time.monotonic(), [row[0] for row in rows], [row[1] for row in rows])
+        return rows
+
+    def invalidate(self):
+        self._table = None
+
+    def tier_for(self, total):
+        """The tier id for a donor who has given ``total`` in all, or None."""
+        table = self._table
+        if table is None or time.monotonic() - table[0] > self.ttl:
+            self.load()
+            table = self._table
+        _, thresholds, tier_ids = table
+        # with equal thresholds, the last tier (highest id) wins
+        i = bisect.bisect_right(thresholds, total)
+        return tier_ids[i - 1] if i else None
+
+
+tier_table = TierTable(settings.TIER_TABLE_TTL_SECONDS)
+
+
+def recompute_tiers(chunk_size=None):
+    """Reassign every donor's tier from the current thresholds; returns
+    ``(changed, seconds)``.
+
+    Each chunk of ``chunk_size`` (default TIER_RECOMPUTE_CHUNK_SIZE) donor
+    ids is its own transaction, so row locks are held briefly and a
+    concurrent donation waits for one chunk at most.
+    """
+    chunk_size = chunk_size or settings.TIER_RECOMPUTE_CHUNK_SIZE
+    started = time.perf_counter()
+    rows = tier_table.load()
+    # highest threshold first; the values come from the database, not the request
+    tier = "CASE {} ELSE NULL END".format(
+        " ".join(f"WHEN total_donations >= {min_donation} THEN {tier_id}" for min_donation, tier_id in reversed(rows))
+    ) if rows else "NULL"
+    sql = (
+        f"UPDATE {DonorProfile._meta.db_table} SET tier_id = {tier}, updated_at = %s "
+        f"WHERE id >= %s AND id < %s AND tier_id IS DISTINCT FROM {tier}"
+    )
+
+    bounds = DonorProfile.objects.aggregate(first=Min("id"), last=Max("id"))
+    changed = 0
+    if bounds["first"] is not None:
+        now = timezone.now()
+        for low in range(bounds["first"], bounds["last"] + 1, chunk_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [now, low, low + chunk_size])
+                changed += cursor.rowcount
+    return changed, time.perf_counter() - started
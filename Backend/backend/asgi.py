@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# campaigns/<id>/stream (Server-Sent Events) is served outside Django's
+# request handling, see app/live.py
+from app.live import with_progress_streams  # noqa: E402  (needs the app registry)
+
+application = with_progress_streams(django_application)
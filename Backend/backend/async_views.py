@@ -0,0 +1,210 @@
+# backend/async_views.py
+# Native async variants of the hottest read endpoints. Under ASGI (uvicorn /
+# daphne) these never park a thread while waiting on Supabase or the database:
+# Supabase is called through httpx and the ORM through its async API, so one
+# worker can keep hundreds of requests in flight. They return the same JSON as
+# the DRF views in backend/views.py and are routed instead of them when
+# ASYNC_VIEWS is enabled (see backend/urls.py).
+#
+# DRF function views cannot be async, so these are plain Django views.
+import logging
+
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+
+from app import ranking
+from app.auth import SupabaseAuthError
+from app.conditional import (
+    conditional,
+    campaign_detail_fingerprint,
+    campaigns_fingerprint,
+    discover_students_fingerprint,
+)
+from app.filters import InvalidFilter, filter_campaigns
+from app.identity import aresolve_edu_user
+from app.response_cache import catalog_cache, detail_cache
+from app.models import Campaign, DonorProfile, StudentProfile
+from app.pagination import STUDENT_PAGINATOR, InvalidCursor, add_pagination_headers
+from app.renderers import ORJSONResponse, astream_json_array, wants_stream
+from app.serializers import (
+    CampaignDetailSerializer,
+    CampaignListSerializer,
+    DiscoverStudentSerializer,
+    DonorProfileSerializer,
+    InvalidFields,
+    StudentProfileSerializer,
+)
+from backend import views
+
+logger = logging.getLogger(__name__)
+
+
+async def aget_edu_user_from_supabase(request):
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None, ORJSONResponse({"error": "Missing Authorization header"}, status=401)
+
+    token = auth_header.split(" ", 1)[1]
+    try:
+        edu_user = await aresolve_edu_user(token)
+    except SupabaseAuthError as e:
+        return None, ORJSONResponse(e.as_dict(), status=e.status)
+    except Exception:
+        return None, ORJSONResponse({"error": "Database error while fetching/creating user"}, status=500)
+
+    return edu_user, None
+
+
+@csrf_exempt  # token auth, like the DRF view it mirrors
+@require_http_methods(["GET", "PUT"])
+async def get_my_profile(request):
+    """GET is served natively; PUT (rare) is handed to the DRF view."""
+    if request.method == "PUT":
+        return await sync_to_async(views.get_my_profile)(request)
+
+    edu_user, error_response = await aget_edu_user_from_supabase(request)
+    if error_response:
+        return error_response
+
+    if edu_user.is_student:
+        try:
+            profile, _ = await StudentProfile.objects.aget_or_create(
+                user=edu_user,
+                defaults={
+                    "full_name": f"{edu_user.first_name} {edu_user.last_name}".strip() or edu_user.email,
+                    "email": edu_user.email,
+                },
+            )
+        except Exception:
+            logger.exception("Error when accessing StudentProfile for %s", edu_user.email)
+            return ORJSONResponse({"error": "Server error while accessing profile"}, status=500)
+        return ORJSONResponse(StudentProfileSerializer.serialize(profile))
+
+    elif edu_user.is_donor:
+        try:
+            profile = await DonorProfileSerializer.project().aget(user=edu_user)
+        except DonorProfile.DoesNotExist:
+            return ORJSONResponse({"error": "Donor profile not found"}, status=404)
+        except Exception:
+            logger.exception("Error fetching DonorProfile for %s", edu_user.email)
+            return ORJSONResponse({"error": "Server error while fetching profile"}, status=500)
+        return ORJSONResponse({"id": profile.id, **DonorProfileSerializer.serialize(profile)})
+
+    return ORJSONResponse({"error": "User has no profile"}, status=403)
+
+
+@require_GET
+async def get_donor_profile(request):
+    edu_user, error_response = await aget_edu_user_from_supabase(request)
+    if error_response:
+        return error_response
+
+    if not edu_user.is_donor:
+        return ORJSONResponse({"error": "Not a donor account"}, status=403)
+
+    try:
+        donor_profile = await DonorProfileSerializer.project().aget(user=edu_user)
+    except DonorProfile.DoesNotExist:
+        return ORJSONResponse({"error": "Donor profile not found"}, status=404)
+
+    return ORJSONResponse(DonorProfileSerializer.serialize(donor_profile))
+
+
+@require_GET
+@conditional(discover_students_fingerprint)
+async def discover_students(request):
+    try:
+        serializer = DiscoverStudentSerializer.for_request(request)
+    except InvalidFields as e:
+        return ORJSONResponse({"error": str(e)}, status=400)
+
+    sort = request.GET.get("sort", "name")
+    if sort not in ("name", "recommended"):
+        return ORJSONResponse({"error": "'sort' must be 'name' or 'recommended'"}, status=400)
+    if sort == "recommended" and not ranking.available():
+        # no ranking on this database
+        sort = "name"
+
+    students = serializer.project(
+        StudentProfile.objects.filter(campaign__isnull=False), extra=STUDENT_PAGINATOR.fields
+    )
+    if wants_stream(request):
+        if sort == "recommended":
+            students = students.filter(campaign__rank__isnull=False, campaign__status="active").order_by(
+                "-campaign__rank__score", "-id"
+            )
+        else:
+            students = students.order_by(*STUDENT_PAGINATOR.ordering)
+        return astream_json_array(students, serializer.serialize)
+
+    async def build():
+        if sort == "recommended":
+            ranks, next_cursor = await ranking.arecommended_page(request)
+            ids = [rank["student_id"] for rank in ranks]
+            page = [student async for student in students.filter(id__in=ids, campaign__status="active")]
+            page = ranking.in_rank_order(ids, page, key=lambda student: student.id)
+        else:
+            page, next_cursor = await STUDENT_PAGINATOR.apaginate(students, request)
+        return serializer.many(page), next_cursor
+
+    try:
+        data, next_cursor = await catalog_cache.aget_or_build("discover_students", request.GET, build)
+    except InvalidCursor:
+        return ORJSONResponse({"error": "Invalid cursor"}, status=400)
+
+    return add_pagination_headers(ORJSONResponse(data, safe=False), request, next_cursor)
+
+
+@require_GET
+@conditional(campaigns_fingerprint)
+async def get_campaigns(request):
+    """Get campaigns (active by default), filtered and sorted server-side"""
+    async def build():
+        campaigns, paginator = filter_campaigns(request.GET)
+        # the projection also matters for correctness here: lazy loads are not
+        # allowed in async code
+        campaigns = serializer.project(campaigns, extra=paginator.fields)
+        campaigns, next_cursor = await paginator.apaginate(campaigns, request)
+        return serializer.many(campaigns), next_cursor
+
+    try:
+        serializer = CampaignListSerializer.for_request(request)
+        if wants_stream(request):
+            campaigns, paginator = filter_campaigns(request.GET)
+            campaigns = serializer.project(campaigns).order_by(*paginator.ordering)
+            return astream_json_array(campaigns, serializer.serialize)
+
+        data, next_cursor = await catalog_cache.aget_or_build("get_campaigns", request.GET, build)
+        return add_pagination_headers(ORJSONResponse(data, safe=False, status=200), request, next_cursor)
+
+    except InvalidFilter as e:
+        return ORJSONResponse({"error": str(e), "details": e.errors}, status=400)
+    except InvalidFields as e:
+        return ORJSONResponse({"error": str(e)}, status=400)
+    except InvalidCursor:
+        return ORJSONResponse({"error": "Invalid cursor"}, status=400)
+    except Exception as e:
+        return ORJSONResponse({"error": str(e)}, status=500)
+
+
+@require_GET
+@conditional(campaign_detail_fingerprint)
+async def get_campaign_detail(request, campaign_id):
+    """Get campaign details"""
+    try:
+        serializer = CampaignDetailSerializer.for_request(request)
+    except InvalidFields as e:
+        return ORJSONResponse({"error": str(e)}, status=400)
+
+    async def build():
+        return serializer.serialize(await serializer.project().aget(id=campaign_id))
+
+    try:
+        data = await detail_cache.aget_or_build("campaign", campaign_id, build, variant=serializer.key)
+        return ORJSONResponse(data, status=200)
+
+    except Campaign.DoesNotExist:
+        return ORJSONResponse({"error": "Campaign not found"}, status=404)
+    except Exception as e:
+        return ORJSONResponse({"error": str(e)}, status=500)
@@ -24,17 +24,40 @@ from backend.views import (
     create_profile,
     list_students_for_donor,  
     discover_students,
+    search_students,
     get_student_by_id,
+    get_students_batch,
     get_donor_profile,
     list_donor_tiers,
     get_avatar_signed_url,
+    cache_stats,
+    job_stats,
+    export_data,
+    payment_webhook,
+    campaign_daily_stats,
+    category_daily_stats,
+    top_universities,
     create_campaign,    
     get_campaigns,        
+    search_campaigns,
     get_campaign_detail,
+    get_campaigns_batch,
+    get_recommended_campaigns,
     update_campaign,
     delete_campaign,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
+from django.conf import settings
+
+if settings.ASYNC_VIEWS:
+    # native async variants for ASGI deployments (backend/async_views.py)
+    from backend.async_views import (
+        get_my_profile,
+        discover_students,
+        get_campaigns,
+        get_campaign_detail,
+        get_donor_profile,
+    )
 
 
 urlpatterns = [
@@ -48,17 +71,32 @@ urlpatterns = [
     path('auth/profile/create', create_profile, name='create_profile'),
 
     path('students/discover', discover_students, name='discover_students'),
+    path('students/search', search_students, name='search_students'),
+    path('students/batch', get_students_batch, name='get_students_batch'),
 
     #CAMPAIGN
     path('campaigns/create', create_campaign, name='create_campaign'),
     path('campaigns', get_campaigns, name='get_campaigns'),
+    path('campaigns/search', search_campaigns, name='search_campaigns'),
+    path('campaigns/batch', get_campaigns_batch, name='get_campaigns_batch'),
+    path('campaigns/recommended', get_recommended_campaigns, name='get_recommended_campaigns'),
     path('campaigns/<int:campaign_id>', get_campaign_detail, name='get_campaign_detail'),
     path('campaigns/<int:campaign_id>/update', update_campaign, name='update_campaign'),
     path('campaigns/<int:campaign_id>/delete', delete_campaign, name='delete_campaign'),
+    # campaigns/<id>/stream is served ahead of Django by backend/asgi.py (app/live.py)
 
     path('auth/token/refresh', TokenRefreshView.as_view(), name='token_refresh'),
     path('donor/profile', get_donor_profile, name='get_donor_profile'),
     path('donor/tiers', list_donor_tiers, name='list_donor_tiers'),
     path('auth/avatar/signed-url', get_avatar_signed_url, name='get_avatar_signed_url'),
+    path('metrics/cache', cache_stats, name='cache_stats'),
+    path('metrics/jobs', job_stats, name='job_stats'),
+    path('exports/<str:dataset>.<str:fmt>', export_data, name='export_data'),
+    path('payments/webhook/<str:provider>', payment_webhook, name='payment_webhook'),
+
+    #ANALYTICS
+    path('analytics/campaigns/<int:campaign_id>/daily', campaign_daily_stats, name='campaign_daily_stats'),
+    path('analytics/categories/daily', category_daily_stats, name='category_daily_stats'),
+    path('analytics/universities/top', top_universities, name='top_universities'),
 
 ]
\ No newline at end of file
@@ -1,4 +1,4 @@
-import axios, { AxiosHeaders } from "axios";
+import axios, { AxiosHeaders, type AxiosRequestConfig } from "axios";
 
 const baseURL = import.meta.env.VITE_API_URL ?? "http://127.0.0.1:8000/";
 
@@ -28,3 +28,25 @@ api.interceptors.response.use(
   (r) => r,
   (err) => Promise.reject(err)
 );
+
+// List endpoints return one page as a JSON array and advertise the next one in
+// the X-Next-Cursor header (exposed through CORS); follow it until the last
+// page. maxPages bounds the requests if a list grows unexpectedly large.
+export async function getAllPages<T>(
+  url: string,
+  config: AxiosRequestConfig = {},
+  maxPages = 50
+): Promise<T[]> {
+  const rows: T[] = [];
+  let cursor: string | undefined;
+  for (let page = 0; page < maxPages; page++) {
+    const res = await api.get<T[]>(url, {
+      ...config,
+      params: { ...config.params, ...(cursor ? { cursor } : {}) },
+    });
+    rows.push(...res.data);
+    cursor = res.headers["x-next-cursor"];
+    if (!cursor) break;
+  }
+  return rows;
+}
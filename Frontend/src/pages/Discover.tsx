@@ -10,7 +10,7 @@ import { Progress } from '@/components/ui/progress';
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar';
 import resolveAvatarUrl from '@/lib/avatar';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
-import { api } from '@/lib/axios';
+import { getAllPages } from '@/lib/axios';
 import { supabase } from '@/lib/supabase';
 
 type Urgency = 'high' | 'medium' | 'low';
@@ -115,13 +115,13 @@ export default function Discover() {
           return;
         }
 
-        const res = await api.get<ApiStudent[]>('/students/discover', {
+        const rows = await getAllPages<ApiStudent>('/students/discover', {
           headers: {
             Authorization: `Bearer ${token}`,
           },
         });
 
-        const mapped = res.data.map(mapApiStudentToCard);
+        const mapped = rows.map(mapApiStudentToCard);
         setStudents(mapped);
 
         // Resolve any non-http avatars (private storage paths) in background
@@ -9,7 +9,7 @@ import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } f
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { useAuth } from "@/providers/AuthProvider";
-import { api } from "@/lib/axios";
+import { api, getAllPages } from "@/lib/axios";
 import { toast } from "sonner";
 
 import { 
@@ -127,11 +127,11 @@ export default function StudentDashboard() {
         const studentId = profileRes.data.id;
 
         // Fetch campaigns for this student
-        const campaignsRes = await api.get<Campaign[]>(`/campaigns?student_id=${studentId}`, {
+        const campaignsRes = await getAllPages<Campaign>(`/campaigns?student_id=${studentId}`, {
           headers: { Authorization: `Bearer ${token}` },
         });
 
-        setCampaigns(campaignsRes.data);
+        setCampaigns(campaignsRes);
       } catch (err) {
         console.error("Error fetching campaigns", err);
       } finally {
@@ -194,10 +194,10 @@ export default function StudentDashboard() {
         headers: { Authorization: `Bearer ${token}` },
       });
       const studentId = profileRes.data.id;
-      const campaignsRes = await api.get<Campaign[]>(`/campaigns?student_id=${studentId}`, {
+      const campaignsRes = await getAllPages<Campaign>(`/campaigns?student_id=${studentId}`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setCampaigns(campaignsRes.data);
+      setCampaigns(campaignsRes);
     } catch (err: any) {
       console.error("Error updating campaign", err);
       toast.error(err.response?.data?.error || "Failed to update campaign");
@@ -226,10 +226,10 @@ export default function StudentDashboard() {
         headers: { Authorization: `Bearer ${token}` },
       });
       const studentId = profileRes.data.id;
-      const campaignsRes = await api.get<Campaign[]>(`/campaigns?student_id=${studentId}`, {
+      const campaignsRes = await getAllPages<Campaign>(`/campaigns?student_id=${studentId}`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setCampaigns(campaignsRes.data);
+      setCampaigns(campaignsRes);
     } catch (err: any) {
       console.error("Error deleting campaign", err);
       toast.error(err.response?.data?.error || "Failed to delete campaign");